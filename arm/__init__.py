@@ -1,3 +1 @@
-import arm.config
-import arm.ripper
-import arm.ui  # noqa: F401
+"""Automatic Ripping Machine"""
@@ -1,8 +1,17 @@
 #!/usr/bin/python3
-"""yaml config loader"""
+"""
+yaml config loader
+
+The parsed config files are kept in a snapshot, CONFIG_CACHE. A file is only
+parsed again when its content changed, so most ARM processes start without
+parsing any yaml, and the arm.yaml migration is only checked when arm.yaml or
+its template changed. reload() picks up changed files at runtime, e.g. after
+the UI saved the settings.
+"""
+import hashlib
 import json
 import os
-import yaml
+import tempfile
 
 import arm.config.config_utils as config_utils
 
@@ -10,9 +19,14 @@ CONFIG_LOCATION = "/etc/arm/config"
 arm_config_path = os.path.join(CONFIG_LOCATION, "arm.yaml")
 abcde_config_path = os.path.join(CONFIG_LOCATION, "abcde.conf")
 apprise_config_path = os.path.join(CONFIG_LOCATION, "apprise.yaml")
+arm_template_path = "/opt/arm/setup/arm.yaml"
+comments_path = "/opt/arm/arm/ui/comments.json"
+CONFIG_CACHE = os.path.join(CONFIG_LOCATION, ".config_cache.json")
 
 
 def _load_config(fp):
+    # only needed when a file changed
+    import yaml
     with open(fp, "r") as yaml_file:
         config = yaml.safe_load(yaml_file)
     return config
@@ -24,21 +38,56 @@ def _load_abcde(fp):
     return config
 
 
-# arm config, open and read yaml contents
-# handle arm.yaml migration here
-# 1. Load both current and template arm.yaml
-cur_cfg = _load_config(arm_config_path)
-new_cfg = _load_config("/opt/arm/setup/arm.yaml")
+def _read_cache():
+    """Snapshot of the parsed config files, empty if there is none yet"""
+    try:
+        with open(CONFIG_CACHE, "r") as cache_file:
+            return json.load(cache_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cache(cache):
+    """Save the snapshot, without one the files are parsed again next time"""
+    try:
+        snapshot = json.dumps(cache)
+    except (TypeError, ValueError):
+        # a value json can't hold
+        return
+    try:
+        with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(CONFIG_CACHE), suffix=".tmp",
+                                         delete=False) as cache_file:
+            cache_file.write(snapshot)
+        os.replace(cache_file.name, CONFIG_CACHE)
+    except OSError:
+        pass
+
+
+def _cached(cache, fp, loader):
+    """
+    Content of fp from the snapshot if the file is unchanged, else from loader
+
+    :return: (content, True if the file was parsed)
+    """
+    with open(fp, "rb") as config_file:
+        digest = hashlib.sha256(config_file.read()).hexdigest()
+    entry = cache.get(fp)
+    if entry is not None and entry.get("digest") == digest:
+        return entry["value"], False
+    value = loader(fp)
+    cache[fp] = {"digest": digest, "value": value}
+    return value, True
 
-# 2. If the dicts do not have the same number of keys
-if len(cur_cfg) != len(new_cfg):
+
+def _migrate(cur_cfg, new_cfg):
+    """Write arm.yaml with the keys of the template, keeping the current values"""
     # 3. Update new dict with current values
     for key in cur_cfg:
         if key in new_cfg:
             new_cfg[key] = cur_cfg[key]
 
     # 4. Save the dictionary
-    with open("/opt/arm/arm/ui/comments.json", "r") as comments_file:
+    with open(comments_path, "r") as comments_file:
         comments = json.load(comments_file)
 
     arm_cfg = comments['ARM_CFG_GROUPS']['BEGIN'] + "\n\n"
@@ -64,10 +113,42 @@ if len(cur_cfg) != len(new_cfg):
         settings_file.write(arm_cfg)
         settings_file.close()
 
-arm_config = _load_config(arm_config_path)
 
-# abcde config file, open and read contents
-abcde_config = _load_abcde(abcde_config_path)
+def load():
+    """
+    Load arm.yaml, abcde.conf and apprise.yaml, from the snapshot where unchanged
+
+    :return: (arm config dict, abcde config string, apprise config dict)
+    """
+    cache = _read_cache()
+    # arm config, open and read yaml contents
+    # handle arm.yaml migration here
+    # 1. Load both current and template arm.yaml
+    cur_cfg, cur_parsed = _cached(cache, arm_config_path, _load_config)
+    new_cfg, new_parsed = _cached(cache, arm_template_path, _load_config)
+    # 2. If the dicts do not have the same number of keys
+    if (cur_parsed or new_parsed) and len(cur_cfg) != len(new_cfg):
+        _migrate(cur_cfg, dict(new_cfg))
+        cur_cfg, _ = _cached(cache, arm_config_path, _load_config)
+    # abcde config file, open and read contents
+    abcde, abcde_parsed = _cached(cache, abcde_config_path, _load_abcde)
+    # apprise config, open and read yaml contents
+    apprise, apprise_parsed = _cached(cache, apprise_config_path, _load_config)
+    if cur_parsed or new_parsed or abcde_parsed or apprise_parsed:
+        _write_cache(cache)
+    return cur_cfg, abcde, apprise
+
+
+def reload():
+    """
+    Update the config from the files that changed since they were loaded
+
+    arm_config is updated in place, so modules holding a reference to it see the changes.
+    """
+    global abcde_config, apprise_config
+    new_arm_config, abcde_config, apprise_config = load()
+    arm_config.clear()
+    arm_config.update(new_arm_config)
+
 
-# apprise config, open and read yaml contents
-apprise_config = _load_config(apprise_config_path)
+arm_config, abcde_config, apprise_config = load()
@@ -0,0 +1,105 @@
+"""
+Database layer shared by the ripper and the UI
+
+The ripper only needs a SQLAlchemy session, not the Flask app, so the models
+and the ripper use `db` from here. It offers the parts of Flask-SQLAlchemy's
+`db` they use: db.Model, db.session, db.engine, db.metadata and the SQLAlchemy
+names like db.Column. The UI builds its Flask-SQLAlchemy extension on the same
+Model and hands its session over with db.use_session(), so there is still one
+session per process.
+"""
+import logging
+import sqlite3
+import time
+
+import sqlalchemy
+import sqlalchemy.orm
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import arm.config.config as cfg
+
+sqlitefile = 'sqlite:///' + cfg.arm_config['DBFILE']
+# How long a connection waits for a lock held by another ARM process before "database is locked"
+SQLITE_BUSY_TIMEOUT = 30  # [s]
+# Retries of a commit that still failed with "database is locked", see db_commit()
+DB_COMMIT_ATTEMPTS = 3
+
+
+@event.listens_for(Engine, "connect")
+def _sqlite_pragmas(dbapi_connection, _connection_record):
+    """
+    Tune every new SQLite connection for many ripper processes and the UI sharing one database
+
+    WAL lets the UI read while a ripper writes, a busy timeout makes SQLite wait for
+    a lock instead of failing at once, and synchronous=NORMAL only syncs on checkpoints,
+    which is still safe in WAL mode.
+    """
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    # wait for locks first, switching an existing database to WAL needs one
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT * 1000:d}")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+class Database:
+    """
+    Flask free stand-in for Flask-SQLAlchemy's `db`
+
+    :param url: database url, connected on first use
+    """
+
+    def __init__(self, url):
+        self.engine = sqlalchemy.create_engine(url)
+        self.session = sqlalchemy.orm.scoped_session(sqlalchemy.orm.sessionmaker(bind=self.engine))
+        self.Model = sqlalchemy.orm.declarative_base(name="Model")
+        self.Model.query = self.session.query_property()
+        self.metadata = self.Model.metadata
+
+    def use_session(self, session):
+        """
+        Use another scoped session, e.g. the one of Flask-SQLAlchemy in the UI
+
+        :param session: scoped session
+        """
+        self.session = session
+
+    def __getattr__(self, name):
+        """db.Column, db.relationship ... like Flask-SQLAlchemy"""
+        for module in (sqlalchemy, sqlalchemy.orm):
+            if hasattr(module, name):
+                return getattr(module, name)
+        raise AttributeError(name)
+
+
+db = Database(sqlitefile)
+
+
+def db_commit(apply=None, attempts=DB_COMMIT_ATTEMPTS):
+    """
+    Commit the session, retry if the database is still locked after the busy timeout
+
+    A failed commit rolls the session back, which discards the pending changes, so
+    changes that need to survive a retry have to be made by `apply`.
+
+    :param apply: optional function making the changes, called before every attempt
+    :param attempts: number of attempts
+    :return: True
+    :raises RuntimeError: when all attempts failed or on any other database error
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            if apply is not None:
+                apply()
+            db.session.commit()
+            return True
+        except Exception as error:
+            db.session.rollback()
+            if "locked" not in str(error) or attempt == attempts:
+                logging.error(f"Database error: {error}")
+                raise RuntimeError(str(error)) from error
+            logging.debug(f"database is locked - try {attempt}/{attempts}")
+            time.sleep(attempt)
@@ -0,0 +1,163 @@
+"""
+Shared HTTP client for all outbound requests of the ripper and the UI
+
+One pooled requests session per process keeps connections to the metadata
+providers alive between lookups. Every request has connect and read timeouts,
+so a slow provider can't hang identification, and failed connections and
+"busy" answers (429, 5xx) are retried with a jittered exponential backoff.
+Only failed connections are retried for POST, a POST that reached the server
+(e.g. an Emby library refresh) is never sent twice.
+
+Requests to a provider in RATE_LIMITS take a token from a bucket first. The
+bucket lives in a small file next to the database, locked with flock, so all
+ripper processes and the UI together stay below the provider's limit.
+"""
+import fcntl
+import logging
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import arm.config.config as cfg
+
+TIMEOUT = (5, 20)
+"""Connect and read timeout [s]"""
+POOL_MAXSIZE = 4
+"""Connections kept open and allowed at the same time per host"""
+RETRIES = 3
+BACKOFF = 0.5
+"""Base of the backoff between retries [s], doubled on every retry"""
+RETRY_STATUS = (429, 500, 502, 503, 504)
+RATE_LIMITS = {
+    "omdb": (5, 10),
+    "tmdb": (20, 40),
+    "arm": (1, 5),
+}
+"""Requests per second and burst size of each provider"""
+
+_lock = threading.Lock()
+_session = None
+_session_pid = None
+_buckets = {}
+"""In process buckets, used when the bucket files can't be written"""
+
+
+class _JitterRetry(Retry):
+    """Retry with "full jitter", so processes retrying the same provider spread out"""
+
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        return random.uniform(0, backoff) if backoff else 0
+
+
+def session():
+    """
+    Pooled session of this process
+
+    :return: requests.Session
+    """
+    global _session, _session_pid
+    with _lock:
+        # a session can't be shared with a forked process
+        if _session is None or _session_pid != os.getpid():
+            # urllib3's default allowed_methods, only idempotent requests are retried after they were sent
+            retry = _JitterRetry(total=RETRIES, backoff_factor=BACKOFF, status_forcelist=RETRY_STATUS,
+                                 raise_on_status=False)
+            adapter = HTTPAdapter(pool_maxsize=POOL_MAXSIZE, pool_block=True, max_retries=retry)
+            new_session = requests.Session()
+            new_session.mount("http://", adapter)
+            new_session.mount("https://", adapter)
+            _session, _session_pid = new_session, os.getpid()
+        return _session
+
+
+def request(method, url, provider=None, timeout=TIMEOUT, **kwargs):
+    """
+    Send a request with the shared session
+
+    :param method: GET, POST ...
+    :param url: url
+    :param provider: name in RATE_LIMITS to rate limit the request, None to send it right away
+    :param timeout: connect and read timeout [s]
+    :return: requests.Response
+    :raises requests.RequestException: when the request failed after all retries
+    """
+    if provider:
+        rate_limit(provider)
+    return session().request(method, url, timeout=timeout, **kwargs)
+
+
+def get(url, provider=None, **kwargs):
+    """GET url, see request()"""
+    return request("GET", url, provider, **kwargs)
+
+
+def post(url, provider=None, **kwargs):
+    """POST url, see request()"""
+    return request("POST", url, provider, **kwargs)
+
+
+def get_json(url, provider=None, **kwargs):
+    """
+    GET url and decode the json answer, whatever its status code
+
+    :return: decoded answer
+    :raises requests.RequestException: when the request failed
+    :raises ValueError: when the answer isn't json
+    """
+    return get(url, provider, **kwargs).json()
+
+
+def _reserve(state, now, rate, burst):
+    """
+    Take a token from a bucket
+
+    The bucket may go below zero, the caller then waits until its token was refilled.
+
+    :param state: (tokens, time of the last update) or None for a full bucket
+    :return: (new state, seconds to wait)
+    """
+    tokens, updated = state if state else (burst, now)
+    tokens = min(burst, tokens + max(0.0, now - updated) * rate) - 1
+    return (tokens, now), max(0.0, -tokens / rate)
+
+
+def _bucket_path(provider):
+    return os.path.join(os.path.dirname(cfg.arm_config["DBFILE"]), "rate_limits", f"{provider}.bucket")
+
+
+def rate_limit(provider):
+    """
+    Wait for a token of a provider, shared with the other ARM processes
+
+    :param provider: name in RATE_LIMITS, others are not limited
+    """
+    if provider not in RATE_LIMITS:
+        return
+    rate, burst = RATE_LIMITS[provider]
+    try:
+        path = _bucket_path(provider)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a+") as bucket_file:
+            fcntl.flock(bucket_file, fcntl.LOCK_EX)
+            bucket_file.seek(0)
+            try:
+                state = tuple(float(value) for value in bucket_file.read().split())
+            except ValueError:
+                state = None
+            state, wait = _reserve(state if state and len(state) == 2 else None, time.time(), rate, burst)
+            bucket_file.seek(0)
+            bucket_file.truncate()
+            bucket_file.write(f"{state[0]} {state[1]}")
+    except OSError as error:
+        logging.debug(f"Rate limit of {provider} is only kept in this process: {error}")
+        with _lock:
+            _buckets[provider], wait = _reserve(_buckets.get(provider), time.time(), rate, burst)
+    if wait:
+        logging.debug(f"Rate limit of {provider}: waiting {wait:.2f}s")
+        time.sleep(wait)
@@ -1,14 +1,39 @@
-"""Main file for interacting with omdb and tmdb"""
-import urllib
-import json
+"""Main file for interacting with omdb and tmdb
+
+Every answer of the providers goes through the metadata cache (metadata_cache.py),
+so a lookup that was made before doesn't leave the box.
+"""
+import logging
+import urllib.parse
 import re
 import requests
-from flask.logging import default_handler  # noqa: F401
 
-from arm.ui import app
 import arm.config.config as cfg
+from arm import http_client, metadata_cache
+from arm.metadata_cache import normalize, HIT, MISS
 
 TMDB_YEAR_REGEX = r"-\d{0,2}-\d{0,2}"
+ARM_API_URL = "https://1337server.pythonanywhere.com/api/v1/"
+
+
+def _omdb_status(answer):
+    """Cache status of an omdb answer, errors like an invalid api key are not cached"""
+    if 'Error' not in answer and answer.get('Response') != "False":
+        return HIT
+    if "not found" in str(answer.get('Error', "")).lower():
+        return MISS
+    return None
+
+
+def _tmdb_status(answer):
+    """Cache status of a tmdb answer, errors other than "not found" (34) are not cached"""
+    if 'status_code' in answer:
+        return MISS if answer['status_code'] == 34 else None
+    if answer.get('total_results', 1) == 0:
+        return MISS
+    if 'movie_results' in answer and not answer['movie_results'] and not answer.get('tv_results'):
+        return MISS
+    return HIT
 
 
 def call_omdb_api(title=None, year=None, imdb_id=None, plot="short"):
@@ -37,19 +62,19 @@ def call_omdb_api(title=None, year=None, imdb_id=None, plot="short"):
         else:
             str_url = f"https://www.omdbapi.com/?s={title}&plot={plot}&r=json&apikey={omdb_api_key}"
     else:
-        app.logger.debug("no params")
+        logging.debug("no params")
     # connect to omdb and add background key
     try:
-        title_info_json = urllib.request.urlopen(str_url).read()
-        title_info = json.loads(title_info_json.decode())
+        key = normalize("omdb", f"search:{plot}", title, year, imdb_id)
+        title_info = metadata_cache.lookup(key, lambda: http_client.get_json(str_url, "omdb"), _omdb_status)
         title_info['background_url'] = None
-        app.logger.debug(f"omdb - {title_info}")
+        logging.debug(f"omdb - {title_info}")
         if 'Error' in title_info or title_info['Response'] == "False":
             title_info = None
-    except urllib.error.HTTPError as error:
-        app.logger.error(f"omdb call failed with error - {error}")
+    except (requests.RequestException, ValueError) as error:
+        logging.error(f"omdb call failed with error - {error}")
     else:
-        app.logger.debug("omdb - call was successful")
+        logging.debug("omdb - call was successful")
     return title_info
 
 
@@ -70,26 +95,28 @@ def get_omdb_poster(title=None, year=None, imdb_id=None, plot="short"):
         str_url = f"https://www.omdbapi.com/?s={title}&y={year}&plot={plot}&r=json&apikey={omdb_api_key}"
         str_url_2 = f"https://www.omdbapi.com/?t={title}&y={year}&plot={plot}&r=json&apikey={omdb_api_key}"
     else:
-        app.logger.debug("no params")
+        logging.debug("no params")
         return None, None
     try:
-        title_info_json = urllib.request.urlopen(requests.utils.requote_uri(str_url)).read()
+        title_info = metadata_cache.lookup(normalize("omdb", f"search:{plot}", title, year, imdb_id),
+                                           lambda: http_client.get_json(requests.utils.requote_uri(str_url), "omdb"),
+                                           _omdb_status)
     except Exception as error:
-        app.logger.debug(f"Failed to reach OMdb - {error}")
+        logging.debug(f"Failed to reach OMdb - {error}")
     else:
-        title_info = json.loads(title_info_json.decode())
-        # app.logger.debug("omdb - " + str(title_info))
+        # logging.debug("omdb - " + str(title_info))
         if 'Error' not in title_info:
             return title_info['Search'][0]['Poster'], title_info['Search'][0]['imdbID']
 
         try:
-            title_info_json2 = urllib.request.urlopen(requests.utils.requote_uri(str_url_2)).read()
-            title_info2 = json.loads(title_info_json2.decode())
-            # app.logger.debug("omdb - " + str(title_info2))
+            title_info2 = metadata_cache.lookup(
+                normalize("omdb", f"title:{plot}", title, year, imdb_id),
+                lambda: http_client.get_json(requests.utils.requote_uri(str_url_2), "omdb"), _omdb_status)
+            # logging.debug("omdb - " + str(title_info2))
             if 'Error' not in title_info2:
                 return title_info2['Poster'], title_info2['imdbID']
         except Exception as error:
-            app.logger.error(f"Failed to reach OMdb - {error}")
+            logging.error(f"Failed to reach OMdb - {error}")
 
     return None, None
 
@@ -106,23 +133,23 @@ def get_tmdb_poster(search_query=None, year=None):
 
     # if status_code is in search_results we know there was an error
     if 'status_code' in search_results:
-        app.logger.debug(f"get_tmdb_poster failed with error -  {search_results['status_message']}")
+        logging.debug(f"get_tmdb_poster failed with error -  {search_results['status_message']}")
         return None
 
     # If movies are found return those after processing
     if search_results['total_results'] > 0:
-        app.logger.debug(search_results['total_results'])
+        logging.debug(search_results['total_results'])
         return tmdb_process_poster(search_results, poster_base)
 
     # Search tmdb for tv series
     url = f"https://api.themoviedb.org/3/search/tv?api_key={tmdb_api_key}&query={search_query}"
-    response = requests.get(url)
-    search_results = json.loads(response.text)
-    # app.logger.debug(json.dumps(response.json(), indent=4, sort_keys=True))
+    search_results = metadata_cache.lookup(normalize("tmdb", "search:tv", search_query),
+                                           lambda: http_client.get_json(url, "tmdb"), _tmdb_status)
+    # logging.debug(json.dumps(response.json(), indent=4, sort_keys=True))
     if search_results['total_results'] > 0:
-        app.logger.debug(search_results['total_results'])
+        logging.debug(search_results['total_results'])
         return tmdb_process_poster(search_results, poster_base)
-    app.logger.debug("No results found")
+    logging.debug("No results found")
     return None
 
 
@@ -136,12 +163,12 @@ def tmdb_process_poster(search_results, poster_base):
     for media in search_results['results']:
         if media['poster_path'] is not None and 'release_date' in media:
             released_date = re.sub(TMDB_YEAR_REGEX, "", media['release_date'])
-            app.logger.debug(f"{media['title']} ({released_date})- {poster_base}{media['poster_path']}")
+            logging.debug(f"{media['title']} ({released_date})- {poster_base}{media['poster_path']}")
             media['poster_url'] = f"{poster_base}{media['poster_path']}"
             media["Plot"] = media['overview']
             media['background_url'] = f"{poster_base}{media['backdrop_path']}"
             media['Type'] = "movie"
-            app.logger.debug(media['background_url'])
+            logging.debug(media['background_url'])
             return media
     return None
 
@@ -155,25 +182,25 @@ def tmdb_search(search_query=None, year=None):
     """
     tmdb_api_key = cfg.arm_config['TMDB_API_KEY']
     search_results, poster_base, response = tmdb_fetch_results(search_query, year, tmdb_api_key)
-    app.logger.debug(f"Search results - movie - {search_results}")
+    logging.debug(f"Search results - movie - {search_results}")
     if 'status_code' in search_results:
-        app.logger.error(f"tmdb_fetch_results failed with error -  {search_results['status_message']}")
+        logging.error(f"tmdb_fetch_results failed with error -  {search_results['status_message']}")
         return None
     return_results = {}
     if search_results['total_results'] > 0:
-        app.logger.debug(f"tmdb_search - found {search_results['total_results']} movies")
+        logging.debug(f"tmdb_search - found {search_results['total_results']} movies")
         return tmdb_process_results(poster_base, return_results, search_results, "movie")
     # Search for tv series
-    app.logger.debug("tmdb_search - movie not found, trying tv series ")
+    logging.debug("tmdb_search - movie not found, trying tv series ")
     url = f"https://api.themoviedb.org/3/search/tv?api_key={tmdb_api_key}&query={search_query}"
-    response = requests.get(url)
-    search_results = json.loads(response.text)
+    search_results = metadata_cache.lookup(normalize("tmdb", "search:tv", search_query),
+                                           lambda: http_client.get_json(url, "tmdb"), _tmdb_status)
     if search_results['total_results'] > 0:
-        app.logger.debug(search_results['total_results'])
+        logging.debug(search_results['total_results'])
         return tmdb_process_results(poster_base, return_results, search_results, "series")
 
     # We got to here with no results give nothing back
-    app.logger.debug("tmdb_search - no results found")
+    logging.debug("tmdb_search - no results found")
     return None
 
 
@@ -187,7 +214,7 @@ def tmdb_process_results(poster_base, return_results, search_results, media_type
     :return: dict/json that will be returned to arm
     """
     for result in search_results['results']:
-        app.logger.debug(result)
+        logging.debug(result)
         result['poster_path'] = result['poster_path'] if result['poster_path'] is not None else None
         result['release_date'] = '0000-00-00' if 'release_date' not in result else result['release_date']
         result['imdbID'] = tmdb_get_imdb(result['id'])
@@ -215,14 +242,14 @@ def tmdb_get_imdb(tmdb_id):
           f"append_to_response=alternative_titles,credits,images,keywords,releases,reviews,similar,videos,external_ids"
     url_tv = f"https://api.themoviedb.org/3/tv/{tmdb_id}/external_ids?api_key={tmdb_api_key}"
     # Making a get request
-    response = requests.get(url)
-    search_results = json.loads(response.text)
+    search_results = metadata_cache.lookup(normalize("tmdb", "movie", item_id=tmdb_id),
+                                           lambda: http_client.get_json(url, "tmdb"), _tmdb_status)
     # 'status_code' means id wasn't found
     if 'status_code' in search_results:
         # Try tv series
-        response = requests.get(url_tv)
-        tv_json = json.loads(response.text)
-        app.logger.debug(tv_json)
+        tv_json = metadata_cache.lookup(normalize("tmdb", "tv:external_ids", item_id=tmdb_id),
+                                        lambda: http_client.get_json(url_tv, "tmdb"), _tmdb_status)
+        logging.debug(tv_json)
         if 'status_code' not in tv_json:
             return tv_json['imdb_id']
         return None
@@ -240,9 +267,9 @@ def tmdb_find(imdb_id):
     poster_size = "original"
     poster_base = f"https://image.tmdb.org/t/p/{poster_size}"
     # Making a get request
-    response = requests.get(url)
-    search_results = json.loads(response.text)
-    # app.logger.debug(f"tmdb_find = {search_results}")
+    search_results = metadata_cache.lookup(normalize("tmdb", "find", item_id=imdb_id),
+                                           lambda: http_client.get_json(url, "tmdb"), _tmdb_status)
+    # logging.debug(f"tmdb_find = {search_results}")
     if len(search_results['movie_results']) > 0:
         # We want to push out everything even if we don't use it right now, it may be used later.
         return_results = {'results': search_results['movie_results']}
@@ -277,7 +304,7 @@ def validate_imdb(imdb_id):
     # ['tt', 'nm', 'co', 'ev', 'ch' or 'ni'] - 123456789
     # /ev\d{7}\/\d{4}(-\d)?|(ch|co|ev|nm|tt)\d{7}/
     # /^ev\d{7}\/\d{4}(-\d)?$|^(ch|co|ev|nm|tt)\d{7}$/
-    app.logger.debug(imdb_id)
+    logging.debug(imdb_id)
 
 
 def tmdb_fetch_results(search_query, year, tmdb_api_key):
@@ -286,7 +313,7 @@ def tmdb_fetch_results(search_query, year, tmdb_api_key):
     :param str search_query: search query from ARMui
     :param str year: the year of the movie/tv-show
     :param str tmdb_api_key: tmdb API key
-    :return: [search_results dict, poster_img string, requests Response]
+    :return: [search_results dict, poster_img string, None]
     """
     # https://api.themoviedb.org/3/movie/78?api_key= # base url
     # Additional
@@ -299,6 +326,20 @@ def tmdb_fetch_results(search_query, year, tmdb_api_key):
     # "w92", "w154", "w185", "w342", "w500", "w780", "original"
     poster_size = "original"
     poster_base = f"https://image.tmdb.org/t/p/{poster_size}"
-    response = requests.get(url)
-    return_json = json.loads(response.text)
-    return return_json, poster_base, response
+    return_json = metadata_cache.lookup(normalize("tmdb", "search:movie", search_query, year),
+                                        lambda: http_client.get_json(url, "tmdb"), _tmdb_status)
+    # the requests Response is gone when the answer came from the cache
+    return return_json, poster_base, None
+
+
+def arm_crc64_lookup(crc64):
+    """
+    Queries the ARM online database for a DVD by its crc64
+    :param str crc64: crc64 of the DVD, see pydvdid
+    :return: dict of the answer, 'success' is True if the DVD is known
+    """
+    url = f"{ARM_API_URL}?mode=s&crc64={crc64}"
+    logging.debug(url)
+    return metadata_cache.lookup(normalize("arm", "crc64", item_id=crc64),
+                                 lambda: http_client.get_json(url, "arm"),
+                                 lambda answer: HIT if answer.get('success') else MISS)
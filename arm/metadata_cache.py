@@ -0,0 +1,217 @@
+"""
+Persistent cache of the OMDb, TMDb and ARM crc64 API responses
+
+The ripper and the UI share one SQLite file, METADATA_CACHE_PATH, so a lookup
+that was answered once, e.g. by the identification of a disc, is answered from
+the cache when the UI shows the job or a disc is identified again.
+
+Entries are keyed by the normalized (provider, kind, query, year, id) of the
+lookup. Answers are kept for METADATA_CACHE_DAYS, "not found" answers for
+METADATA_CACHE_MISS_HOURS so new releases are found eventually. Errors like an
+invalid api key and network failures are never cached. Once the cache grows
+past METADATA_CACHE_MB the least recently used entries are removed.
+"""
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import urllib.parse
+
+import arm.config.config as cfg
+
+HIT = "hit"
+"""The provider found something"""
+MISS = "miss"
+"""The provider found nothing, cached for a shorter time"""
+HITS, MISSES = "hits", "misses"
+"""Counters of lookups answered from the cache and lookups that had to ask the provider"""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS response (
+    key TEXT PRIMARY KEY,
+    provider TEXT NOT NULL,
+    status TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires REAL NOT NULL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS response_accessed ON response (accessed);
+CREATE TABLE IF NOT EXISTS counter (
+    name TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+"""
+_lock = threading.Lock()
+_connection = None
+_connection_pid = None
+_connection_path = None
+
+
+def normalize(provider, kind, query=None, year=None, item_id=None):
+    """
+    Cache key of a lookup
+
+    Queries are compared without url quoting, case and repeated separators, so
+    "Star+Wars", "star_wars" and "Star Wars" share an entry.
+
+    :param provider: omdb, tmdb or arm
+    :param kind: what is looked up, e.g. "search"
+    :param query: title searched for
+    :param year: year, only its digits are used
+    :param item_id: imdb, tmdb or crc64 id
+    :return: key string
+    """
+    query = urllib.parse.unquote_plus(str(query or ""))
+    query = re.sub(r"[\s_]+", " ", query).strip().lower()
+    year = re.sub(r"\D", "", str(year or ""))
+    item_id = str(item_id or "").strip().lower()
+    if item_id == "none":
+        item_id = ""
+    return json.dumps([provider.lower(), kind, query, year, item_id], separators=(",", ":"))
+
+
+def _connect():
+    """Connection to the cache, None if the cache is disabled or can't be opened"""
+    global _connection, _connection_pid, _connection_path
+    path = cfg.arm_config.get("METADATA_CACHE_PATH") or None
+    # a connection can't be shared with a forked process
+    if _connection is not None and (_connection_pid != os.getpid() or _connection_path != path):
+        if _connection_pid == os.getpid():
+            _connection.close()
+        _connection = None
+    if _connection is None and path:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+        except (OSError, sqlite3.Error) as error:
+            logging.warning(f"Metadata cache {path} is not available: {error}")
+            return None
+        _connection, _connection_pid, _connection_path = connection, os.getpid(), path
+    return _connection
+
+
+def _count(connection, name):
+    connection.execute("INSERT INTO counter (name, count) VALUES (?, 1) "
+                       "ON CONFLICT(name) DO UPDATE SET count = count + 1", (name,))
+
+
+def get(key):
+    """
+    Cached answer of a lookup
+
+    :param key: see normalize()
+    :return: (status, value), status is HIT or MISS, or (None, None) if nothing valid is cached
+    """
+    with _lock:
+        connection = _connect()
+        if connection is None:
+            return None, None
+        now = time.time()
+        try:
+            row = connection.execute("SELECT status, value FROM response WHERE key = ? AND expires > ?",
+                                     (key, now)).fetchone()
+            if row is None:
+                _count(connection, MISSES)
+                return None, None
+            connection.execute("UPDATE response SET accessed = ? WHERE key = ?", (now, key))
+            _count(connection, HITS)
+        except sqlite3.Error as error:
+            logging.warning(f"Metadata cache lookup failed: {error}")
+            return None, None
+    return row[0], json.loads(row[1])
+
+
+def put(key, status, value):
+    """
+    Store the answer of a lookup and evict old entries
+
+    :param key: see normalize()
+    :param status: HIT or MISS
+    :param value: json serializable answer
+    """
+    if status == HIT:
+        ttl = int(cfg.arm_config.get("METADATA_CACHE_DAYS", 30)) * 86400
+    else:
+        ttl = int(cfg.arm_config.get("METADATA_CACHE_MISS_HOURS", 24)) * 3600
+    if ttl <= 0:
+        return
+    value = json.dumps(value, separators=(",", ":"))
+    provider = json.loads(key)[0]
+    with _lock:
+        connection = _connect()
+        if connection is None:
+            return
+        now = time.time()
+        try:
+            connection.execute("INSERT OR REPLACE INTO response VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               (key, provider, status, value, now + ttl, now, len(key) + len(value)))
+            _evict(connection, now)
+        except sqlite3.Error as error:
+            logging.warning(f"Could not write metadata cache: {error}")
+
+
+def _evict(connection, now):
+    """Remove expired entries, then the least recently used until the cache fits into METADATA_CACHE_MB"""
+    connection.execute("DELETE FROM response WHERE expires <= ?", (now,))
+    max_size = int(cfg.arm_config.get("METADATA_CACHE_MB", 0)) * 1024 * 1024
+    if not max_size:
+        return
+    total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM response").fetchone()[0]
+    if total <= max_size:
+        return
+    removed = 0
+    # leave some room, so not every new entry evicts
+    target = max_size * 0.9
+    for key, size in connection.execute("SELECT key, size FROM response ORDER BY accessed").fetchall():
+        if total <= target:
+            break
+        connection.execute("DELETE FROM response WHERE key = ?", (key,))
+        total -= size
+        removed += 1
+    logging.debug(f"Removed {removed} metadata cache entries, cache size {total} bytes")
+
+
+def lookup(key, fetch, classify):
+    """
+    Answer a lookup from the cache, or ask the provider and cache its answer
+
+    :param key: see normalize()
+    :param fetch: function asking the provider, raises on network errors
+    :param classify: function of the answer, returns HIT, MISS or None for answers that must not be cached
+    :return: answer
+    """
+    status, value = get(key)
+    if status is not None:
+        logging.debug(f"Metadata cache {status}: {key}")
+        return value
+    value = fetch()
+    status = classify(value)
+    if status is not None:
+        put(key, status, value)
+    return value
+
+
+def stats():
+    """
+    Counters and size of the cache
+
+    :return: dict of hits, misses, entries and bytes, None if the cache is disabled
+    """
+    with _lock:
+        connection = _connect()
+        if connection is None:
+            return None
+        try:
+            counters = dict(connection.execute("SELECT name, count FROM counter").fetchall())
+            entries, size = connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM response").fetchone()
+        except sqlite3.Error as error:
+            logging.warning(f"Metadata cache stats failed: {error}")
+            return None
+    return {HITS: counters.get(HITS, 0), MISSES: counters.get(MISSES, 0), "entries": entries, "bytes": size}
@@ -0,0 +1,56 @@
+"""Add indexes for the hot queries of the UI and the ripper
+
+Revision ID: 3a6a555ccd17
+Revises: 6e3372a31061
+Create Date: 2026-10-18 19:05:43.871254
+
+"""
+from alembic import op
+
+# pylint: disable=no-member
+
+# revision identifiers, used by Alembic.
+revision = '3a6a555ccd17'
+down_revision = '6e3372a31061'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    # job list, history/database pages, clean_old_jobs() and the settings page counts
+    ('ix_job_status', 'job', ['status']),
+    ('ix_job_video_type', 'job', ['video_type']),
+    ('ix_job_disctype', 'job', ['disctype']),
+    ('ix_job_crc_id', 'job', ['crc_id']),
+    # duplicate_run_check() and the label duplicate check
+    ('ix_job_devpath_status', 'job', ['devpath', 'status']),
+    ('ix_job_label_status', 'job', ['label', 'status']),
+    # tracks and config of a job
+    ('ix_track_job_id', 'track', ['job_id']),
+    ('ix_config_job_id', 'config', ['job_id']),
+    # notification badge and list
+    ('ix_notifications_seen', 'notifications', ['seen']),
+    ('ix_notifications_cleared', 'notifications', ['cleared']),
+    # drive lookups by mount and by serial
+    ('ix_system_drives_mount', 'system_drives', ['mount']),
+    ('ix_system_drives_serial_id', 'system_drives', ['serial_id']),
+]
+"""(name, table, columns) of the indexes, also used by test/benchmark/bench_query_indexes.py"""
+
+
+def upgrade():
+    """
+    Index the columns the UI pages, the json api and the ripper filter on
+
+    Job.title is not indexed, the search matches anywhere in the title (LIKE '%...%'),
+    which a b-tree index can't serve.
+    """
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+    # statistics for the query planner to choose between the indexes
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute("ANALYZE")
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
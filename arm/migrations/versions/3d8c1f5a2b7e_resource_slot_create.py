@@ -0,0 +1,38 @@
+"""Create resource_slot table
+
+Revision ID: 3d8c1f5a2b7e
+Revises: a79af75f4b31
+Create Date: 2026-10-18 10:12:31.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# pylint: disable=no-member
+
+# revision identifiers, used by Alembic.
+revision = '3d8c1f5a2b7e'
+down_revision = 'a79af75f4b31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('resource_slot',
+                    sa.Column('slot_id', sa.Integer(), nullable=False),
+                    sa.Column('resource', sa.String(length=32), nullable=False),
+                    sa.Column('job_id', sa.Integer(), nullable=True),
+                    sa.Column('pid', sa.Integer(), nullable=False),
+                    sa.Column('pid_started', sa.Float(), nullable=True),
+                    sa.Column('priority', sa.Integer(), nullable=False),
+                    sa.Column('requested', sa.DateTime(), nullable=False),
+                    sa.Column('acquired', sa.DateTime(), nullable=True),
+                    sa.ForeignKeyConstraint(['job_id'], ['job.job_id'], ),
+                    sa.PrimaryKeyConstraint('slot_id')
+                    )
+    op.create_index('ix_resource_slot_resource', 'resource_slot', ['resource'])
+
+
+def downgrade():
+    op.drop_index('ix_resource_slot_resource', table_name='resource_slot')
+    op.drop_table('resource_slot')
@@ -0,0 +1,57 @@
+"""Create disc_fingerprint table
+
+Revision ID: 6e3372a31061
+Revises: 3d8c1f5a2b7e
+Create Date: 2026-10-18 18:52:07.214680
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# pylint: disable=no-member
+
+# revision identifiers, used by Alembic.
+revision = '6e3372a31061'
+down_revision = '3d8c1f5a2b7e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """
+    Fingerprint of every disc, linked from its jobs
+
+    The fingerprints of the existing DVD and Blu-ray rips are their crc_id.
+    Music jobs are left out, their crc_id is the MusicBrainz release and not the disc.
+    """
+    op.create_table('disc_fingerprint',
+                    sa.Column('fingerprint_id', sa.Integer(), nullable=False),
+                    sa.Column('fingerprint', sa.String(length=128), nullable=False),
+                    sa.Column('disctype', sa.String(length=20), nullable=True),
+                    sa.Column('job_id', sa.Integer(), nullable=True),
+                    sa.Column('rips', sa.Integer(), nullable=False),
+                    sa.ForeignKeyConstraint(['job_id'], ['job.job_id'], name='fk_disc_fingerprint_job_id'),
+                    sa.PrimaryKeyConstraint('fingerprint_id'),
+                    sa.UniqueConstraint('fingerprint')
+                    )
+    with op.batch_alter_table("job") as batch_op:
+        batch_op.add_column(sa.Column('fingerprint_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_job_fingerprint_id', 'disc_fingerprint',
+                                    ['fingerprint_id'], ['fingerprint_id'])
+        batch_op.create_index('ix_job_fingerprint_id', ['fingerprint_id'])
+
+    op.execute("INSERT INTO disc_fingerprint (fingerprint, disctype, job_id, rips) "
+               "SELECT crc_id, MAX(disctype), MAX(job_id), COUNT(*) FROM job "
+               "WHERE status = 'success' AND crc_id IS NOT NULL AND crc_id != '' "
+               "AND (disctype IS NULL OR disctype != 'music') GROUP BY crc_id")
+    op.execute("UPDATE job SET fingerprint_id = (SELECT fingerprint_id FROM disc_fingerprint "
+               "WHERE disc_fingerprint.fingerprint = job.crc_id) "
+               "WHERE crc_id IS NOT NULL AND (disctype IS NULL OR disctype != 'music')")
+
+
+def downgrade():
+    with op.batch_alter_table("job") as batch_op:
+        batch_op.drop_index('ix_job_fingerprint_id')
+        batch_op.drop_constraint('fk_job_fingerprint_id', type_='foreignkey')
+        batch_op.drop_column('fingerprint_id')
+    op.drop_table('disc_fingerprint')
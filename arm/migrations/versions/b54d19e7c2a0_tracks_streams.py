@@ -0,0 +1,36 @@
+"""tracks streams
+
+Revision ID: b54d19e7c2a0
+Revises: 3a6a555ccd17
+Create Date: 2026-10-18 19:41:12.508317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b54d19e7c2a0'
+down_revision = '3a6a555ccd17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """
+    Update Tracks table with the audio and subtitle streams of the title
+
+    audio_streams, subtitle_streams - string
+    - Comma separated ISO 639-2 language codes, from the HandBrake json scan
+    """
+    op.add_column('track',
+                  sa.Column('audio_streams', sa.String(length=256), nullable=True)
+                  )
+    op.add_column('track',
+                  sa.Column('subtitle_streams', sa.String(length=256), nullable=True)
+                  )
+
+
+def downgrade():
+    op.drop_column('track', 'subtitle_streams')
+    op.drop_column('track', 'audio_streams')
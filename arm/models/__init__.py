@@ -3,8 +3,10 @@
 
 from .alembic_version import AlembicVersion  # noqa F401
 from .config import Config  # noqa F401
+from .disc_fingerprint import DiscFingerprint  # noqa F401
 from .job import Job, JobState  # noqa F401
 from .notifications import Notifications  # noqa F401
+from .resource_slot import ResourceSlot  # noqa F401
 from .system_drives import SystemDrives  # noqa F401
 from .system_info import SystemInfo  # noqa F401
 from .track import Track  # noqa F401
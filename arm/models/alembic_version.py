@@ -1,10 +1,12 @@
-from arm.ui import db
+from arm.database import db
 
 
 class AlembicVersion(db.Model):
     """
     Class to hold the A.R.M db version
     """
+    __tablename__ = "alembic_version"
+
     version_num = db.Column(db.String(36), autoincrement=False, primary_key=True)
 
     def __init__(self, version=None):
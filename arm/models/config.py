@@ -1,6 +1,6 @@
 from prettytable import PrettyTable
 
-from arm.ui import db
+from arm.database import db
 
 
 hidden_attribs = ("OMDB_API_KEY", "EMBY_USERID", "EMBY_PASSWORD",
@@ -13,8 +13,10 @@ HIDDEN_VALUE = "<hidden>"
 class Config(db.Model):
     """ Holds all the config settings for each job
     as these may change between each job """
+    __tablename__ = "config"
+
     CONFIG_ID = db.Column(db.Integer, primary_key=True)
-    job_id = db.Column(db.Integer, db.ForeignKey('job.job_id'))
+    job_id = db.Column(db.Integer, db.ForeignKey('job.job_id'), index=True)
     ARM_CHECK_UDF = db.Column(db.Boolean)
     GET_VIDEO_TITLE = db.Column(db.Boolean)
     SKIP_TRANSCODE = db.Column(db.Boolean)
@@ -0,0 +1,112 @@
+"""Database Model for the fingerprints of the discs ARM has seen
+"""
+import logging
+
+from sqlalchemy.exc import IntegrityError
+
+from arm.database import db
+from arm.models.job import Job, JobState
+
+
+class DiscFingerprint(db.Model):
+    """
+    Fingerprint of a physical disc
+
+    crc64 for DVDs, the BDMV structure hash for Blu-rays and the MusicBrainz
+    disc id for audio CDs. Every job of the disc links here with
+    Job.fingerprint_id, and job_id points to its last successful rip, so a
+    duplicate check is one lookup in the unique fingerprint index.
+    """
+    __tablename__ = "disc_fingerprint"
+
+    fingerprint_id = db.Column(db.Integer, primary_key=True)
+    fingerprint = db.Column(db.String(128), nullable=False, unique=True)
+    disctype = db.Column(db.String(20))
+    # job and disc_fingerprint point at each other, use_alter breaks the cycle for create/drop_all
+    job_id = db.Column(db.Integer, db.ForeignKey('job.job_id', use_alter=True, name='fk_disc_fingerprint_job_id'))
+    """Last successful rip of the disc"""
+    rips = db.Column(db.Integer, nullable=False, default=0)
+    """Number of successful rips"""
+
+    def __init__(self, fingerprint, disctype=None):
+        self.fingerprint = fingerprint
+        self.disctype = disctype
+        self.rips = 0
+
+    def __repr__(self):
+        return f'<DiscFingerprint {self.fingerprint} job {self.job_id}>'
+
+    @classmethod
+    def get_or_create(cls, fingerprint, disctype=None):
+        """
+        Row of a fingerprint, added to the session if it is new
+
+        Another ripper process may add the same disc at the same time, the
+        insert runs in a savepoint so losing that race only costs a second select.
+        """
+        row = cls.query.filter_by(fingerprint=fingerprint).one_or_none()
+        if row is None:
+            try:
+                with db.session.begin_nested():
+                    row = cls(fingerprint, disctype)
+                    db.session.add(row)
+            except IntegrityError:
+                row = cls.query.filter_by(fingerprint=fingerprint).one()
+        return row
+
+    @classmethod
+    def link(cls, job, fingerprint):
+        """
+        Link a job to the fingerprint of its disc
+
+        :param job: Current job
+        :param fingerprint: crc64, BDMV hash or MusicBrainz disc id
+        :return: DiscFingerprint
+        """
+        row = cls.get_or_create(str(fingerprint), job.disctype)
+        job.fingerprint_id = row.fingerprint_id
+        return row
+
+    @classmethod
+    def record_success(cls, job, fingerprint=None):
+        """
+        Make a successful job the last rip of its disc
+
+        :param job: Job with a job_id, linked already or given the fingerprint
+        :param fingerprint: fingerprint to link the job to first
+        """
+        if fingerprint:
+            row = cls.link(job, fingerprint)
+        elif job.fingerprint_id:
+            row = db.session.get(cls, job.fingerprint_id)
+        else:
+            return
+        if row.job_id != job.job_id:
+            row.job_id = job.job_id
+            row.rips = (row.rips or 0) + 1
+            logging.debug(f"Disc {row.fingerprint} was ripped successfully {row.rips} times")
+
+    @classmethod
+    def previous_rip(cls, fingerprint, exclude_job_id=None, identified=False):
+        """
+        Last successful rip of a disc, only the columns a duplicate check needs
+
+        :param fingerprint: crc64, BDMV hash or MusicBrainz disc id
+        :param exclude_job_id: job that must not count as its own duplicate
+        :param identified: only a rip with a nice title counts, an earlier one if the last wasn't identified
+        :return: row with job_id, title, year, poster_url, hasnicetitle, video_type, imdb_id or None
+        """
+        if not fingerprint:
+            return None
+        query = db.session.query(Job.job_id, Job.title, Job.year, Job.poster_url, Job.hasnicetitle,
+                                 Job.video_type, Job.imdb_id)
+        if identified:
+            # every job of the disc links to the fingerprint, not only the last rip
+            query = query.join(cls, cls.fingerprint_id == Job.fingerprint_id) \
+                .filter(Job.hasnicetitle.is_(True)).order_by(Job.job_id.desc())
+        else:
+            query = query.join(cls, cls.job_id == Job.job_id)
+        query = query.filter(cls.fingerprint == str(fingerprint), Job.status == JobState.SUCCESS.value)
+        if exclude_job_id is not None:
+            query = query.filter(Job.job_id != exclude_job_id)
+        return query.first()
@@ -3,15 +3,13 @@ import logging
 import os
 import psutil
 import pyudev
-import subprocess
 import time
 
 from datetime import datetime as dt
 from prettytable import PrettyTable
 from sqlalchemy.ext.hybrid import hybrid_property
 
-from arm.ripper import music_brainz
-from arm.ui import db
+from arm.database import db
 import arm.config.config as cfg
 
 # THESE IMPORTS ARE REQUIRED FOR THE db.Relationships to work
@@ -85,14 +83,23 @@ class Job(db.Model):
     Job Class hold most of the details for each job
     connects to track, config
     """
+    __tablename__ = "job"
+    __table_args__ = (
+        # duplicate_run_check() and the label duplicate check
+        db.Index('ix_job_devpath_status', 'devpath', 'status'),
+        db.Index('ix_job_label_status', 'label', 'status'),
+    )
+
     job_id = db.Column(db.Integer, primary_key=True)
     arm_version = db.Column(db.String(20))
-    crc_id = db.Column(db.String(63))
+    crc_id = db.Column(db.String(63), index=True)
+    fingerprint_id = db.Column(db.Integer, db.ForeignKey('disc_fingerprint.fingerprint_id'), index=True)
+    """DiscFingerprint of the disc, see arm.models.disc_fingerprint"""
     logfile = db.Column(db.String(256))
     start_time = db.Column(db.DateTime)
     stop_time = db.Column(db.DateTime)
     job_length = db.Column(db.String(12))
-    status = db.Column(db.String(32))
+    status = db.Column(db.String(32), index=True)
     """Now that we have JobState, we should migrate this column.
     status = db.Column(
         db.Enum(JobState, name="job_state_enum", native_enum=False, validate_strings=True),
@@ -107,7 +114,7 @@ class Job(db.Model):
     year = db.Column(db.String(4))
     year_auto = db.Column(db.String(4))
     year_manual = db.Column(db.String(4))
-    video_type = db.Column(db.String(20))
+    video_type = db.Column(db.String(20), index=True)
     video_type_auto = db.Column(db.String(20))
     video_type_manual = db.Column(db.String(20))
     imdb_id = db.Column(db.String(15))
@@ -120,7 +127,7 @@ class Job(db.Model):
     mountpoint = db.Column(db.String(20))
     hasnicetitle = db.Column(db.Boolean)
     errors = db.Column(db.Text)
-    disctype = db.Column(db.String(20))  # dvd/bluray/data/music/unknown
+    disctype = db.Column(db.String(20), index=True)  # dvd/bluray/data/music/unknown
     label = db.Column(db.String(256))
     path = db.Column(db.String(256))
     ejected = db.Column(db.Boolean)
@@ -132,6 +139,8 @@ class Job(db.Model):
     manual_mode = db.Column(db.Boolean)
     tracks = db.relationship('Track', backref='job', lazy='dynamic')
     config = db.relationship('Config', uselist=False, backref="job")
+    # DiscProbe of the disc, set by apply_probe(), not stored
+    probe = None
 
     def __init__(self, devpath):
         """Return a disc object"""
@@ -150,11 +159,30 @@ class Job(db.Model):
         self.manual_mode = False
         self.has_track_99 = False
 
-        if self.disctype == "dvd" and not self.label:
-            logging.info("No disk label Available. Trying lsdvd")
-            command = f"lsdvd {devpath} | grep 'Disc Title' | cut -d ' ' -f 3-"
-            lsdvdlbl = str(subprocess.check_output(command, shell=True).strip(), 'utf-8')
-            self.label = lsdvdlbl
+    def apply_probe(self, probe):
+        """
+        Take over what the disc probe found before identification
+
+        :param probe: DiscProbe of the disc, see arm.ripper.disc_probe
+        :return: None
+        """
+        self.probe = probe
+        if self.disctype == "dvd" and not self.label and probe.label:
+            logging.info(f"No disk label Available. Using lsdvd disc title: {probe.label}")
+            self.label = probe.label
+        self.has_track_99 = probe.has_track_99
+
+    @property
+    def fingerprint(self):
+        """
+        Fingerprint of the disc, see DiscFingerprint
+
+        The probe's crc64, BDMV hash or MusicBrainz disc id, the crc64 in crc_id if the disc wasn't probed.
+        crc_id only ever holds a DVD crc64, it is shared with the ARM crc64 database.
+        """
+        if self.probe is not None and self.probe.fingerprint:
+            return self.probe.fingerprint
+        return self.crc_id
 
     def __str__(self):
         """Returns a string of the object"""
@@ -199,34 +227,30 @@ class Job(db.Model):
         self.pid = pid
         self.pid_hash = hash(process_id)
 
-    def get_disc_type(self, found_hvdvd_ts):
+    def get_disc_type(self, probe):
         """
         Checks/corrects the current disc-type
-        :param found_hvdvd_ts:  gets pushed in from utils - saves importing utils
+        :param probe: DiscProbe of the disc, holds the folders found on it
         :return: None
         """
         if self.disctype == "music":
             logging.debug("Disc is music.")
+            # music_brainz imports the models, import it on use
+            from arm.ripper import music_brainz
             self.label = music_brainz.main(self)
-        elif (os.path.isdir(self.mountpoint + "/AUDIO_TS")
-              and len(os.listdir(self.mountpoint + "/AUDIO_TS")) > 0) \
-            or (os.path.isdir(self.mountpoint + "/audio_ts")
-                and len(os.listdir(self.mountpoint + "/audio_ts")) > 0):
+        elif "AUDIO_TS" in probe.markers:
             logging.debug(f"Found: {self.mountpoint}/AUDIO_TS")
             self.disctype = "data"
-        elif os.path.isdir(self.mountpoint + "/VIDEO_TS"):
+        elif "VIDEO_TS" in probe.markers:
             logging.debug(f"Found: {self.mountpoint}/VIDEO_TS")
             self.disctype = "dvd"
-        elif os.path.isdir(self.mountpoint + "/video_ts"):
-            logging.debug(f"Found: {self.mountpoint}/video_ts")
-            self.disctype = "dvd"
-        elif os.path.isdir(self.mountpoint + "/BDMV"):
+        elif "BDMV" in probe.markers:
             logging.debug(f"Found: {self.mountpoint}/BDMV")
             self.disctype = "bluray"
-        elif os.path.isdir(self.mountpoint + "/HVDVD_TS"):
+        elif "HVDVD_TS" in probe.markers:
             logging.debug(f"Found: {self.mountpoint}/HVDVD_TS")
             # do something here
-        elif found_hvdvd_ts:
+        elif probe.found_hvdvd_ts:
             logging.debug("Found file: HVDVD_TS")
             # do something here too
         else:
@@ -241,9 +265,13 @@ class Job(db.Model):
 
         return - only the logfile - setup_logging() adds the full path
         """
+        from arm.ripper import music_brainz
         # Use the music label if we can find it - defaults to music_cd.log
         disc_id = music_brainz.get_disc_id(self)
         logging.debug(f"music_id: {disc_id}")
+        if self.probe is not None:
+            # The MusicBrainz disc id is the fingerprint of an audio CD
+            self.probe.fingerprint = str(disc_id)
         mb_title = music_brainz.get_title(disc_id, self)
         logging.debug(f"mm_title: {mb_title}")
 
@@ -0,0 +1,67 @@
+"""Database Model for slots of limited resources shared by all ripper processes
+"""
+import datetime
+import os
+
+import psutil
+
+from arm.database import db
+
+
+class ResourceSlot(db.Model):
+    """
+    Slot of a limited resource (e.g. concurrent transcodes)
+
+    Every ripper process that needs the resource adds a row and waits until it
+    is admitted (`acquired` is set). Rows are admitted by priority, then in the
+    order they were requested. The row is deleted again on release.
+    """
+    __tablename__ = "resource_slot"
+
+    slot_id = db.Column(db.Integer, primary_key=True)
+    resource = db.Column(db.String(32), nullable=False, index=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('job.job_id'))
+    pid = db.Column(db.Integer, nullable=False)
+    pid_started = db.Column(db.Float)
+    """Process creation time, tells a crashed holder apart from a reused pid"""
+    priority = db.Column(db.Integer, nullable=False, default=0)
+    requested = db.Column(db.DateTime, nullable=False)
+    acquired = db.Column(db.DateTime)
+
+    def __init__(self, resource, job_id=None, priority=0):
+        self.resource = resource
+        self.job_id = job_id
+        self.pid = os.getpid()
+        self.pid_started = psutil.Process(self.pid).create_time()
+        self.priority = priority
+        self.requested = datetime.datetime.now()
+
+    def __repr__(self):
+        return f'<ResourceSlot {self.slot_id} {self.resource} job {self.job_id}>'
+
+    @staticmethod
+    def holder_alive(pid, pid_started):
+        """Check if the process that requested a slot is still running"""
+        try:
+            return abs(psutil.Process(pid).create_time() - (pid_started or 0)) < 1
+        except (psutil.NoSuchProcess, psutil.AccessDenied, ValueError):
+            return False
+
+    @classmethod
+    def status(cls):
+        """
+        Queue depth and wait times per resource
+
+        :return: dict of resource: {running, waiting, longest_wait [s], queue [job ids in admission order]}
+        """
+        now = datetime.datetime.now()
+        result = {}
+        for slot in cls.query.order_by(cls.priority.desc(), cls.slot_id):
+            entry = result.setdefault(slot.resource, {"running": 0, "waiting": 0, "longest_wait": 0, "queue": []})
+            if slot.acquired:
+                entry["running"] += 1
+            else:
+                entry["waiting"] += 1
+                entry["queue"].append(slot.job_id)
+                entry["longest_wait"] = max(entry["longest_wait"], int((now - slot.requested).total_seconds()))
+        return result
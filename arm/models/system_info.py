@@ -4,13 +4,15 @@ import re
 import subprocess
 import logging
 
-from arm.ui import db
+from arm.database import db
 
 
 class SystemInfo(db.Model):
     """
     Class to hold the system (server) information
     """
+    __tablename__ = "system_info"
+
     id = db.Column(db.Integer, index=True, primary_key=True)
     name = db.Column(db.String(100))
     cpu = db.Column(db.String(20))
@@ -1,10 +1,12 @@
-from arm.ui import db
+from arm.database import db
 
 
 class Track(db.Model):
     """ Holds all the individual track details for each job """
+    __tablename__ = "track"
+
     track_id = db.Column(db.Integer, primary_key=True)
-    job_id = db.Column(db.Integer, db.ForeignKey('job.job_id'))
+    job_id = db.Column(db.Integer, db.ForeignKey('job.job_id'), index=True)
     track_number = db.Column(db.String(4))
     length = db.Column(db.Integer)
     aspect_ratio = db.Column(db.String(20))
@@ -19,6 +21,8 @@ class Track(db.Model):
     error = db.Column(db.Text)
     source = db.Column(db.String(32))
     process = db.Column(db.Boolean)
+    audio_streams = db.Column(db.String(256))
+    subtitle_streams = db.Column(db.String(256))
 
     def __init__(self, job_id, track_number, length, aspect_ratio,
                  fps, main_feature, source, basename, filename):
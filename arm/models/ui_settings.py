@@ -1,10 +1,12 @@
-from arm.ui import db
+from arm.database import db
 
 
 class UISettings(db.Model):
     """
     Class to hold the A.R.M ui settings
     """
+    __tablename__ = "ui_settings"
+
     id = db.Column(db.Integer, autoincrement=True, primary_key=True)
     use_icons = db.Column(db.Boolean)
     save_remote_images = db.Column(db.Boolean)
@@ -1,12 +1,15 @@
-from flask_login import UserMixin
+from arm.database import db
 
-from arm.ui import db
 
-
-class User(db.Model, UserMixin):
+class User(db.Model):
     """
     Class to hold admin users
+
+    Has the attributes Flask-Login expects of a user itself instead of
+    flask_login.UserMixin, the ripper imports the models without Flask.
     """
+    __tablename__ = "user"
+
     user_id = db.Column(db.Integer, index=True, primary_key=True)
     email = db.Column(db.String(64))
     password = db.Column(db.String(128))
@@ -25,6 +28,18 @@ class User(db.Model, UserMixin):
         """Returns a string of the object"""
         return self.__class__.__name__ + ": " + self.email
 
+    @property
+    def is_active(self):
+        return True
+
+    @property
+    def is_authenticated(self):
+        return True
+
+    @property
+    def is_anonymous(self):
+        return False
+
     def get_id(self):
         """ Return users id """
         return self.user_id
@@ -7,8 +7,8 @@ import logging
 
 sys.path.append("/opt/arm")
 
-from arm.ripper import utils, makemkv, handbrake  # noqa E402
-from arm.ui import app, db, constants  # noqa E402
+from arm.ripper import utils, makemkv, handbrake, constants  # noqa E402
+from arm.database import db  # noqa E402
 from arm.models.job import JobState  # noqa E402
 
 
@@ -47,20 +47,29 @@ def rip_visual_media(have_dupes, job, logfile, protection):
     # Do we need to use MakeMKV - Blu-rays, protected dvd's, and dvd with mainfeature off
     use_make_mkv = rip_with_mkv(job, protection)
     logging.debug(f"Using MakeMKV: [{use_make_mkv}]")
+    pipeline = None
     if use_make_mkv:
         logging.info("************* Ripping disc with MakeMKV *************")
+        # Transcode the titles while MakeMKV is still ripping
+        if job.config.PIPELINE_TRANSCODE and job.config.RIPMETHOD == "mkv" and not job.config.SKIP_TRANSCODE:
+            logging.info("Transcoding titles as soon as they are ripped")
+            pipeline = handbrake.TranscodePipeline(hb_out_path, logfile, job)
         # Run MakeMKV and get path to output
         job.status = JobState.VIDEO_RIPPING.value
         db.session.commit()
         try:
-            makemkv_out_path = makemkv.makemkv(job)
+            makemkv_out_path = makemkv.makemkv(job, on_ripped=pipeline.submit if pipeline else None)
         except Exception as mkv_error:  # noqa: E722
             logging.error(f"MakeMKV did not complete successfully.  Exiting ARM! "
                           f"Error: {mkv_error}")
+            if pipeline:
+                pipeline.close()
             raise ValueError from mkv_error
 
         if makemkv_out_path is None:
             logging.error("MakeMKV did not complete successfully.  Exiting ARM!")
+            if pipeline:
+                pipeline.close()
             job.status = JobState.FAILURE.value
             db.session.commit()
             raise ValueError("MakeMKV output path is None. Job failed.")
@@ -70,7 +79,7 @@ def rip_visual_media(have_dupes, job, logfile, protection):
         # point HB to the path MakeMKV ripped to
         hb_in_path = makemkv_out_path
     # Begin transcoding section - only transcode if skip_transcode is false
-    start_transcode(job, logfile, hb_in_path, hb_out_path, protection)
+    start_transcode(job, logfile, hb_in_path, hb_out_path, protection, pipeline)
 
     # --------------- POST PROCESSING ---------------
     # If ripped with MakeMKV remove the 'out' folder and set the raw as the output
@@ -104,7 +113,7 @@ def rip_visual_media(have_dupes, job, logfile, protection):
     logging.info("************* ARM processing complete *************")
 
 
-def start_transcode(job, logfile, hb_in_path, hb_out_path, protection):
+def start_transcode(job, logfile, hb_in_path, hb_out_path, protection, pipeline=None):
     """
     This checks if transcoding is enabled for the job and then passes it off to the correct
     handbrake function\n
@@ -113,6 +122,7 @@ def start_transcode(job, logfile, hb_in_path, hb_out_path, protection):
     :param job: Current job
     :param logfile: Current logfile
     :param protection: If disc has 99 track protection
+    :param pipeline: handbrake.TranscodePipeline already transcoding the ripped titles
     :return: None
     """
     utils.database_updater({"status": JobState.IDLE.value}, job)
@@ -122,8 +132,12 @@ def start_transcode(job, logfile, hb_in_path, hb_out_path, protection):
         if job.config.SKIP_TRANSCODE:
             logging.info("Transcoding is disabled, skipping transcode")
             return None
-        logging.debug(f"handbrake_mkv: {hb_in_path}, {hb_out_path}, {logfile}")
-        handbrake.handbrake_mkv(hb_in_path, hb_out_path, logfile, job)
+        if pipeline:
+            logging.debug(f"TranscodePipeline.finish: {hb_in_path}")
+            pipeline.finish(hb_in_path)
+        else:
+            logging.debug(f"handbrake_mkv: {hb_in_path}, {hb_out_path}, {logfile}")
+            handbrake.handbrake_mkv(hb_in_path, hb_out_path, logfile, job)
     elif job.video_type == "movie" and job.config.MAINFEATURE and job.hasnicetitle:
         logging.debug(f"handbrake_main_feature: {hb_in_path}, {hb_out_path}, {logfile}")
         handbrake.handbrake_main_feature(hb_in_path, hb_out_path, logfile, job)
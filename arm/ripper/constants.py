@@ -0,0 +1,3 @@
+"""ARM Ripper Constants"""
+NOTIFY_TITLE = "ARM notification"
+PROCESS_COMPLETE = "processing complete."
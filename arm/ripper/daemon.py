@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Long-running ARM ripper service
+
+Instead of starting a fresh python process per disc (which imports the UI,
+SQLAlchemy and alembic and re-checks arm.yaml every time), the udev wrappers
+send the device name to this service over a Unix socket (see ripper_client.py).
+Everything is imported once at start, every disc is processed by a forked
+worker running main.process_disc(), so dispatching a disc takes milliseconds.
+
+A second event for a drive whose worker started less than DEBOUNCE seconds ago
+(some drives trigger udev twice for one insert), or whose worker still holds
+the job of the drive, is answered with "duplicate" and ignored. A worker lets
+go of the drive when it ejects the disc, a disc inserted while the previous
+one is still transcoding gets a worker of its own.
+
+Protocol: one line with the kernel name of the drive (e.g. "sr0"), answered
+with one line: "started <pid>", "duplicate <pid>" or "error <reason>".
+"""
+import logging
+import os
+import re
+import signal
+import socket
+import sys
+import time
+
+from sqlalchemy.exc import SQLAlchemyError
+
+# set the PATH to /opt/arm so we can handle imports properly
+sys.path.append("/opt/arm")
+
+import arm.config.config as cfg  # noqa: E402
+from arm.ripper import logger, utils  # noqa: E402
+from arm.ripper import main as ripper  # noqa: E402
+from arm.ripper.ripper_client import DEFAULT_SOCKET  # noqa: E402
+from arm.database import db  # noqa: E402
+from arm.models.system_drives import SystemDrives  # noqa: E402
+
+REAP_INTERVAL = 1  # [s]
+"""Time between two checks for finished workers while no events come in"""
+CLIENT_TIMEOUT = 2  # [s]
+"""Time a client gets to send the device name"""
+DEBOUNCE = 30  # [s]
+"""Events for a drive within this time of starting its worker are duplicates"""
+DEVNAME = re.compile(r"[\w-]+")
+
+
+def drive_has_job(devpath):
+    """
+    Check if a drive still holds the job of a worker, release_current_job() clears it on eject
+
+    :param devpath: device path, e.g. /dev/sr0
+    :return: True if the drive is processing a job
+    """
+    try:
+        drive = SystemDrives.query.filter_by(mount=devpath).first()
+        return drive is not None and drive.processing
+    except SQLAlchemyError as error:
+        # the worker runs utils.duplicate_run_check() itself
+        logging.warning(f"Could not check the job of {devpath}: {error}")
+        return False
+    finally:
+        # never keep a transaction or stale rows in the service
+        db.session.remove()
+
+
+def run_worker(devpath, arm_log):
+    """
+    Process one disc in a forked worker, never returns
+
+    :param devpath: device path, e.g. /dev/sr0
+    :param arm_log: ARM logger
+    """
+    # connections of the service must not be shared with the worker
+    db.engine.dispose(close=False)
+    # pick up changes made in the settings since the service started
+    cfg.reload()
+    code = 0
+    try:
+        ripper.process_disc(devpath, arm_log)
+    except SystemExit as error:
+        code = error.code if isinstance(error.code, int) else int(error.code is not None)
+    except Exception as error:
+        arm_log.error(f"Worker for {devpath} failed: {error}", exc_info=True)
+        code = 1
+    finally:
+        logging.shutdown()
+        os._exit(code)
+
+
+class RipperDaemon:
+    """
+    Accept disc events on a Unix socket and fork a worker per disc
+
+    :param socket_path: path of the Unix socket
+    :param arm_log: ARM logger
+    :param worker: function(devpath, arm_log) run in the forked worker, must not return
+    """
+
+    def __init__(self, socket_path, arm_log, worker=run_worker):
+        self.socket_path = socket_path
+        self.arm_log = arm_log
+        self.worker = worker
+        self.workers = {}
+        """pid: (devpath, start time) of the running workers"""
+        self.server = None
+        self.running = False
+
+    def duplicate_of(self, devpath):
+        """
+        Running worker an event for the drive duplicates
+
+        :param devpath: device path, e.g. /dev/sr0
+        :return: pid of the worker or None
+        """
+        pids = {pid: started for pid, (worker_devpath, started) in self.workers.items() if worker_devpath == devpath}
+        if not pids:
+            return None
+        newest = max(pids, key=pids.get)
+        if time.monotonic() - pids[newest] < DEBOUNCE or drive_has_job(devpath):
+            return newest
+        return None
+
+    def dispatch(self, devname):
+        """
+        Start a worker for the drive unless the event duplicates a running one
+
+        :param devname: kernel name of the drive, e.g. sr0
+        :return: answer line for the client
+        """
+        if not DEVNAME.fullmatch(devname):
+            return "error invalid device name"
+        devpath = f"/dev/{devname}"
+        self.reap()
+        duplicate = self.duplicate_of(devpath)
+        if duplicate is not None:
+            self.arm_log.info(f"Ignoring event for {devpath}, worker {duplicate} is still processing it")
+            return f"duplicate {duplicate}"
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            self.server.close()
+            self.worker(devpath, self.arm_log)
+            os._exit(0)
+        self.workers[pid] = (devpath, time.monotonic())
+        self.arm_log.info(f"Started worker {pid} for {devpath}")
+        return f"started {pid}"
+
+    def reap(self):
+        """Forget workers that have finished"""
+        for pid, (devpath, _) in list(self.workers.items()):
+            try:
+                done, status = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                done, status = pid, 0
+            if done:
+                self.arm_log.info(f"Worker {pid} for {devpath} exited with {os.waitstatus_to_exitcode(status)}")
+                del self.workers[pid]
+
+    def handle(self, connection):
+        """Answer one client"""
+        with connection:
+            connection.settimeout(CLIENT_TIMEOUT)
+            try:
+                devname = connection.makefile("r").readline().strip()
+                connection.sendall(f"{self.dispatch(devname)}\n".encode())
+            except OSError as error:
+                self.arm_log.warning(f"Could not answer ripper client: {error}")
+
+    def listen(self):
+        """Create the socket, replacing a stale one"""
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.socket_path)
+        # udev runs the wrappers as root, docker as arm
+        os.chmod(self.socket_path, 0o660)
+        self.server.listen()
+        self.server.settimeout(REAP_INTERVAL)
+
+    def serve(self):
+        """Handle events until stop() is called, running workers are left alone"""
+        self.listen()
+        self.running = True
+        self.arm_log.info(f"ARM ripper service listening on {self.socket_path}")
+        try:
+            while self.running:
+                try:
+                    connection, _ = self.server.accept()
+                except socket.timeout:
+                    self.reap()
+                    continue
+                except OSError:
+                    # interrupted by stop()
+                    continue
+                self.handle(connection)
+        finally:
+            self.server.close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            self.arm_log.info("ARM ripper service stopped")
+
+    def stop(self, *_):
+        """Stop serving after the current event"""
+        self.running = False
+
+
+if __name__ == "__main__":
+    arm_log = logger.create_logger("ARM", logging.DEBUG, True, True, True)
+    utils.arm_setup(arm_log)
+    daemon = RipperDaemon(cfg.arm_config.get("RIPPER_SOCKET") or DEFAULT_SOCKET, arm_log)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    daemon.serve()
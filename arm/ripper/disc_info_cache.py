@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+On-disk cache of the parsed `makemkvcon info` title information
+
+Entries are keyed by a stable disc fingerprint, the DVD crc64 (pydvdid) or a
+hash of the Blu-ray BDMV structure, so re-rips, retries of failed jobs and
+identical discs of a box set skip the disc scan entirely.
+
+Each entry is a json file in MAKEMKV_INFO_CACHE_PATH. Entries older than
+MAKEMKV_INFO_CACHE_DAYS are removed, and the oldest entries are removed once
+the cache grows past MAKEMKV_INFO_CACHE_MB.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+
+import pydvdid
+
+import arm.config.config as cfg
+
+CACHE_VERSION = 1
+"""Bump to invalidate all entries when the stored message format changes"""
+BDMV_PREFIX = "bdmv:"
+"""Prefix of Blu-ray fingerprints, to tell them apart from a DVD crc64"""
+
+
+def bluray_fingerprint(mountpoint):
+    """
+    Hash the BDMV structure of a mounted Blu-ray
+
+    The small navigation files (index, movie objects, playlists and clip info)
+    are hashed by content, the streams by name and size only.
+
+    :param mountpoint: Path the disc is mounted to
+    :return: fingerprint string or None if the disc has no BDMV folder
+    """
+    bdmv = os.path.join(mountpoint, "BDMV")
+    if not os.path.isdir(bdmv):
+        return None
+    digest = hashlib.blake2b(digest_size=20)
+    for folder, content in (("", True), ("PLAYLIST", True), ("CLIPINF", True), ("STREAM", False)):
+        path = os.path.join(bdmv, folder)
+        try:
+            names = sorted(entry.name for entry in os.scandir(path) if entry.is_file())
+        except OSError:
+            continue
+        for name in names:
+            file_path = os.path.join(path, name)
+            digest.update(f"{folder}/{name}:{os.path.getsize(file_path)}\n".encode())
+            if content:
+                with open(file_path, "rb") as bdmv_file:
+                    digest.update(bdmv_file.read())
+    return BDMV_PREFIX + digest.hexdigest()
+
+
+def disc_fingerprint(disctype, mountpoint):
+    """
+    Get the fingerprint of a mounted disc
+
+    :param disctype: dvd or bluray
+    :param mountpoint: Path the disc is mounted to
+    :return: DVD crc64, Blu-ray BDMV hash or None
+    """
+    try:
+        if disctype == "dvd":
+            return str(pydvdid.compute(str(mountpoint)))
+        if disctype == "bluray":
+            return bluray_fingerprint(str(mountpoint))
+    except Exception as error:  # pydvdid raises a range of its own exceptions
+        logging.warning(f"Could not fingerprint disc: {error}")
+    return None
+
+
+def _cache_path():
+    """Cache directory or None if the cache is disabled"""
+    return cfg.arm_config.get("MAKEMKV_INFO_CACHE_PATH") or None
+
+
+def _entry_path(cache_path, fingerprint):
+    return os.path.join(cache_path, re.sub(r"[^\w.-]", "_", fingerprint) + ".json")
+
+
+def load(fingerprint):
+    """
+    Load the cached messages of a disc
+
+    :param fingerprint: Disc fingerprint, see disc_fingerprint()
+    :return: list of [message class name, *values] or None on a cache miss
+    """
+    cache_path = _cache_path()
+    if not cache_path or not fingerprint:
+        return None
+    entry_path = _entry_path(cache_path, fingerprint)
+    try:
+        with open(entry_path, "r") as entry_file:
+            entry = json.load(entry_file)
+        if entry["version"] != CACHE_VERSION or entry["fingerprint"] != fingerprint:
+            return None
+        max_age = int(cfg.arm_config.get("MAKEMKV_INFO_CACHE_DAYS", 0)) * 86400
+        if max_age and time.time() - entry["created"] > max_age:
+            logging.info(f"Disc info cache entry for {fingerprint} expired")
+            os.remove(entry_path)
+            return None
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError) as error:
+        logging.warning(f"Ignoring unreadable disc info cache entry {entry_path}: {error}")
+        return None
+    logging.info(f"Disc info cache hit for {fingerprint}")
+    return entry["messages"]
+
+
+def save(fingerprint, messages):
+    """
+    Store the messages of a disc scan and evict old entries
+
+    :param fingerprint: Disc fingerprint, see disc_fingerprint()
+    :param messages: list of [message class name, *values]
+    """
+    cache_path = _cache_path()
+    if not cache_path or not fingerprint:
+        return
+    entry = {
+        "version": CACHE_VERSION,
+        "fingerprint": fingerprint,
+        "created": time.time(),
+        "messages": messages,
+    }
+    try:
+        os.makedirs(cache_path, exist_ok=True)
+        # write to a temporary file first, concurrent jobs never see a partial entry
+        with tempfile.NamedTemporaryFile("w", dir=cache_path, suffix=".tmp", delete=False) as entry_file:
+            json.dump(entry, entry_file, separators=(",", ":"))
+        os.replace(entry_file.name, _entry_path(cache_path, fingerprint))
+        logging.info(f"Stored disc info for {fingerprint} in cache")
+        evict(cache_path)
+    except OSError as error:
+        logging.warning(f"Could not write disc info cache: {error}")
+
+
+def evict(cache_path):
+    """
+    Remove expired entries, then the oldest entries until the cache fits into
+    MAKEMKV_INFO_CACHE_MB
+
+    :param cache_path: Cache directory
+    """
+    max_age = int(cfg.arm_config.get("MAKEMKV_INFO_CACHE_DAYS", 0)) * 86400
+    max_size = int(cfg.arm_config.get("MAKEMKV_INFO_CACHE_MB", 0)) * 1024 * 1024
+    now = time.time()
+    entries = []
+    for entry in os.scandir(cache_path):
+        if not entry.is_file() or not entry.name.endswith((".json", ".tmp")):
+            continue
+        stat = entry.stat()
+        # leftovers from interrupted writes are removed once they are an hour old
+        stale = entry.name.endswith(".tmp") and now - stat.st_mtime > 3600
+        if stale or (max_age and now - stat.st_mtime > max_age):
+            logging.debug(f"Removing disc info cache entry {entry.name}")
+            os.remove(entry.path)
+        elif entry.name.endswith(".json"):
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if not max_size or total <= max_size:
+            break
+        logging.debug(f"Removing disc info cache entry {os.path.basename(path)}, cache size {total} bytes")
+        os.remove(path)
+        total -= size
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Probe a disc once for everything identification needs
+
+Reading the disc is slow, every access may spin the drive up and seek. The
+probe mounts the disc once, when the job was set up and passed the duplicate
+run check, and collects the disc type markers, the label, the fingerprint, the
+DVD title count, the bdmt_eng.xml of a Blu-ray and the DVD poster into a
+DiscProbe. Identification and the rip then only use the DiscProbe, the disc is
+not mounted again. Audio CDs can't be mounted and are never probed.
+"""
+import dataclasses
+import datetime
+import logging
+import os
+import re
+import shutil
+import struct
+import subprocess
+import tempfile
+from ast import literal_eval
+from typing import Optional
+
+import arm.config.config as cfg
+from arm.ripper import disc_info_cache, utils
+from arm.ripper.ProcessHandler import arm_subprocess
+
+MARKERS = ("AUDIO_TS", "VIDEO_TS", "BDMV", "HVDVD_TS")
+"""Folders in the root of a disc that tell its type"""
+POSTERS = ("J00___5L.MP2", "J00___6L.MP2")
+"""NTSC and PAL poster of a DVD in JACKET_P"""
+BDMT_ENG = os.path.join("BDMV", "META", "DL", "bdmt_eng.xml")
+DVD_SECTOR = 2048
+
+
+@dataclasses.dataclass
+class DiscProbe:
+    """What the probe found on the disc"""
+    mounted: bool = False
+    """The disc could be mounted, everything below is empty if not"""
+    label: Optional[str] = None
+    """Label from lsdvd, only read if udev has none"""
+    markers: frozenset = frozenset()
+    """MARKERS found in the root of the disc, AUDIO_TS only if it is not empty"""
+    found_hvdvd_ts: bool = False
+    """A HVDVD_TS file anywhere on the disc, only searched if no marker was found"""
+    fingerprint: Optional[str] = None
+    """DVD crc64 or Blu-ray BDMV hash, see disc_info_cache"""
+    title_count: Optional[int] = None
+    """Titles of a DVD"""
+    bdmt_eng: Optional[bytes] = None
+    """Content of the bdmt_eng.xml of a Blu-ray"""
+    bdmt_year: Optional[str] = None
+    """Year bdmt_eng.xml was last modified"""
+    poster: Optional[str] = None
+    """Copy of the DVD poster (MP2), only if RIP_POSTER is enabled"""
+
+    @property
+    def has_track_99(self):
+        """DVD with 99 titles, a copy protection"""
+        return self.title_count == 99
+
+    def discard(self):
+        """Remove the copy of the poster"""
+        if self.poster:
+            try:
+                os.unlink(self.poster)
+            except OSError:
+                pass
+            self.poster = None
+
+    @property
+    def disctype(self):
+        """Disc type the markers point to, None if they don't"""
+        if "AUDIO_TS" in self.markers:
+            return "data"
+        if "VIDEO_TS" in self.markers:
+            return "dvd"
+        if "BDMV" in self.markers:
+            return "bluray"
+        return None
+
+
+def check_if_mounted(mount_return_code, findmnt_return_code):
+    """
+    Function to check if mounting disc was success
+     checking the return value of 2 linux shell functions;
+     mount and findmnt.  mount can, in rare occasions,
+     return no errors (0) yet still have not mounted
+     the drive as expected.  findmnt, ran after the
+     mount functions, confirms that the drive is indeed mounted.
+     anything but 0 means we failed to mount disc
+     :param mount_return_code: The return value of the linux "mount" function
+     :param findmnt_return_code: The return value of the linux "findmnt" function
+    """
+    logging.debug(f"OS mounted value: {mount_return_code}")
+    logging.debug(f"OS findmnt -M value: {findmnt_return_code}")
+    success = False
+    if mount_return_code == 0 and findmnt_return_code == 0:
+        logging.info("Mounting disc was successful")
+        success = True
+    else:
+        logging.error("Mounting failed! Rip might have problems")
+    return success
+
+
+def probe(job):
+    """
+    Mount the disc of a job once and collect what identification needs
+
+    :param job: Current job, not yet in the database
+    :return: DiscProbe
+    """
+    result = DiscProbe()
+    logging.info(f"Mounting disc to: {job.mountpoint}")
+    if not os.path.exists(str(job.mountpoint)):
+        os.makedirs(str(job.mountpoint))
+    # Check and mount drive - log error if failed
+    mount_return_code = subprocess.run(["mount", job.mountpoint]).returncode
+    findmnt_return_code = subprocess.run(["findmnt", "-M", job.mountpoint], stdout=subprocess.DEVNULL).returncode
+    result.mounted = check_if_mounted(mount_return_code, findmnt_return_code)
+    try:
+        if result.mounted:
+            _probe_mounted(job, result)
+    finally:
+        # No need to warn if we cant unmount
+        subprocess.run(["umount", job.devpath], stderr=subprocess.DEVNULL)
+    logging.debug(f"Disc probe: {result}")
+    return result
+
+
+def dvd_label(devpath):
+    """
+    Label of a DVD from lsdvd, for a DVD udev has none for
+
+    Read before the job log is set up, the label names it. Doesn't mount the disc.
+
+    :param devpath: device path, e.g. /dev/sr0
+    :return: label or None
+    """
+    logging.info("No disk label Available. Trying lsdvd")
+    lsdvd = _lsdvd(devpath)
+    return (lsdvd.get("title") or None) if lsdvd else None
+
+
+def _probe_mounted(job, result):
+    """Fill result from the disc mounted at job.mountpoint"""
+    mountpoint = str(job.mountpoint)
+    result.markers = _markers(mountpoint)
+    if not result.markers:
+        result.found_hvdvd_ts = utils.find_file("HVDVD_TS", mountpoint)
+    disctype = result.disctype
+    if disctype == "dvd":
+        result.title_count = dvd_title_count(mountpoint)
+        if result.title_count is None or (job.disctype == "dvd" and not job.label):
+            # lsdvd reads the label and the titles in one go
+            logging.info("Reading disc title and tracks with lsdvd")
+            lsdvd = _lsdvd(job.devpath)
+            if lsdvd:
+                result.label = lsdvd.get("title") or None
+                result.title_count = len(lsdvd.get("track", []))
+        if cfg.arm_config["RIP_POSTER"]:
+            result.poster = _copy_poster(mountpoint)
+    elif disctype == "bluray":
+        try:
+            with open(os.path.join(mountpoint, BDMT_ENG), "rb") as xml_file:
+                result.bdmt_eng = xml_file.read()
+            modified = os.path.getmtime(os.path.join(mountpoint, BDMT_ENG))
+            result.bdmt_year = datetime.datetime.fromtimestamp(modified).strftime('%Y')
+        except OSError as error:
+            logging.debug(f"No bdmt_eng.xml: {error}")
+    if disctype in ("dvd", "bluray"):
+        result.fingerprint = disc_info_cache.disc_fingerprint(disctype, mountpoint)
+
+
+def _markers(mountpoint):
+    markers = set()
+    try:
+        entries = list(os.scandir(mountpoint))
+    except OSError as error:
+        logging.error(f"Could not list the disc: {error}")
+        return frozenset()
+    for entry in entries:
+        name = entry.name.upper()
+        if name not in MARKERS or not entry.is_dir():
+            continue
+        if name == "AUDIO_TS" and not os.listdir(entry.path):
+            continue
+        markers.add(name)
+    return frozenset(markers)
+
+
+def dvd_title_count(mountpoint):
+    """
+    Number of titles of a DVD, from the title search pointer table of VIDEO_TS.IFO
+
+    :param mountpoint: Path the disc is mounted to
+    :return: number of titles or None if VIDEO_TS.IFO can't be read
+    """
+    for name in ("VIDEO_TS", "video_ts"):
+        for ifo in ("VIDEO_TS.IFO", "video_ts.ifo"):
+            path = os.path.join(mountpoint, name, ifo)
+            try:
+                with open(path, "rb") as ifo_file:
+                    header = ifo_file.read(0xC8)
+                    if len(header) < 0xC8 or not header.startswith(b"DVDVIDEO-VMG"):
+                        return None
+                    # sector of the TT_SRPT, which starts with the number of titles
+                    tt_srpt, = struct.unpack(">I", header[0xC4:0xC8])
+                    ifo_file.seek(tt_srpt * DVD_SECTOR)
+                    count = ifo_file.read(2)
+            except OSError:
+                continue
+            if len(count) < 2:
+                return None
+            return struct.unpack(">H", count)[0]
+    return None
+
+
+def _lsdvd(devpath):
+    """Output of `lsdvd -Oy` as dict, None if it failed"""
+    # -Oy means output a python dict
+    output = arm_subprocess(["lsdvd", "-Oy", devpath])
+    if not output:
+        return None
+    try:
+        # literal_eval only accepts literals so we have to adjust the output slightly
+        return literal_eval(re.sub(r"^.*\{", "{", output))
+    except (SyntaxError, ValueError) as error:
+        logging.error("Failed to parse lsdvd output", exc_info=error)
+        return None
+
+
+def _copy_poster(mountpoint):
+    """Copy the poster of a DVD to a temporary file, converted when the rip starts"""
+    for poster in POSTERS:
+        path = os.path.join(mountpoint, "JACKET_P", poster)
+        if not os.path.isfile(path):
+            continue
+        handle, copy = tempfile.mkstemp(prefix="arm_poster_", suffix=".MP2")
+        try:
+            with os.fdopen(handle, "wb") as copy_file, open(path, "rb") as poster_file:
+                shutil.copyfileobj(poster_file, copy_file)
+        except OSError as error:
+            logging.warning(f"Could not copy the disc poster: {error}")
+            os.unlink(copy)
+            return None
+        return copy
+    return None
@@ -1,18 +1,49 @@
 #!/usr/bin/env python3
 """Handbrake processing of dvd/blu-ray"""
 
+import collections
+import copy
+import functools
+import json
 import os
 import logging
+import queue
+import signal
 import subprocess
 import re
 import shlex
+import tempfile
+import threading
+import time
 import arm.config.config as cfg
 
-from arm.ripper import utils
-from arm.ui import app, db  # noqa E402
+from arm.ripper import progress, resource_slots, transcode_limit, utils
+from arm.database import db
 from arm.models.job import JobState
 
 PROCESS_COMPLETE = "Handbrake processing complete"
+SCAN_PREVIEWS = 1
+"""Preview frames HandBrake decodes per title in the track scan (its default is 10).
+ARM only reads durations and stream info from the scan, the encodes still
+decode the usual previews of their title for cropping."""
+SCAN_JSON_TITLE_SET = "JSON Title Set:"
+JSON_BLOCK = re.compile(r"^(\w[\w ]*):(?: (\{.*))?$")
+"""First line of a json block HandBrake --json writes to stdout, e.g. 'Progress: {', or 'JSON Job:' and then '{'"""
+JSON_JOB = "JSON Job"
+"""json block of the job HandBrake resolved from its options, printed before it starts encoding"""
+QUEUE_CHAPTER_ARGS = ("-c", "--chapters", "--start-at", "--stop-at")
+"""HandBrake options that pick a part of the title, the job json of one title can't be used for another"""
+PROGRESS_TASKS = {"SCANNING": "Scanning", "WORKING": "Encoding", "MUXING": "Muxing", "SEARCHING": "Searching"}
+"""Task shown in the UI for the states of HandBrake's json progress"""
+ERROR_LINES = 20
+"""Last lines of the HandBrake log kept for the error of a failed transcode"""
+TERMINATE_TIMEOUT = 10  # [s]
+
+_running = set()
+"""HandBrake processes of this ripper, stopped with the ripper when the job is abandoned"""
+_previous_sigterm = signal.SIG_DFL
+_log_lock = threading.Lock()
+"""Held while a HandBrake log line is written, the workers of a TranscodePool share the job log"""
 
 
 def handbrake_sleep_check(job):
@@ -21,15 +52,32 @@ def handbrake_sleep_check(job):
     If handbrake is used as a ripping utility (the source path is a device),
     this means that the drive is blocked. If we transcode after makemkv, the
     drive associated to the job is ejected at this point.
+
+    :return: the acquired transcode slot, release it with resource_slots.release()
     """
     logging.debug("Handbrake starting.")
     utils.database_updater({"status": JobState.TRANSCODE_WAITING.value}, job)
     # TODO: send a notification that jobs are waiting ?
-    utils.sleep_check_process("HandBrakeCLI", int(cfg.arm_config["MAX_CONCURRENT_TRANSCODES"]))
+    slot = resource_slots.acquire(resource_slots.TRANSCODE, transcode_limit.current,
+                                  job.job_id)
     logging.debug(f"Setting job status to '{JobState.TRANSCODE_ACTIVE.value}'")
     utils.database_updater({"status": JobState.TRANSCODE_ACTIVE.value}, job)
+    return slot
+
+
+def transcode_slot(func):
+    """Run a handbrake function while holding a transcode slot"""
+    @functools.wraps(func)
+    def wrapper(srcpath, basepath, logfile, job):
+        slot = handbrake_sleep_check(job)
+        try:
+            return func(srcpath, basepath, logfile, job)
+        finally:
+            resource_slots.release(slot)
+    return wrapper
 
 
+@transcode_slot
 def handbrake_main_feature(srcpath, basepath, logfile, job):
     """
     Process dvd with main_feature enabled.\n\n
@@ -39,7 +87,6 @@ def handbrake_main_feature(srcpath, basepath, logfile, job):
     :param job: Disc object\n
     :return: None
     """
-    handbrake_sleep_check(job)
     logging.info("Starting DVD Movie main_feature processing")
 
     filename = os.path.join(basepath, job.title + "." + cfg.arm_config["DEST_EXT"])
@@ -58,28 +105,21 @@ def handbrake_main_feature(srcpath, basepath, logfile, job):
     db.session.commit()
 
     hb_args, hb_preset = correct_hb_settings(job)
-    cmd = f"nice {cfg.arm_config['HANDBRAKE_CLI']} " \
-          f"-i {shlex.quote(srcpath)} " \
-          f"-o {shlex.quote(filepathname)} " \
-          f"--main-feature " \
-          f"--preset \"{hb_preset}\" " \
-          f"{hb_args} " \
-          f">> {logfile} 2>&1"
-
-    logging.debug(f"Sending command: {cmd}")
+    options = ["-i", srcpath, "-o", filepathname, "--main-feature", "--preset", hb_preset, *shlex.split(hb_args)]
+    reporter = progress.Reporter(job, progress.TRANSCODE, titles=1, output_path=basepath)
+    reporter.update(title=1)
 
-    try:
-        subprocess.check_output(cmd, shell=True).decode("utf-8")
-        logging.info("Handbrake call successful")
-        track.status = "success"
-    except subprocess.CalledProcessError as hb_error:
-        err = f"Call to handbrake failed with code: {hb_error.returncode}({hb_error.output})"
+    result = run(options, logfile, reporter)
+    if result.returncode:
+        err = f"Call to handbrake failed with code: {result.returncode}({result.stderr})"
         logging.error(err)
         track.status = "fail"
         track.error = job.errors = err
         job.status = JobState.FAILURE.value
         db.session.commit()
-        raise subprocess.CalledProcessError(hb_error.returncode, cmd)
+        result.check_returncode()
+    logging.info("Handbrake call successful")
+    track.status = "success"
 
     logging.info(PROCESS_COMPLETE)
     logging.debug(f"\n\r{job.pretty_table()}")
@@ -87,26 +127,204 @@ def handbrake_main_feature(srcpath, basepath, logfile, job):
     db.session.commit()
 
 
+@transcode_slot
 def handbrake_all(srcpath, basepath, logfile, job):
     """
     Process all titles on the dvd\n
+    The source is scanned once, the titles to transcode are picked from that scan
+    and encoded by TitleTranscoder, most of them in a single HandBrakeCLI run. A
+    failed title is recorded on its track and the remaining titles are still
+    transcoded, the job fails at the end.\n
     :param srcpath: Path to source for HB (dvd or files)\n
     :param basepath: Path where HB will save trancoded files\n
     :param logfile: Logfile for HB to redirect output to\n
     :param job: Disc object\n
     :return: None
     """
-    handbrake_sleep_check(job)
     logging.info("Starting BluRay/DVD transcoding - All titles")
 
-    hb_args, hb_preset = correct_hb_settings(job)
     get_track_info(srcpath, job)
 
     logging.debug(f"Total number of tracks is {job.no_of_titles}")
 
+    batch = select_titles(job)
+    logging.info(f"Transcoding {len(batch)} of {job.no_of_titles} titles")
+    failed = TitleTranscoder(srcpath, basepath, logfile, job).run(batch)
+    if failed:
+        logging.error(f"{len(failed)} of {len(batch)} titles failed to transcode")
+        failed[0].check_returncode()
+    logging.info(PROCESS_COMPLETE)
+    logging.debug(f"\n\r{job.pretty_table()}")
+
+
+class TitleTranscoder:
+    """
+    Transcode titles of a disc, with as few HandBrakeCLI runs as possible
+
+    Every HandBrakeCLI run opens the source and scans its titles again. The
+    first title is encoded on its own, with --json HandBrake prints the job it
+    resolved from the preset and HB_ARGS as 'JSON Job'. That job, with the
+    title and output file changed, is queued for every other title with the
+    same audio and subtitle streams, aspect ratio and frame rate, and the queue
+    is encoded by a single run with --queue-import-file. The audio and subtitle
+    tracks of the job are picked by index, titles with other streams are
+    encoded on their own, and so is every title when HB_ARGS pick chapters.
+
+    A queued title is successful if the queue run succeeded and wrote its file,
+    the titles of a failed queue run are encoded again one by one, so every
+    track gets the status of its own title.
+    """
+
+    def __init__(self, srcpath, basepath, logfile, job):
+        self.srcpath = srcpath
+        self.basepath = basepath
+        self.logfile = logfile
+        self.job = job
+        self.hb_args, self.hb_preset = correct_hb_settings(job)
+        self.reporter = None
+        self.done = 0
+
+    def run(self, batch):
+        """
+        Transcode the titles, record the result of each on its track\n
+        :param batch: list of Track, see select_titles()
+        :return: list of subprocess.CompletedProcess of the failed titles
+        """
+        self.reporter = progress.Reporter(self.job, progress.TRANSCODE, titles=len(batch), output_path=self.basepath)
+        if not batch:
+            return []
+        first, rest = batch[0], batch[1:]
+        blocks = {}
+        failed = self._title(first, on_block=blocks.setdefault)
+        template = blocks.get(JSON_JOB)
+        queued = [track for track in rest if self._queueable(template, first, track)]
+        if rest and template is None:
+            logging.info("HandBrake printed no job json, transcoding every title on its own")
+        alone = self._queue(template, queued) if queued else []
+        for track in alone + [track for track in rest if track not in queued]:
+            failed += self._title(track)
+        return failed
+
+    def _queueable(self, template, first, track):
+        """Can track be encoded with the job json of the first title"""
+        if template is None or any(arg.split("=")[0] in QUEUE_CHAPTER_ARGS for arg in shlex.split(self.hb_args)):
+            return False
+        return all(getattr(track, name) == getattr(first, name)
+                   for name in ("audio_streams", "subtitle_streams", "aspect_ratio", "fps"))
+
+    def _options(self, track):
+        """Point the track to its transcoded file and build the HandBrake options of its title"""
+        logging.info(f"Processing track #{track.track_number} of {self.job.no_of_titles}. "
+                     f"Length is {track.length} seconds.")
+        filename = f"title_{track.track_number}.{cfg.arm_config['DEST_EXT']}"
+        filepathname = os.path.join(self.basepath, filename)
+        logging.info(f"Transcoding title {track.track_number} to {shlex.quote(filepathname)}")
+        track.filename = track.orig_filename = filename
+        return ["-i", self.srcpath, "-o", filepathname, "--preset", self.hb_preset, "-t", str(track.track_number),
+                *shlex.split(self.hb_args)]
+
+    def _title(self, track, on_block=None):
+        """
+        Transcode one title with its own HandBrakeCLI run\n
+        :param on_block: see run()
+        :return: list of the failed subprocess.CompletedProcess
+        """
+        options = self._options(track)
+        db.session.commit()
+        self.reporter.update(title=self.done + 1, percent=0.0)
+        result = run(options, self.logfile, self.reporter, on_block=on_block)
+        return self._result(track, result)
+
+    def _queue(self, template, tracks):
+        """
+        Transcode titles with copies of the job json of the first title, in one HandBrakeCLI run\n
+        :param dict template: 'JSON Job' block of the first title
+        :param tracks: list of Track
+        :return: list of the tracks to transcode on their own
+        """
+        jobs, files = [], []
+        for track in tracks:
+            options = self._options(track)
+            files.append(options[options.index("-o") + 1])
+            title_job = copy.deepcopy(template)
+            title_job["Source"]["Title"] = int(track.track_number)
+            # the chapters of the first title, every title is encoded whole
+            title_job["Source"].pop("Range", None)
+            title_job["Destination"].pop("ChapterList", None)
+            title_job["Destination"]["File"] = files[-1]
+            jobs.append({"Job": title_job})
+        db.session.commit()
+        logging.info(f"Transcoding titles {', '.join(str(track.track_number) for track in tracks)} "
+                     f"in one HandBrake run")
+        self.reporter.update(title=self.done + 1, percent=0.0)
+        with tempfile.NamedTemporaryFile("w", prefix="handbrake_queue_", suffix=".json") as queue_file:
+            json.dump(jobs, queue_file, indent=4)
+            queue_file.flush()
+            result = run(["--queue-import-file", queue_file.name], self.logfile, self.reporter,
+                         on_block=_QueueTitles(self.reporter, self.done + 1, self.done + len(tracks)))
+        if result.returncode:
+            logging.warning(f"HandBrake queue failed with code: {result.returncode}({result.stderr}), "
+                            f"transcoding its titles one by one")
+            return tracks
+        retry = []
+        for track, filepathname in zip(tracks, files):
+            if os.path.isfile(filepathname):
+                self._result(track, result)
+            else:
+                logging.warning(f"HandBrake queue wrote no {shlex.quote(filepathname)}, transcoding it on its own")
+                retry.append(track)
+        return retry
+
+    def _result(self, track, result):
+        """
+        Record the result of a title on its track\n
+        :return: list with result if the title failed
+        """
+        self.done += 1
+        if result.returncode:
+            err = f"Handbrake encoding of title {track.track_number} failed with code: {result.returncode}" \
+                  f"({result.stderr})"
+            logging.error(err)
+            track.status = "fail"
+            track.error = err
+            db.session.commit()
+            return [result]
+        logging.debug(f"Handbrake exit code: {result.returncode}")
+        track.status = "success"
+        track.ripped = True
+        db.session.commit()
+        return []
+
+
+class _QueueTitles:
+    """on_block of a queue run, moves the progress to the next title when HandBrake starts its next job"""
+
+    def __init__(self, reporter, number, last):
+        self.reporter = reporter
+        self.number = number
+        self.last = last
+        self.sequence = None
+
+    def __call__(self, name, block):
+        if name != "Progress" or block.get("State") != "WORKING":
+            return
+        sequence = block.get("Working", {}).get("SequenceID")
+        if self.sequence is not None and sequence != self.sequence:
+            self.number = min(self.number + 1, self.last)
+            self.reporter.update(title=self.number, percent=0.0)
+        self.sequence = sequence
+
+
+def select_titles(job):
+    """
+    Pick the titles of the scan to transcode, MINLENGTH <= length <= MAXLENGTH\n
+    :param job: Job with the tracks of the HandBrake scan
+    :return: list of Track
+    """
+    batch = []
     for track in job.tracks:
         # Don't raise error if we past max titles, skip and continue till HandBrake finishes
-        if int(track.track_number) > job.no_of_titles:
+        if int(track.track_number) > int(job.no_of_titles or 0):
             continue
         if track.length < int(cfg.arm_config["MINLENGTH"]):
             # too short
@@ -120,48 +338,8 @@ def handbrake_all(srcpath, basepath, logfile, job):
                          f"Skipping...")
         else:
             # just right
-            logging.info(f"Processing track #{track.track_number} of {job.no_of_titles}. "
-                         f"Length is {track.length} seconds.")
-
-            filename = f"title_{track.track_number}.{cfg.arm_config['DEST_EXT']}"
-            filepathname = os.path.join(basepath, filename)
-
-            logging.info(f"Transcoding title {track.track_number} to {shlex.quote(filepathname)}")
-
-            track.filename = track.orig_filename = filename
-            db.session.commit()
-
-            cmd = f"nice {cfg.arm_config['HANDBRAKE_CLI']} " \
-                  f"-i {shlex.quote(srcpath)} " \
-                  f"-o {shlex.quote(filepathname)} " \
-                  f"--preset \"{hb_preset}\" " \
-                  f"-t {track.track_number} " \
-                  f"{hb_args} " \
-                  f">> {logfile} 2>&1"
-
-            logging.debug(f"Sending command: {cmd}")
-
-            try:
-                hand_brake_output = subprocess.check_output(
-                    cmd,
-                    shell=True
-                ).decode("utf-8")
-                logging.debug(f"Handbrake exit code: {hand_brake_output}")
-                track.status = "success"
-            except subprocess.CalledProcessError as hb_error:
-                err = f"Handbrake encoding of title {track.track_number} failed with code: {hb_error.returncode}" \
-                      f"({hb_error.output})"
-                logging.error(err)
-                track.status = "fail"
-                track.error = err
-                db.session.commit()
-                raise subprocess.CalledProcessError(hb_error.returncode, cmd)
-
-            track.ripped = True
-            db.session.commit()
-
-    logging.info(PROCESS_COMPLETE)
-    logging.debug(f"\n\r{job.pretty_table()}")
+            batch.append(track)
+    return batch
 
 
 def correct_hb_settings(job):
@@ -178,121 +356,646 @@ def correct_hb_settings(job):
     elif job.disctype == "bluray":
         hb_args = job.config.HB_ARGS_BD
         hb_preset = job.config.HB_PRESET_BD
-    return hb_args, hb_preset
+    return hb_args or "", hb_preset
 
 
+@transcode_slot
 def handbrake_mkv(srcpath, basepath, logfile, job):
     """
-    Process all mkv files in a directory.\n\n
+    Process all mkv files in a directory.\n
+    Up to TRANSCODE_WORKERS files are transcoded at the same time, longest first,
+    see TranscodePool. All files are transcoded even if one fails, the job fails
+    at the end.\n
     :param srcpath: Path to source for HB (dvd or files)\n
     :param basepath: Path where HB will save trancoded files\n
     :param logfile: Logfile for HB to redirect output to\n
     :param job: Disc object\n
     :return: None
     """
-    # Added to limit number of transcodes
-    handbrake_sleep_check(job)
     logging.info("Starting Handbrake for MKV files.")
     hb_args, hb_preset = correct_hb_settings(job)
 
     # This will fail if the directory raw gets deleted
-    for files in os.listdir(srcpath):
-        srcpathname = os.path.join(srcpath, files)
-        destfile = os.path.splitext(files)[0]
-        # MakeMKV always saves in mkv we need to update the db with the new filename
-        logging.debug(destfile + ".mkv")
-        job_current_track = job.tracks.filter_by(filename=destfile + ".mkv")
-        for track in job_current_track:
-            logging.debug("filename: " + track.filename)
-            track.orig_filename = track.filename
-            track.filename = destfile + "." + cfg.arm_config["DEST_EXT"]
-            logging.debug("UPDATED filename: " + track.filename)
-            db.session.commit()
-        filename = os.path.join(basepath, destfile + "." + cfg.arm_config["DEST_EXT"])
-        filepathname = os.path.join(basepath, filename)
-
-        logging.info(f"Transcoding file {shlex.quote(files)} to {shlex.quote(filepathname)}")
-
-        cmd = f'nice {cfg.arm_config["HANDBRAKE_CLI"]} ' \
-              f'-i {shlex.quote(srcpathname)} ' \
-              f'-o {shlex.quote(filepathname)} ' \
-              f'--preset "{hb_preset}" {hb_args} >> {logfile} 2>&1'
+    mkv_files = longest_first(srcpath, os.listdir(srcpath), job)
+    commands = [(files, mkv_file_command(srcpath, files, basepath, job, hb_args, hb_preset, commit=False))
+                for files in mkv_files]
+    db.session.commit()
 
-        logging.debug(f"Sending command: {cmd}")
+    workers = max(1, min(int(cfg.arm_config.get("TRANSCODE_WORKERS") or 1), len(commands)))
+    reporter = progress.Reporter(job, progress.TRANSCODE, titles=len(commands), output_path=basepath)
+    results = TranscodePool(job, logfile, reporter, workers).run(commands)
 
-        try:
-            hand_break_output = subprocess.check_output(
-                cmd,
-                shell=True
-            ).decode("utf-8")
-            logging.debug(f"Handbrake exit code: {hand_break_output}")
-        except subprocess.CalledProcessError as hb_error:
-            err = f"Handbrake encoding of file {shlex.quote(files)} failed with code: {hb_error.returncode}" \
-                  f"({hb_error.output})"
+    tracks = collections.defaultdict(list)
+    for track in job.tracks:
+        tracks[track.filename].append(track)
+    failed = []
+    for files, result in results:
+        logging.debug(f"Handbrake exit code of {shlex.quote(files)}: {result.returncode}")
+        err = None
+        if result.returncode:
+            err = f"Handbrake encoding of file {shlex.quote(files)} failed with code: {result.returncode}" \
+                  f"({result.stderr})"
             logging.error(err)
-            raise subprocess.CalledProcessError(hb_error.returncode, cmd)
-            # job.errors.append(f)
+            failed.append(result)
+        for track in tracks[os.path.splitext(files)[0] + "." + cfg.arm_config["DEST_EXT"]]:
+            track.status = "fail" if err else "success"
+            track.error = err
+    db.session.commit()
+    if failed:
+        logging.error(f"{len(failed)} of {len(results)} files failed to transcode")
+        failed[0].check_returncode()
 
     logging.info(PROCESS_COMPLETE)
     logging.debug(f"\n\r{job.pretty_table()}")
 
 
+def longest_first(srcpath, mkv_files, job):
+    """
+    Order mkv files by the length of their track, then by size, longest first\n
+    Started in this order, the files a worker pool transcodes last are short ones
+    and all workers finish at about the same time.\n
+    :param srcpath: Path of the ripped mkv files
+    :param mkv_files: Names of the mkv files in srcpath
+    :param job: Disc object
+    :return: list of the names
+    """
+    lengths = {track.filename: track.length or 0 for track in job.tracks}
+    return sorted(mkv_files, reverse=True,
+                  key=lambda files: (lengths.get(files, 0), os.path.getsize(os.path.join(srcpath, files))))
+
+
+def mkv_file_command(srcpath, files, basepath, job, hb_args, hb_preset, commit=True):
+    """
+    Point the track of a ripped mkv file to its transcoded name and build the HandBrake options\n
+    :param srcpath: Path of the ripped mkv files\n
+    :param files: Name of the mkv file in srcpath\n
+    :param basepath: Path where HB will save trancoded files\n
+    :param job: Disc object\n
+    :param commit: Commit the renamed track, False to commit the tracks of several files at once\n
+    :return: HandBrake options for run()
+    """
+    srcpathname = os.path.join(srcpath, files)
+    destfile = os.path.splitext(files)[0]
+    # MakeMKV always saves in mkv we need to update the db with the new filename
+    logging.debug(destfile + ".mkv")
+    job_current_track = job.tracks.filter_by(filename=destfile + ".mkv")
+    for track in job_current_track:
+        logging.debug("filename: " + track.filename)
+        track.orig_filename = track.filename
+        track.filename = destfile + "." + cfg.arm_config["DEST_EXT"]
+        logging.debug("UPDATED filename: " + track.filename)
+    if commit:
+        db.session.commit()
+    filename = os.path.join(basepath, destfile + "." + cfg.arm_config["DEST_EXT"])
+    filepathname = os.path.join(basepath, filename)
+
+    logging.info(f"Transcoding file {shlex.quote(files)} to {shlex.quote(filepathname)}")
+
+    return ["-i", srcpathname, "-o", filepathname, "--preset", hb_preset, *shlex.split(hb_args)]
+
+
+class TranscodePool:
+    """
+    Transcode the files of a job with several HandBrake processes at the same time
+
+    The workers take the files in the given order. The first worker runs under
+    the transcode slot the caller already holds. Every other worker waits for
+    its own transcode slot, see transcode_limit, with a lower priority than the
+    first slot of other jobs, and gives up once all files are taken. The
+    progress of all files is published as one TRANSCODE record.
+
+    The workers only run HandBrake and, in their own database sessions, the
+    transcode slots. The tracks are updated by the caller from the results.
+    """
+
+    def __init__(self, job, logfile, reporter, workers):
+        self.job_id = job.job_id
+        self.logfile = logfile
+        self.reporter = reporter
+        self.workers = workers
+        self.queue = queue.Queue()
+        self.total = 0
+        self.taken = threading.Event()
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        # written by the worker threads
+        self.running = {}
+        self.results = []
+        self.error = None
+
+    def run(self, commands):
+        """
+        Transcode all files, return when all are done\n
+        :param commands: list of (files, HandBrake options), in the order to start them
+        :return: list of (files, subprocess.CompletedProcess) in the order they finished
+        """
+        for command in commands:
+            self.queue.put(command)
+        self.total = len(commands)
+        logging.info(f"Transcoding {self.total} files with {self.workers} worker(s)")
+        stop_on_abandon()
+        threads = [threading.Thread(target=self._work, args=(number > 0,), name=f"transcode-{number}", daemon=True)
+                   for number in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        finally:
+            # interrupted: stop the workers and their HandBrake processes
+            self.taken.set()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            for proc in list(_running):
+                stop(proc)
+        if self.error is not None:
+            raise self.error
+        self.reporter.write()
+        return self.results
+
+    def _work(self, extra):
+        """Worker thread, transcode files until all are taken"""
+        slot = None
+        try:
+            if extra:
+                slot = resource_slots.acquire(resource_slots.TRANSCODE,
+                                              transcode_limit.current,
+                                              self.job_id, priority=-1, cancel=self.taken)
+                if slot is None and self.taken.is_set():
+                    return
+            while True:
+                try:
+                    files, options = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if self.queue.empty():
+                    self.taken.set()
+                result = run(options, self.logfile, _PoolReporter(self, files))
+                with self.lock:
+                    self.running.pop(files, None)
+                    self.results.append((files, result))
+                    self.update()
+        except Exception as error:  # handed to the calling thread in run()
+            self.error = self.error or error
+            self.taken.set()
+        finally:
+            resource_slots.release(slot)
+            db.session.remove()
+
+    def update(self):
+        """Publish the progress of all files, call with self.lock held"""
+        percent = (100 * len(self.results) + sum(fields.get("percent", 0) for fields in self.running.values())) \
+            / max(self.total, 1)
+        elapsed = time.monotonic() - self.started
+        self.reporter.update(
+            task="Encoding" if len(self.running) < 2 else f"Encoding {len(self.running)} files",
+            title=min(len(self.results) + 1, self.total), percent=round(percent, 2),
+            eta=int(elapsed * (100 - percent) / percent) if 0 < percent < 100 else None,
+            fps=round(sum(fields.get("fps") or 0 for fields in self.running.values()), 1) or None)
+
+
+class _PoolReporter:
+    """Stands in for progress.Reporter in run(), hands the progress of one file to its TranscodePool"""
+
+    def __init__(self, pool, files):
+        self.pool = pool
+        self.files = files
+
+    def update(self, **fields):
+        with self.pool.lock:
+            self.pool.running.setdefault(self.files, {}).update(fields)
+            self.pool.update()
+
+    def write(self):
+        """The pool writes the record"""
+
+
+class TranscodePipeline:
+    """
+    Transcode titles with HandBrake while MakeMKV is still ripping the rest of the disc
+
+    MakeMKV hands every finished title to submit(), a worker thread encodes them
+    one after another. The worker takes a transcode slot for every title and
+    releases it before it waits for the next one, so MAX_CONCURRENT_TRANSCODES
+    still applies and other jobs can transcode in between. finish() transcodes any
+    file in the raw folder that wasn't submitted (e.g. a whole disc rip) and
+    waits for the worker, the result is the same as handbrake_mkv().
+
+    All database work stays in the calling thread, the worker only runs the
+    HandBrake commands, publishes their progress and, in its own database
+    session, takes the transcode slots.
+    """
+
+    def __init__(self, basepath, logfile, job):
+        self.basepath = basepath
+        self.logfile = logfile
+        self.job = job
+        self.hb_args, self.hb_preset = correct_hb_settings(job)
+        self.submitted = set()
+        self.queue = queue.Queue()
+        self.reporter = progress.Reporter(job, progress.TRANSCODE, output_path=basepath)
+        # written by the worker thread
+        self.results = []
+        self.error = None
+        self.proc = None
+        self.abort = threading.Event()
+        self.lock = threading.Lock()
+        # the worker can't handle signals, stop its HandBrake from here
+        stop_on_abandon()
+        self.worker = threading.Thread(target=self._work, args=(job.job_id,), name="transcode", daemon=True)
+        self.worker.start()
+
+    def submit(self, srcpath, files):
+        """
+        Queue a file MakeMKV finished ripping\n
+        :param srcpath: Path of the ripped mkv files\n
+        :param files: Name of the mkv file in srcpath
+        """
+        if files in self.submitted or not os.path.isfile(os.path.join(srcpath, files)):
+            return
+        self.submitted.add(files)
+        options = mkv_file_command(srcpath, files, self.basepath, self.job, self.hb_args, self.hb_preset)
+        self.queue.put((files, options))
+
+    def _work(self, job_id):
+        """Worker thread, run the queued commands in order until finish() or close()"""
+        try:
+            for files, options in iter(self.queue.get, None):
+                # a slot per file, other jobs can transcode while MakeMKV rips the next title
+                slot = resource_slots.acquire(resource_slots.TRANSCODE,
+                                              transcode_limit.current,
+                                              job_id, cancel=self.abort)
+                try:
+                    if self.abort.is_set():
+                        break
+                    self.reporter.update(title=len(self.results) + 1, percent=0.0)
+                    result = run(options, self.logfile, self.reporter, started=self._started)
+                finally:
+                    resource_slots.release(slot)
+                self.results.append((files, result))
+                if result.returncode:
+                    break
+        except Exception as error:  # handed to the calling thread in finish()
+            self.error = error
+        finally:
+            db.session.remove()
+
+    def _started(self, proc):
+        """HandBrake of the worker started, stop it right away if close() came first"""
+        with self.lock:
+            self.proc = proc
+            if self.abort.is_set():
+                os.killpg(proc.pid, signal.SIGTERM)
+
+    def close(self):
+        """Stop the worker, kill a running HandBrake"""
+        self.queue.put(None)
+        with self.lock:
+            self.abort.set()
+            if self.proc is not None and self.proc.poll() is None:
+                logging.info("Stopping HandBrake")
+                try:
+                    os.killpg(self.proc.pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+        self.worker.join()
+
+    def finish(self, srcpath):
+        """
+        Transcode the remaining files of srcpath and wait until all transcodes are done\n
+        :param srcpath: Path of the ripped mkv files
+        """
+        try:
+            # This will fail if the directory raw gets deleted
+            for files in os.listdir(srcpath):
+                self.submit(srcpath, files)
+            utils.database_updater({"status": JobState.TRANSCODE_ACTIVE.value}, self.job)
+            self.queue.put(None)
+            self.worker.join()
+        finally:
+            self.close()
+        if self.error is not None:
+            raise self.error
+        for files, result in self.results:
+            filename = os.path.splitext(files)[0] + "." + cfg.arm_config["DEST_EXT"]
+            for track in self.job.tracks.filter_by(filename=filename):
+                track.status = "fail" if result.returncode else "success"
+            db.session.commit()
+            if result.returncode:
+                logging.error(f"Handbrake encoding of file {shlex.quote(files)} failed with code: "
+                              f"{result.returncode}({result.stderr})")
+                result.check_returncode()
+        logging.info(PROCESS_COMPLETE)
+        logging.debug(f"\n\r{self.job.pretty_table()}")
+
+
+def run(options, logfile, reporter=None, started=None, on_block=None):
+    """
+    Run HandBrakeCLI and publish its progress\n
+    HandBrake runs without a shell in its own process group, with --json it
+    writes its progress as json blocks to stdout, they are read as they come
+    and handed to reporter. Its log (stderr) is appended to logfile line by
+    line, whole lines in the order they come, between the lines ARM logs and
+    those of other HandBrake processes of the job. HandBrake is stopped if the caller is interrupted and,
+    see stop_on_abandon(), if the job is abandoned.\n
+    :param list options: HandBrakeCLI options, without --json
+    :param logfile: job log HandBrake's log is appended to
+    :param reporter: progress.Reporter of the TRANSCODE stage
+    :param started: optional callable, called with the Popen of HandBrake
+    :param on_block: optional callable, called with the name and dict of every json block
+    :return: subprocess.CompletedProcess, stderr holds the last lines HandBrake logged
+    """
+    cmd = ["nice", *shlex.split(cfg.arm_config["HANDBRAKE_CLI"]), *options, "--json"]
+    logging.debug(f"Sending command: {shlex.join(cmd)}")
+    if threading.current_thread() is threading.main_thread():
+        stop_on_abandon()
+    tail = collections.deque(maxlen=ERROR_LINES)
+    with open(logfile, "a", buffering=1, encoding="utf-8") as log, \
+            subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, errors="replace",
+                             start_new_session=True) as proc:
+        _running.add(proc)
+        copier = threading.Thread(target=_copy_log, args=(proc.stderr, log, tail), name="handbrake-log",
+                                  daemon=True)
+        copier.start()
+        finished = False
+        try:
+            if started is not None:
+                started(proc)
+            for name, block in json_blocks(proc.stdout):
+                if on_block is not None:
+                    on_block(name, block)
+                if name == "Progress" and reporter is not None:
+                    publish_progress(reporter, block)
+            proc.wait()
+            finished = True
+        finally:
+            # interrupted or an exception: don't leave HandBrake running
+            if not finished:
+                stop(proc)
+            copier.join()
+            _running.discard(proc)
+    if reporter is not None:
+        reporter.write()
+    logging.debug(f"PID {proc.pid}: HandBrake exit code {proc.returncode}")
+    return subprocess.CompletedProcess(cmd, proc.returncode, stderr=os.linesep.join(tail))
+
+
+def _copy_log(stream, log, tail):
+    """Copy HandBrake's log lines to the job log, keep the last ones in tail"""
+    for line in stream:
+        with _log_lock:
+            # line buffered, every line is flushed on its own
+            log.write(line if line.endswith("\n") else line + "\n")
+        tail.append(line.rstrip())
+
+
+def json_blocks(lines):
+    """
+    Read the json blocks of HandBrake --json output\n
+    A block starts with its name, e.g. 'Progress: {', or its name on a line of
+    its own and '{' on the next, and ends with a '}' line.\n
+    :param lines: iterable of output lines
+    :return: generator of (name, dict)
+    """
+    name, block = None, []
+    for line in lines:
+        line = line.rstrip()
+        if name is None:
+            match = JSON_BLOCK.match(line)
+            if match is None:
+                continue
+            name, block = match.group(1), [match.group(2)] if match.group(2) else []
+            if not block:
+                continue
+        elif not block and not line.startswith("{"):
+            # a name without a block, e.g. a log line
+            name = None
+            continue
+        else:
+            block.append(line)
+        if line.endswith("}") and (len(block) == 1 or line == "}"):
+            try:
+                yield name, json.loads("\n".join(block))
+            except ValueError as error:
+                logging.debug(f"Skipping HandBrake {name} output: {error}")
+            name, block = None, []
+
+
+def publish_progress(reporter, state):
+    """
+    Hand a HandBrake json progress state to reporter\n
+    :param reporter: progress.Reporter
+    :param dict state: 'Progress' block, e.g. {"State": "WORKING", "Working": {"Progress": 0.5, ...}}
+    """
+    task = PROGRESS_TASKS.get(state.get("State"))
+    if task is None:
+        return
+    values = state.get(state["State"].capitalize(), {})
+    fields = {"task": task, "percent": round(100 * float(values.get("Progress", 0)), 2)}
+    if state["State"] == "WORKING":
+        if values.get("PassCount", 1) > 1:
+            fields["task"] = f"{task} pass {values['Pass']}/{values['PassCount']}"
+        if values.get("ETASeconds", -1) >= 0:
+            fields["eta"] = values["ETASeconds"]
+        fields["fps"] = round(float(values.get("Rate", 0)), 1)
+    reporter.update(**fields)
+
+
+def stop(proc):
+    """
+    Terminate the process group of a running HandBrake, kill it if it does not exit in time\n
+    :param proc: subprocess.Popen of HandBrake
+    """
+    if proc.poll() is not None:
+        return
+    logging.info(f"PID {proc.pid}: stopping HandBrake")
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait(timeout=TERMINATE_TIMEOUT)
+    except ProcessLookupError:
+        pass
+    except subprocess.TimeoutExpired:
+        logging.warning(f"PID {proc.pid}: HandBrake did not terminate, killing it")
+        os.killpg(proc.pid, signal.SIGKILL)
+        proc.wait()
+
+
+def stop_on_abandon():
+    """
+    Stop the running HandBrake processes when the ripper gets SIGTERM\n
+    The UI abandons a job by terminating its ripper, HandBrake runs in its own
+    process group and would keep transcoding. The handler stops HandBrake and
+    hands the signal on, the ripper exits as before. Only callable from the
+    main thread.
+    """
+    global _previous_sigterm
+    current = signal.getsignal(signal.SIGTERM)
+    if current is _abandon:
+        return
+    _previous_sigterm = current if current is not None else signal.SIG_DFL
+    signal.signal(signal.SIGTERM, _abandon)
+
+
+def _abandon(signum, frame):
+    """SIGTERM handler of stop_on_abandon()"""
+    for proc in list(_running):
+        stop(proc)
+    signal.signal(signum, _previous_sigterm)
+    os.kill(os.getpid(), signum)
+
+
 def get_track_info(srcpath, job):
     """
-    Use HandBrake to get track info and update Track class\n\n
+    Use HandBrake to get track info and update Track class\n
+    Reads the --json scan of HandBrake, the text scan is the fallback for
+    HandBrake versions without json output.\n
     :param srcpath: Path to disc\n
     :param job: Job instance\n
     :return: None
     """
     logging.info("Using HandBrake to get information on all the tracks on the disc.  This will take a few minutes...")
 
-    cmd = f'{cfg.arm_config["HANDBRAKE_LOCAL"]} -i {shlex.quote(srcpath)} -t 0 --scan'
-    logging.debug(f"Sending command: {cmd}")
-    hand_break_output = handbrake_char_encoding(cmd)
-
-    if hand_break_output is not None:
-        t_pattern = re.compile(r'.*\+ title *')
-        pattern = re.compile(r'.*duration:.*')
-        seconds = 0
-        t_no = 0
-        fps = float(0)
-        aspect = 0
-        result = None
-        main_feature = False
-        for line in hand_break_output:
-
-            # get number of titles
-            if result is None:
-                # scan: DVD has 12 title(s)
-                result = re.search(r'scan: (BD|DVD) has (\d{1,3}) title\(s\)', line)
-
-                if result:
-                    titles = result.group(2).strip()
-                    logging.debug(f"Line found is: {line}")
-                    logging.info(f"Found {titles} titles")
-                    job.no_of_titles = titles
-                    db.session.commit()
-
-            main_feature, t_no = title_finder(aspect, fps, job, line, main_feature, seconds, t_no, t_pattern)
-            seconds = seconds_builder(line, pattern, seconds)
-            main_feature = is_main_feature(line, main_feature)
-
-            if (re.search(" fps", line)) is not None:
-                fps = line.rsplit(' ', 2)[-2]
-                aspect = line.rsplit(' ', 3)[-3]
-                aspect = str(aspect).replace(",", "")
-    else:
-        logging.info("HandBrake unable to get track information")
+    tracks = utils.TrackBatch(job)
+    titles = parse_scan_json(handbrake_scan_json(srcpath), tracks)
+    if titles is None:
+        logging.info("HandBrake json scan not available, reading the text scan")
+        cmd = f'{cfg.arm_config["HANDBRAKE_LOCAL"]} -i {shlex.quote(srcpath)} -t 0 --scan --previews {SCAN_PREVIEWS}:0'
+        logging.debug(f"Sending command: {cmd}")
+        hand_break_output = handbrake_char_encoding(cmd)
+        if isinstance(hand_break_output, list):
+            titles = parse_scan_text(hand_break_output, tracks)
+        else:
+            logging.info("HandBrake unable to get track information")
+
+    if titles is not None:
+        logging.info(f"Found {titles} titles")
+        job.no_of_titles = titles
+        db.session.commit()
+    tracks.flush()
+
+
+def handbrake_scan_json(srcpath):
+    """
+    Scan all titles of srcpath with HandBrake --json\n
+    :param srcpath: Path to disc
+    :return: str stdout of HandBrake, None if the scan failed
+    """
+    cmd = shlex.split(cfg.arm_config["HANDBRAKE_LOCAL"]) + [
+        "-i", srcpath, "-t", "0", "--scan", "--json", "--previews", f"{SCAN_PREVIEWS}:0"]
+    logging.debug(f"Sending command: {shlex.join(cmd)}")
+    try:
+        return subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                              check=True).stdout.decode("utf-8", "ignore")
+    except (OSError, subprocess.CalledProcessError) as hb_error:
+        logging.info(f"HandBrake json scan failed: {hb_error}")
+        return None
+
+
+def parse_scan_json(output, tracks):
+    """
+    Add the titles of a HandBrake --json scan to tracks\n
+    HandBrake writes its progress and the scanned titles as json blocks to
+    stdout, the titles are the block after "JSON Title Set:".\n
+    :param str output: stdout of HandBrake --scan --json
+    :param tracks: utils.TrackBatch the titles are added to
+    :return: number of titles, None if output has no readable title set
+    """
+    start = output.find(SCAN_JSON_TITLE_SET) if output else -1
+    if start < 0:
+        return None
+    try:
+        title_set, _ = json.JSONDecoder().raw_decode(output, output.index("{", start))
+        main_feature = title_set.get("MainFeature", -1)
+        titles = [(title["Index"],
+                   scan_json_seconds(title.get("Duration", {})),
+                   scan_json_aspect(title.get("Geometry", {})),
+                   scan_json_fps(title.get("FrameRate", {})),
+                   title["Index"] == main_feature,
+                   scan_json_languages(title.get("AudioList", [])),
+                   scan_json_languages(title.get("SubtitleList", [])))
+                  for title in title_set["TitleList"]]
+    except (ValueError, KeyError, TypeError, AttributeError) as error:
+        logging.info(f"HandBrake json scan not readable: {error!r}")
+        return None
+
+    for t_no, seconds, aspect, fps, is_main, audio, subtitles in titles:
+        tracks.put(t_no, seconds, aspect, fps, is_main, "HandBrake", audio=audio, subtitles=subtitles)
+    return len(titles)
+
+
+def scan_json_seconds(duration):
+    """Length in seconds of a json Duration, as HandBrake shows it in the text scan"""
+    return int(duration.get("Hours", 0)) * 3600 + int(duration.get("Minutes", 0)) * 60 + \
+        int(duration.get("Seconds", 0))
+
+
+def scan_json_aspect(geometry):
+    """Display aspect of a json Geometry, as HandBrake shows it in the text scan"""
+    par = geometry.get("PAR", {})
+    if not geometry.get("Height") or not par.get("Den"):
+        return 0
+    return f"{geometry['Width'] * par['Num'] / (geometry['Height'] * par['Den']):.2f}"
+
+
+def scan_json_fps(frame_rate):
+    """Frames per second of a json FrameRate"""
+    if not frame_rate.get("Den"):
+        return float(0)
+    return round(frame_rate["Num"] / frame_rate["Den"], 3)
+
+
+def scan_json_languages(streams):
+    """Comma separated ISO 639-2 codes of the audio or subtitle streams of a title"""
+    return ",".join(stream.get("LanguageCode") or "und" for stream in streams)
+
+
+def parse_scan_text(hand_break_output, tracks):
+    """
+    Add the titles of a HandBrake text scan to tracks\n
+    :param list hand_break_output: lines of the HandBrake scan
+    :param tracks: utils.TrackBatch the titles are added to
+    :return: number of titles HandBrake reports, None if it reports none
+    """
+    t_pattern = re.compile(r'.*\+ title *')
+    pattern = re.compile(r'.*duration:.*')
+    seconds = 0
+    t_no = 0
+    fps = float(0)
+    aspect = 0
+    result = None
+    main_feature = False
+    titles = None
+    for line in hand_break_output:
+
+        # get number of titles
+        if result is None:
+            # scan: DVD has 12 title(s)
+            result = re.search(r'scan: (BD|DVD) has (\d{1,3}) title\(s\)', line)
+
+            if result:
+                titles = int(result.group(2).strip())
+                logging.debug(f"Line found is: {line}")
+
+        main_feature, t_no = title_finder(aspect, fps, tracks, line, main_feature, seconds, t_no, t_pattern)
+        seconds = seconds_builder(line, pattern, seconds)
+        main_feature = is_main_feature(line, main_feature)
+
+        if (re.search(" fps", line)) is not None:
+            fps = line.rsplit(' ', 2)[-2]
+            aspect = line.rsplit(' ', 3)[-3]
+            aspect = str(aspect).replace(",", "")
 
-    utils.put_track(job, t_no, seconds, aspect, fps, main_feature, "HandBrake")
+    if t_no != 0:
+        tracks.put(t_no, seconds, aspect, fps, main_feature, "HandBrake")
+    return titles
 
 
-def title_finder(aspect, fps, job, line, main_feature, seconds, t_no, t_pattern):
+def title_finder(aspect, fps, tracks, line, main_feature, seconds, t_no, t_pattern):
     """
 
     :param aspect:
     :param fps:
-    :param job:
+    :param tracks: utils.TrackBatch the previous title is added to
     :param line:
     :param main_feature:
     :param seconds:
@@ -302,7 +1005,7 @@ def title_finder(aspect, fps, job, line, main_feature, seconds, t_no, t_pattern)
     """
     if (re.search(t_pattern, line)) is not None:
         if t_no != 0:
-            utils.put_track(job, t_no, seconds, aspect, fps, main_feature, "HandBrake")
+            tracks.put(t_no, seconds, aspect, fps, main_feature, "HandBrake")
 
         main_feature = False
         t_no = line.rsplit(' ', 1)[-1]
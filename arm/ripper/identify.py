@@ -1,99 +1,78 @@
 #!/usr/bin/env python3
 """Identification of dvd/bluray"""
 
-import os
+import concurrent.futures
+import difflib
 import logging
-import urllib
 import re
-import datetime
 import unicodedata
-import json
-from ast import literal_eval
 
-import pydvdid
 import xmltodict
 import arm.config.config as cfg
 
-from arm.ripper import utils
-from arm.ripper.ProcessHandler import arm_subprocess
-from arm.ui import db
+from arm import metadata
+from arm.database import db
+from arm.ripper import disc_probe, title_index, utils
 
 # flake8: noqa: W605
-from arm.ui import utils as ui_utils
 
-
-def check_if_mounted(mount_return_code, findmnt_return_code):
-    """
-    Function to check if mounting disc was success
-     checking the return value of 2 linux shell functions;
-     mount and findmnt.  mount can, in rare occasions,
-     return no errors (0) yet still have not mounted
-     the drive as expected.  findmnt, ran after the
-     mount functions, confirms that the drive is indeed mounted.
-     anything but 0 means we failed to mount disc
-     :param mount_return_code: The return value of the linux "mount" function
-     :param findmnt_return_code: The return value of the linux "findmnt" function
-    """
-    logging.debug(f"OS mounted value: {mount_return_code}")
-    logging.debug(f"OS findmnt -M value: {findmnt_return_code}")
-    success = False
-    if mount_return_code == 0 and findmnt_return_code == 0:
-        logging.info("Mounting disc was successful")
-        success = True
-    else:
-        logging.error("Mounting failed! Rip might have problems")
-    return success
+SEARCH_WORKERS = 4
+"""Metadata searches of identify_loop() running at the same time"""
+GOOD_SIMILARITY = 0.75
+"""Title similarity of a match that ends identify_loop(), wider queries are only searched below it"""
 
 
 def identify(job):
-    """Identify disc attributes"""
+    """
+    Identify disc attributes
+
+    Uses what the disc probe (disc_probe.probe) found, the disc is not mounted again
+    """
     logging.debug("Identify Entry point --- job ----")
-    logging.info(f"Mounting disc to: {job.mountpoint}")
-    if not os.path.exists(str(job.mountpoint)):
-        os.makedirs(str(job.mountpoint))
-    # Check and mount drive - log error if failed
-    mount_return_code = os.system(f"mount {job.mountpoint}")
-    findmnt_return_code = os.system(f"findmnt -M {job.mountpoint}")
-    mounted = check_if_mounted(mount_return_code, findmnt_return_code)
-    # get_disc_type() checks local files, no need to run unless we can mount
-    if mounted:
+    probe = job.probe or disc_probe.DiscProbe()
+    # get_disc_type() uses the folders found on the disc, no need to run unless we could mount
+    if probe.mounted:
         # Check with the job class to get the correct disc type
-        job.get_disc_type(utils.find_file("HVDVD_TS", job.mountpoint))
+        job.get_disc_type(probe)
 
     if job.disctype in ["dvd", "bluray"]:
 
         logging.info("Disc identified as video")
 
+        # crc_id is the DVD crc64 of the ARM crc64 database, a Blu-ray is only known by job.fingerprint
+        if job.disctype == "dvd" and not job.crc_id and probe.fingerprint:
+            job.crc_id = probe.fingerprint
+            db.session.commit()
+
         if cfg.arm_config["GET_VIDEO_TITLE"]:
-            res = False
-            if job.disctype == "dvd":
-                res = identify_dvd(job)
-            if job.disctype == "bluray":
-                res = identify_bluray(job)
-            if res:
-                get_video_details(job)
+            # Discs ARM has seen before are identified without going online
+            match = title_index.lookup(job.fingerprint, job.label, probe.bdmt_year)
+            if match:
+                identify_from_index(job, match)
             else:
-                job.hasnicetitle = False
-                db.session.commit()
+                res = False
+                if job.disctype == "dvd":
+                    res = identify_dvd(job)
+                if job.disctype == "bluray":
+                    res = identify_bluray(job)
+                if res:
+                    get_video_details(job)
+                else:
+                    job.hasnicetitle = False
+                    db.session.commit()
 
             logging.info(f"Disc title Post ident -  title:{job.title} "
                          f"year:{job.year} video_type:{job.video_type} "
                          f"disctype: {job.disctype}")
             logging.debug(f"identify.job.end ---- \n\r{job.pretty_table()}")
-    # No need to warn if we cant unmount
-    os.system("umount " + job.devpath)
 
 
 def identify_bluray(job):
     """ Get's Blu-Ray title by parsing XML in bdmt_eng.xml """
 
-    try:
-        with open(job.mountpoint + '/BDMV/META/DL/bdmt_eng.xml', "rb") as xml_file:
-            doc = xmltodict.parse(xml_file.read())
-    except OSError as error:
+    if job.probe is None or job.probe.bdmt_eng is None:
         logging.error("Disc is a bluray, but bdmt_eng.xml could not be found. "
-                      "Disc cannot be identified.  Error "
-                      f"number is: {error.errno}")
+                      "Disc cannot be identified.")
         # Maybe call OMdb with label when we can't find any ident on disc ?
         # Attempt to parse label
         if str(job.label) == "":
@@ -110,6 +89,7 @@ def identify_bluray(job):
             db.session.commit()
             return True
 
+    doc = xmltodict.parse(job.probe.bdmt_eng)
     try:
         bluray_title = doc['disclib']['di:discinfo']['di:title']['di:name']
         if not bluray_title:
@@ -118,8 +98,7 @@ def identify_bluray(job):
         bluray_title = str(job.label)
         logging.error("Could not parse title from bdmt_eng.xml file.  Disc cannot be identified.")
 
-    bluray_modified_timestamp = os.path.getmtime(job.mountpoint + '/BDMV/META/DL/bdmt_eng.xml')
-    bluray_year = (datetime.datetime.fromtimestamp(bluray_modified_timestamp).strftime('%Y'))
+    bluray_year = job.probe.bdmt_year
 
     bluray_title = unicodedata.normalize('NFKD', str(bluray_title)).encode('ascii', 'ignore').decode()
 
@@ -147,14 +126,13 @@ def identify_dvd(job):
     if not job.label or job.label == "":
         job.label = "not identified"
     try:
-        crc64 = pydvdid.compute(str(job.mountpoint))
+        crc64 = job.probe.fingerprint if job.probe else None
+        if not crc64:
+            raise ValueError("the disc probe found no crc64")
         dvd_title = f"{job.label}_{crc64}"
         logging.info(f"DVD CRC64 hash is: {crc64}")
         job.crc_id = str(crc64)
-        urlstring = f"https://1337server.pythonanywhere.com/api/v1/?mode=s&crc64={crc64}"
-        logging.debug(urlstring)
-        dvd_info_xml = urllib.request.urlopen(urlstring).read()
-        arm_api_json = json.loads(dvd_info_xml)
+        arm_api_json = metadata.arm_crc64_lookup(crc64)
         logging.debug(f"dvd xml - {arm_api_json}")
         logging.debug(f"results = {arm_api_json['results']}")
         if arm_api_json['success']:
@@ -189,11 +167,10 @@ def identify_dvd(job):
     dvd_title = re.sub(r"SKU\b", "", dvd_title)
     logging.debug(f"dvd_title SKU$: {dvd_title}")
     
-    # Do we really need metaselector if we have got from ARM online db?
+    # Do we really need to search if we have got from ARM online db?
     try:
-        dvd_info_xml = metadata_selector(job, dvd_title, year)
+        dvd_info_xml = identify_loop(job, dvd_title, year)
         logging.debug(f"DVD_INFO_XML: {dvd_info_xml}")
-        identify_loop(job, dvd_info_xml, dvd_title, year)
     except Exception:
         dvd_info_xml = None
         logging.debug("Cant connect to online service!")
@@ -202,24 +179,41 @@ def identify_dvd(job):
         job.title = str(job.label)
         job.year = None
 
-    # Track 99 detection
-    # -Oy means output a python dict
-    output = arm_subprocess(["lsdvd", "-Oy", job.devpath])
-    if output:
-        try:
-            # literal_eval only accepts literals so we have to adjust the output slightly
-            tracks = literal_eval(re.sub(r"^.*\{", "{", output)).get("track", [])
-            logging.debug(f"Detected {len(tracks)} tracks")
-            if len(tracks) == 99:
-                job.has_track_99 = True
-                if cfg.arm_config["PREVENT_99"]:
-                    raise Exception("Track 99 found and PREVENT_99 is enabled")
-        except (SyntaxError, AttributeError) as e:
-            logging.error("Failed to parse lsdvd output", exc_info=e)
-
+    check_track_99(job)
     return True
 
 
+def check_track_99(job):
+    """
+    Track 99 detection, the disc probe counted the titles
+    :param job: Current job
+    :raises Exception: if the DVD has 99 tracks and PREVENT_99 is enabled
+    """
+    if job.probe and job.probe.title_count is not None:
+        logging.debug(f"Detected {job.probe.title_count} tracks")
+        if job.probe.has_track_99:
+            job.has_track_99 = True
+            if cfg.arm_config["PREVENT_99"]:
+                raise Exception("Track 99 found and PREVENT_99 is enabled")
+
+
+def identify_from_index(job, match):
+    """
+    Take the title of a disc found in the offline title index
+    :param job: Current job
+    :param match: title_index.Match
+    """
+    logging.info(f"Found {match.title} ({match.year}) in the title index by {match.reason}, score {match.score}")
+    args = {'hasnicetitle': True}
+    for key, value in (('title', match.title), ('year', match.year), ('video_type', match.video_type),
+                       ('imdb_id', match.imdb_id), ('poster_url', match.poster_url)):
+        if value:
+            args[key] = args[f"{key}_auto"] = value
+    utils.database_updater(args, job)
+    if job.disctype == "dvd":
+        check_track_99(job)
+
+
 def get_video_details(job):
     """ Clean up title and year.  Get video_type, imdb_id, poster_url from
     omdbapi.com webservice.\n
@@ -234,6 +228,10 @@ def get_video_details(job):
     if title == "not identified" or title is None or title == "":
         logging.info("Disc couldn't be identified")
         return
+    if job.hasnicetitle and job.imdb_id:
+        # identify_dvd() searched the provider for this disc already
+        logging.info(f"Disc already identified as {title} ({job.year}), not searching again")
+        return
     title = re.sub('[_ ]', "+", title.strip())
 
     # strip all non-numeric chars and use that for year
@@ -246,7 +244,7 @@ def get_video_details(job):
     logging.debug(f"Calling webservice with title: {title} and year: {year}")
 
     try:
-        identify_loop(job, None, title, year)
+        identify_loop(job, title, year)
     except Exception as error:
         logging.info(f"Identification failed with the error: {error}. Continuing...")
 
@@ -280,104 +278,166 @@ def update_job(job, search_results):
     return utils.database_updater(args, job)
 
 
-def metadata_selector(job, title=None, year=None):
+def provider_search(title=None, year=None):
     """
-    Used to switch between OMDB or TMDB as the metadata provider\n
+    Search the metadata provider, without touching the job\n
     - TMDB returned queries are converted into the OMDB format
 
-    :param job: The job class
     :param title: this can either be a search string or movie/show title
     :param year: the year of movie/show release
 
     :return: json/dict object or None
     """
-    search_results = None
+    year = str(year) if year else None
     if cfg.arm_config['METADATA_PROVIDER'].lower() == "tmdb":
         logging.debug("provider tmdb")
-        search_results = ui_utils.tmdb_search(title, year)
-        if search_results is not None:
-            update_job(job, search_results)
-    elif cfg.arm_config['METADATA_PROVIDER'].lower() == "omdb":
+        return metadata.tmdb_search(title, year)
+    if cfg.arm_config['METADATA_PROVIDER'].lower() == "omdb":
         logging.debug("provider omdb")
-        search_results = ui_utils.call_omdb_api(str(title), str(year))
-        if search_results is not None:
-            update_job(job, search_results)
-    else:
-        logging.debug(cfg.arm_config['METADATA_PROVIDER'])
-        logging.debug("unknown provider - doing nothing, saying nothing. Getting Kryten")
-    return search_results
+        return metadata.call_omdb_api(str(title), year)
+    logging.debug(cfg.arm_config['METADATA_PROVIDER'])
+    logging.debug("unknown provider - doing nothing, saying nothing. Getting Kryten")
+    return None
 
 
-def identify_loop(job, response, title, year):
+def candidate_queries(title, year):
     """
+    All (title, year) queries worth trying for a title, most specific first
+
+    The title with the year, the year before (the dvd release is often the year
+    after the movie) and without the year, then with "-" suffixes stripped, then
+    with the last word stripped one at a time, with and without the year.
 
-    :param job:
-    :param response:
-    :param title:
-    :param year:
+    :param title: title, words separated by "+", "_" or spaces
+    :param year: year or None
+    :return: list of (title, year)
     """
-    # handle failures
-    # this is a little kludgy, but it kind of works...
-    logging.debug(f"Response = {response}")
-    if response is None:
-        # try with year first
-        response = try_with_year(job, response, title, year)
-        # try submitting without the year
-        response = try_without_year(job, response, title)
-
-        if response is None:
-            while response is None and title.find("-") > 0:
-                title = title.rsplit('-', 1)[0]
-                logging.debug(f"Trying title: {title}")
-                response = metadata_selector(job, title, year)
-                logging.debug(f"response: {response}")
-
-            # if still fail, then try slicing off the last word in a loop
-            while response is None and title.count('+') > 0:
-                title = title.rsplit('+', 1)[0]
-                logging.debug(f"Trying title: {title}")
-                response = metadata_selector(job, title, year)
-                logging.debug(f"response: {response}")
-                if response is None:
-                    # Still failing - try the words we have without year
-                    logging.debug("Removing year...")
-                    response = metadata_selector(job, title)
-
-
-def try_without_year(job, response, title):
+    year = str(year) if year else None
+    candidates = []
+    if year:
+        candidates += [(title, year), (title, str(int(year) - 1))]
+    candidates.append((title, None))
+    shortened = title
+    while shortened.find("-") > 0:
+        shortened = shortened.rsplit('-', 1)[0]
+        candidates.append((shortened, year))
+    while re.search(r"[+_ ]", shortened.strip("+_ ")):
+        shortened = re.split(r"[+_ ](?=[^+_ ]*$)", shortened.strip("+_ "))[0]
+        candidates += [(shortened, year), (shortened, None)]
+    # no duplicates, keep the order
+    return list(dict.fromkeys((query, query_year) for query, query_year in candidates if query.strip("+_ -")))
+
+
+def _words(title):
+    """Lower case words of a title, for comparing"""
+    return " ".join(re.findall(r"[a-z0-9]+", str(title).lower().replace("&", " and ")))
+
+
+def score_result(title, year, result):
     """
+    How well a search result matches the title of the disc
 
-    :param job:
-    :param response:
-    :param title:
-    :return:
+    :param title: title of the disc
+    :param year: year of the disc or None
+    :param result: one entry of the 'Search' list
+    :return: (score between 0 and 1, title similarity, years apart or None)
     """
-    if response is None:
-        logging.debug("Removing year...")
-        response = metadata_selector(job, title)
-        logging.debug(f"response: {response}")
-    return response
+    similarity = difflib.SequenceMatcher(None, _words(title), _words(result.get('Title', ""))).ratio()
+    result_year = re.match(r"\d{4}", str(result.get('Year', "")))
+    if not year or not result_year:
+        return similarity, similarity, None
+    distance = abs(int(result_year.group()) - int(year))
+    # 5 or more years apart counts as no year match
+    year_score = max(0.0, 1 - distance / 5)
+    return 0.8 * similarity + 0.2 * year_score, similarity, distance
 
 
-def try_with_year(job, response, title, year):
+def query_tiers(candidates):
     """
+    Group the candidate queries by their title, most specific first
 
-    :param job:
-    :param response:
-    :param title:
-    :param year:
-    :return:
+    :param candidates: list of (title, year) of candidate_queries()
+    :return: list of lists of indexes into candidates
     """
-    # If we have a response don't overwrite it
-    if response is not None:
-        return response
-    if year:
-        response = metadata_selector(job, title, str(year))
-        logging.debug(f"response: {response}")
-    # If we still don't have a response try removing a year off
-    if response is None and year:
-        # This accounts for when
-        # the dvd release date is the year following the movie release date
-        logging.debug("Subtracting 1 year...")
-        response = metadata_selector(job, title, str(int(year) - 1))
-    return response
+    tiers = {}
+    for index, (query, _) in enumerate(candidates):
+        tiers.setdefault(query, []).append(index)
+    return list(tiers.values())
+
+
+def good_match(score):
+    """A match of score_result() that needs no wider query: the title is close, the year (if known) too"""
+    _, similarity, distance = score
+    return similarity >= GOOD_SIMILARITY and (distance is None or distance <= 1)
+
+
+def _search_tier(executor, candidates, tier, title, year):
+    """
+    Run the queries of one tier at once
+
+    :return: list of (sort key, score, candidate index, result)
+    """
+    ranked = []
+    futures = {executor.submit(provider_search, *candidates[index]): index for index in tier}
+    for future in concurrent.futures.as_completed(futures):
+        if future.cancelled():
+            continue
+        index = futures[future]
+        try:
+            results = future.result()
+        except Exception as error:
+            logging.info(f"Search for {candidates[index]} failed: {error}")
+            continue
+        if not results or 'Search' not in results:
+            continue
+        for position, result in enumerate(results['Search']):
+            score = score_result(title, year, result)
+            ranked.append(((-score[0], index, position), score, index, result))
+            if score[1] == 1 and score[2] in (None, 0) and year:
+                # exact match, no need to ask for the rest
+                for pending in futures:
+                    pending.cancel()
+    return ranked
+
+
+def identify_loop(job, title, year):
+    """
+    Search for the candidate queries of the title and update the job with the best match
+
+    The queries of candidate_queries() are searched in tiers of the same title,
+    the full title (with and without the year) first. The queries of a tier run
+    on SEARCH_WORKERS threads, a wider tier is only searched if the results so
+    far hold no good_match(), so a disc label that finds its title right away
+    costs one tier of provider calls. Results are ranked by score_result(), ties
+    go to the more specific query and the provider's order, so the pick is
+    always the same.
+
+    :param job: Current job
+    :param title: title of the disc
+    :param year: year of the disc or None
+    :return: the best match, None if nothing was found
+    """
+    year = re.sub(r"\D", "", str(year)) if year else None
+    candidates = candidate_queries(title, year)
+    logging.debug(f"Searching for up to {len(candidates)} candidate queries: {candidates}")
+    ranked = []
+    queried = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=SEARCH_WORKERS) as executor:
+        for tier in query_tiers(candidates):
+            queried += len(tier)
+            ranked += _search_tier(executor, candidates, tier, title, year)
+            ranked.sort(key=lambda entry: entry[0])
+            if ranked and good_match(ranked[0][1]):
+                break
+    if not ranked:
+        logging.info(f"No search results for {title} ({year})")
+        return None
+    for _, (score, similarity, distance), index, result in ranked[:3]:
+        logging.debug(f"Candidate {result.get('Title')} ({result.get('Year')}) from query {candidates[index]}: "
+                      f"score {score:.2f}, title similarity {similarity:.2f}, years apart {distance}")
+    _, (score, similarity, distance), index, best = ranked[0]
+    logging.info(f"Best match for {title} ({year}) is {best.get('Title')} ({best.get('Year')}) from query "
+                 f"{candidates[index]}: score {score:.2f}, title similarity {similarity:.2f}, "
+                 f"years apart {distance}, {len(ranked)} results of {queried} queries")
+    update_job(job, {'Search': [best]})
+    return best
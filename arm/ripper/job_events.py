@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Wake a ripper waiting for user input on a job
+
+While the ripper waits for a manual title or for the user to start a manual
+mode job, it listens on a FIFO, LOGPATH/events/<job_id>.fifo. The UI calls
+notify() after it committed the change, which wakes the ripper right away
+instead of on its next database poll. The ripper still refreshes the job every
+POLL_INTERVAL seconds, so a missed or failed notify only delays it.
+
+resource_slots uses the same FIFOs, named slot-<slot_id>, to wake a process
+waiting for a transcode or MakeMKV slot.
+"""
+import errno
+import logging
+import os
+import select
+import time
+
+import arm.config.config as cfg
+from arm.database import db
+
+POLL_INTERVAL = 30  # [s]
+"""Database poll of a waiting ripper, in case a wakeup got lost"""
+
+
+def fifo_path(job_id, logpath=None):
+    """
+    Path of the wakeup FIFO of a job
+
+    :param job_id: job id, or another name for the FIFO
+    :param logpath: LOGPATH of the job, defaults to the current arm.yaml
+    :return: file path
+    """
+    return os.path.join(logpath or cfg.arm_config["LOGPATH"], "events", f"{job_id}.fifo")
+
+
+def notify(job_id, logpath=None):
+    """
+    Wake the ripper waiting on a job, if there is one
+
+    Never blocks and never raises, the waiting ripper falls back to polling.
+
+    :param job_id: job id
+    :param logpath: LOGPATH of the job, defaults to the current arm.yaml
+    :return: True if a waiting ripper was woken
+    """
+    try:
+        fd = os.open(fifo_path(job_id, logpath), os.O_WRONLY | os.O_NONBLOCK)
+    except OSError as error:
+        # ENOENT/ENXIO: nobody is waiting on this job
+        if error.errno not in (errno.ENOENT, errno.ENXIO):
+            logging.debug(f"Could not wake job {job_id}: {error}")
+        return False
+    try:
+        os.write(fd, b"\n")
+    except OSError as error:
+        # EAGAIN: the pipe is full of earlier wakeups, one is enough
+        if error.errno != errno.EAGAIN:
+            logging.debug(f"Could not wake job {job_id}: {error}")
+            return False
+    finally:
+        os.close(fd)
+    return True
+
+
+class Waiter:
+    """
+    Listen for wakeups of one job, use as a context manager
+
+    The FIFO exists for the whole `with` block, so a notify() between two
+    wait() calls is not lost.
+
+    :param job_id: job id
+    :param logpath: LOGPATH of the job, defaults to the current arm.yaml
+    """
+
+    def __init__(self, job_id, logpath=None):
+        self.path = fifo_path(job_id, logpath)
+        self.read_fd = None
+        self.write_fd = None
+
+    def __enter__(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            os.mkfifo(self.path, 0o660)
+            self.read_fd = os.open(self.path, os.O_RDONLY | os.O_NONBLOCK)
+            # keep a writer open, else the FIFO reads as EOF once the first notify() closed it
+            self.write_fd = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+        except OSError as error:
+            logging.warning(f"No wakeups for {self.path}, falling back to polling: {error}")
+            self._close()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def _close(self):
+        for fd in (self.read_fd, self.write_fd):
+            if fd is not None:
+                os.close(fd)
+        self.read_fd = self.write_fd = None
+
+    def wait(self, timeout):
+        """
+        Sleep until woken or until timeout
+
+        :param timeout: seconds
+        :return: True if woken
+        """
+        if self.read_fd is None:
+            time.sleep(timeout)
+            return False
+        readable, _, _ = select.select([self.read_fd], [], [], timeout)
+        if not readable:
+            return False
+        try:
+            # drain, several notifies make one wakeup
+            while os.read(self.read_fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+
+def wait_for(job, check, timeout, waiter):
+    """
+    Wait until check(job) is true, reading the job from the database when woken and every POLL_INTERVAL
+
+    :param job: job, refreshed from the database
+    :param check: function of the job, True when the wait is over
+    :param timeout: seconds
+    :param waiter: Waiter of the job
+    :return: True if check(job) became true within timeout
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        waiter.wait(min(remaining, POLL_INTERVAL))
+        db.session.refresh(job)
+        if check(job):
+            return True
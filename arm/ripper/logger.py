@@ -11,6 +11,7 @@ import logging.handlers
 import time
 
 import arm.config.config as cfg
+from arm.ripper import transcode_limit
 
 
 def setup_logging(job):
@@ -79,14 +80,19 @@ def clean_up_logs(logpath, loglife):
     now = time.time()
     logging.info(f"Looking for log files older than {loglife} days old.")
 
-    logs_folders = [logpath, os.path.join(logpath, 'progress')]
+    progress_dir = os.path.join(logpath, 'progress')
+    # The progress folder also holds the <job>.<stage>.json state files of finished jobs,
+    # the shared transcode limit state is kept
+    logs_folders = {logpath: (".log",), progress_dir: (".log", ".json")}
+    keep = os.path.basename(transcode_limit.state_path(logpath))
     # Loop through each log path
-    for log_dir in logs_folders:
+    for log_dir, extensions in logs_folders.items():
         logging.info(f"Checking path {log_dir} for old log files...")
         # Loop through each file in current folder and remove files older than set in arm.yaml
         for filename in os.listdir(log_dir):
             fullname = os.path.join(log_dir, filename)
-            if fullname.endswith(".log") and os.stat(fullname).st_mtime < now - loglife * 86400:
+            if fullname.endswith(extensions) and filename != keep \
+                    and os.stat(fullname).st_mtime < now - loglife * 86400:
                 logging.info(f"Deleting log file: {filename}")
                 os.remove(fullname)
     return True
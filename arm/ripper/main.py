@@ -6,7 +6,6 @@ For help please visit https://github.com/automatic-ripping-machine/automatic-rip
 """
 import sys
 import argparse  # noqa: E402
-import os  # noqa: E402
 import logging  # noqa: E402
 import logging.handlers  # noqa: E402
 import time  # noqa: E402
@@ -19,13 +18,14 @@ import psutil  # noqa E402
 # set the PATH to /opt/arm so we can handle imports properly
 sys.path.append("/opt/arm")
 
-from arm.ripper import logger, utils, identify, arm_ripper, music_brainz  # noqa: E402
+from arm.ripper import logger, utils, identify, arm_ripper, music_brainz, constants, disc_probe, \
+    title_index  # noqa: E402
 import arm.config.config as cfg  # noqa E402
 from arm.models.config import Config  # noqa: E402
+from arm.models.disc_fingerprint import DiscFingerprint  # noqa: E402
 from arm.models.job import Job, JobState  # noqa: E402
 from arm.models.system_drives import SystemDrives  # noqa: E402
-from arm.ui import app, db, constants  # noqa E402
-from arm.ui.settings import DriveUtils as drive_utils # noqa E402
+from arm.database import db  # noqa E402
 import arm.config.config as cfg  # noqa E402
 from arm.ripper.ARMInfo import ARMInfo  # noqa E402
 
@@ -65,14 +65,16 @@ def log_arm_params(job):
                 "HB_ARGS_DVD", "HB_ARGS_BD", "RAW_PATH", "TRANSCODE_PATH",
                 "COMPLETED_PATH", "EXTRAS_SUB", "EMBY_REFRESH", "EMBY_SERVER",
                 "EMBY_PORT", "NOTIFY_RIP", "NOTIFY_TRANSCODE",
-                "MAX_CONCURRENT_TRANSCODES", "MAX_CONCURRENT_MAKEMKVINFO"):
+                "MAX_CONCURRENT_TRANSCODES", "TRANSCODE_LIMIT_AUTO", "TRANSCODE_LIMIT_MIN",
+                "TRANSCODE_WORKERS", "MAX_CONCURRENT_MAKEMKVINFO"):
         logging.info(f"{key.lower()}: {str(cfg.arm_config.get(key, '<not given>'))}")
     logging.info("******************* End of config parameters *******************")
 
 
-def check_fstab():
+def check_fstab(job):
     """
     Check the fstab entries to see if ARM has been set up correctly
+    :param job: current job
     :return: None
 
     # todo: remove this from the ripper and add into the ARM UI with a warning
@@ -90,6 +92,9 @@ def check_fstab():
 
 def main(logfile, job):
     """main disc processing function"""
+    if job.disctype != "music":
+        # Mount the disc once for everything identification needs
+        job.apply_probe(disc_probe.probe(job))
     logging.info("Starting Disc identification")
     identify.identify(job)
 
@@ -102,7 +107,7 @@ def main(logfile, job):
     utils.check_for_wait(job)
 
     log_arm_params(job)
-    check_fstab()
+    check_fstab(job)
 
     # Ripper type assessment for the various media types
     # Type: dvd/bluray
@@ -139,20 +144,18 @@ def main(logfile, job):
         logging.info("Couldn't identify the disc type. Exiting without any action.")
 
 
-if __name__ == "__main__":
-    # Setup base logger - will log to /var/log/arm.log, /home/arm/logs/arm.log & stdout
-    # This will catch any permission errors
-    arm_log = logger.create_logger("ARM", logging.DEBUG, True, True, True)
-    # Make sure all directories are fully setup
-    utils.arm_setup(arm_log)
-    # Get arguments from arg parser
-    args = entry()
-    devpath = f"/dev/{args.devpath}"
+def process_disc(devpath, arm_log):
+    """
+    Create the job for the disc in devpath and process it
+
+    Used by this script for every udev event and by the workers of the ripper service (daemon.py)
+    :param devpath: device path, e.g. /dev/sr0
+    :param arm_log: ARM logger
+    """
     drive = SystemDrives.query.filter_by(mount=devpath).one()  # unique mounts
 
     # With some drives and some disks, there is a race condition between creating the Job()
     # below and the drive being ready, so give it a chance to get ready (observed with LG SP80NB80)
-    ready_count = 1
     for num in range(1, 11):
         drive.tray_status()
         if drive.ready:
@@ -170,6 +173,11 @@ if __name__ == "__main__":
     # ARM Job starts
     # Create new job
     job = Job(devpath)
+    # Filled by main(), identify_audio_cd() keeps the MusicBrainz disc id of an audio CD in it
+    job.probe = disc_probe.DiscProbe()
+    # The label names the log file
+    if job.disctype == "dvd" and not job.label:
+        job.label = disc_probe.dvd_label(devpath)
     # Setup logging
     log_file = logger.setup_logging(job)
 
@@ -194,7 +202,7 @@ if __name__ == "__main__":
     # Sleep to lower chances of db locked - unlikely to be needed
     time.sleep(1)
     # Associate the job with the drive in the database
-    drive_utils.update_drive_job(job)
+    utils.update_drive_job(job)
     # Add the job.config to db
     config = Config(cfg.arm_config, job_id=job.job_id)  # noqa: F811
     # Check if the drive mode is set to manual, and load to the job config for later use
@@ -206,10 +214,6 @@ if __name__ == "__main__":
         job.manual_mode = False
         db.session.commit()
     utils.database_adder(config)
-    # Log version number
-    with open(os.path.join(cfg.arm_config["INSTALLPATH"], 'VERSION')) as version_file:
-        version = version_file.read().strip()
-
     # Delete old log files
     logger.clean_up_logs(cfg.arm_config["LOGPATH"], cfg.arm_config["LOGLIFE"])
     logging.info(f"Job: {job.label}")  # This will sometimes be none
@@ -230,11 +234,26 @@ if __name__ == "__main__":
         # Possibly add cleanup section here for failed job files
     else:
         job.status = JobState.SUCCESS.value
+        DiscFingerprint.record_success(job)
+        title_index.add_job(job)
     finally:
         job.eject()  # each job stores its eject status, so it is safe to call.
+        if job.probe is not None:
+            job.probe.discard()
         job.stop_time = datetime.datetime.now()
         job_length = job.stop_time - job.start_time
         minutes, seconds = divmod(job_length.seconds + job_length.days * 86400, 60)
         hours, minutes = divmod(minutes, 60)
         job.job_length = f'{hours:d}:{minutes:02d}:{seconds:02d}'
         db.session.commit()
+
+
+if __name__ == "__main__":
+    # Setup base logger - will log to /var/log/arm.log, /home/arm/logs/arm.log & stdout
+    # This will catch any permission errors
+    arm_log = logger.create_logger("ARM", logging.DEBUG, True, True, True)
+    # Make sure all directories are fully setup
+    utils.arm_setup(arm_log)
+    # Get arguments from arg parser
+    args = entry()
+    process_disc(f"/dev/{args.devpath}", arm_log)
@@ -7,10 +7,8 @@ Reference:
 - https://github.com/automatic-ripping-machine/automatic-ripping-machine/wiki/MakeMKV-Codes
 """
 
-import collections
 import dataclasses
 import enum
-import itertools
 import logging
 import os
 import subprocess
@@ -21,8 +19,8 @@ from time import sleep
 
 from arm.models import Track, SystemDrives
 from arm.models.job import JobState
-from arm.ripper import utils
-from arm.ui import db
+from arm.ripper import disc_info_cache, job_events, progress, resource_slots, utils
+from arm.database import db
 import arm.config.config as cfg
 
 from arm.ripper.utils import notify
@@ -195,6 +193,8 @@ class MakeMKVMessage:
 
     `MSG:code,flags,count,message,format,param0,param1,...`
     """
+    __slots__ = ("code", "flags", "count", "message", "sprintf")
+
     code: int
     """Unique Message Code"""
     flags: int
@@ -215,6 +215,8 @@ class MakeMKVMessage:
 @dataclasses.dataclass
 class MakeMKVErrorMessage(MakeMKVMessage):
     """Error Message"""
+    __slots__ = ("error",)
+
     error: str
 
     def __post_init__(self):
@@ -231,6 +233,8 @@ class Titles:
 
     `TCOUT:count`
     """
+    __slots__ = ("count",)
+
     count: int
     """Titles Count"""
 
@@ -246,6 +250,8 @@ class CInfo:
     `CINFO:id,code,value`
     ```
     """
+    __slots__ = ("id", "code", "value")
+
     id: int  # pylint: disable=C0103
     """Attribute ID, see AP_ItemAttributeId in apdefs.h"""
     code: int
@@ -265,6 +271,8 @@ class TInfo(CInfo):
 
     `TINFO:tid,id,code,value`
     """
+    __slots__ = ("tid",)
+
     tid: int
     """Title ID"""
 
@@ -281,6 +289,8 @@ class SInfo(TInfo):
     `SINFO:id,code,value`
 
     """
+    __slots__ = ("sid",)
+
     sid: int
 
     def __post_init__(self):
@@ -295,6 +305,8 @@ class ProgressBarValues:
 
     PRGV:current,total,max
     """
+    __slots__ = ("current", "total", "maximum")
+
     current: int
     """current progress value"""
     total: int
@@ -313,6 +325,8 @@ class ProgressBarTitle:
     """
     Progress Bar Information
     """
+    __slots__ = ("code", "oid", "name")
+
     code: int
     """unique message code"""
     oid: int
@@ -332,6 +346,7 @@ class ProgressBarCurrent(ProgressBarTitle):
 
     PRGC:code,id,name
     """
+    __slots__ = ()
 
 
 @dataclasses.dataclass
@@ -341,6 +356,7 @@ class ProgressBarTotal(ProgressBarTitle):
 
     PRGT:code,id,name
     """
+    __slots__ = ()
 
 
 @dataclasses.dataclass(order=True)
@@ -352,6 +368,7 @@ class DriveInformation:
 
     @see arm.ui.settings.DriveUtils.Drive
     """
+    __slots__ = ("mount", "disc", "info", "flags", "enabled", "visible", "index")
 
     mount: str
     """Device Name (sort index, dynamic)"""
@@ -380,6 +397,8 @@ class Drive(DriveInformation):
     """
     Extended MakeMKV Drive Information (with medium information)
     """
+    # Drive lines are rare (one per device), keep the class level defaults
+    # instead of slots which do not allow them
     loaded: bool = dataclasses.field(init=False, default=False)
     """Device has Medium loaded (changes)"""
     open: bool = dataclasses.field(init=False, default=False)
@@ -506,48 +525,74 @@ def parse_content(content, num_header, num_message):
     ['0', '0', '28', '0', 'ger']
     """
     # The header is considered as the first n non-string entries
-    header = content.split(",", maxsplit=num_header)
+    fields = content.split(",", num_header)
     # (str) messages wrapped in double quotes *may* contain comma
-    message = header[-1].split('","', maxsplit=num_message)
-    return itertools.chain(header[:-1], (x.strip('"') for x in message))
+    message = fields.pop().split('","', num_message)
+    fields.extend([x.strip('"') for x in message])
+    return fields
+
+
+def _parse_msg(content):
+    """MSG:code,flags,count,message,format,param0,param1,..."""
+    fields = parse_content(content, 3, -1)
+    data = MakeMKVMessage(fields[0], fields[1], fields[2], fields[3], fields[4:])
+    # only a handful of message codes need special handling
+    if data.code in MakeMKVOutputChecker.CHECKED_CODES:
+        return MakeMKVOutputChecker(data).check()
+    return data
+
+
+def _parse_sinfo(content):
+    """SINFO:tid,sid,id,code,value"""
+    tid, sid, *info = parse_content(content, 4, 0)
+    return SInfo(*info, tid, sid)
+
+
+def _parse_tinfo(content):
+    """TINFO:tid,id,code,value"""
+    tid, *info = parse_content(content, 3, 0)
+    return TInfo(*info, tid)
+
+
+def _parse_drv(content):
+    """DRV:index,visible,enabled,flags,drive name,disc name,device"""
+    return Drive(*reversed(parse_content(content, 4, 2)))
+
+
+PARSERS = {
+    OutputType.MSG.name: (OutputType.MSG, _parse_msg),
+    OutputType.PRGV.name: (OutputType.PRGV, lambda content: ProgressBarValues(*parse_content(content, 2, 0))),
+    OutputType.PRGC.name: (OutputType.PRGC, lambda content: ProgressBarCurrent(*parse_content(content, 2, 0))),
+    OutputType.PRGT.name: (OutputType.PRGT, lambda content: ProgressBarTotal(*parse_content(content, 2, 0))),
+    OutputType.SINFO.name: (OutputType.SINFO, _parse_sinfo),
+    OutputType.TINFO.name: (OutputType.TINFO, _parse_tinfo),
+    OutputType.CINFO.name: (OutputType.CINFO, lambda content: CInfo(*parse_content(content, 2, 0))),
+    OutputType.DRV.name: (OutputType.DRV, _parse_drv),
+    OutputType.TCOUNT.name: (OutputType.TCOUNT, lambda content: Titles(*parse_content(content, 0, 0))),
+}
+"""Dispatch table of the makemkvcon output prefix to (OutputType, parser)"""
 
 
 def parse_line(line):
-    """Parse MakeMkv Output Line to DataClasses"""
-    if ":" not in line:
+    """
+    Parse MakeMkv Output Line to DataClasses
+
+    >>> parse_line('TCOUNT:2')
+    (<OutputType.TCOUNT: 16>, Titles(count=2))
+    >>> parse_line('CINFO:2,0,"THE TITLE"')
+    (<OutputType.CINFO: 4>, CInfo(id=2, code=0, value='THE TITLE'))
+    """
+    msg_type, sep, content = line.partition(":")
+    if not sep:
         raise MakeMkvParserError("No Message Type Detected")
-    msg_type, content = line.split(":", maxsplit=1)
-    if msg_type not in OutputType.__members__:
-        raise MakeMkvParserError(f"Cannot parse '{msg_type}':'{content}'")
-    msg_type = OutputType[msg_type]
-    if msg_type == OutputType.MSG:
-        temp = parse_content(content, 3, -1)
-        data = MakeMKVMessage(*itertools.islice(temp, 4), list(temp))
-        message = MakeMKVOutputChecker(data).check()
-    elif msg_type == OutputType.PRGV:
-        message = ProgressBarValues(*parse_content(content, 2, 0))
-    elif msg_type == OutputType.PRGC:
-        message = ProgressBarCurrent(*parse_content(content, 2, 0))
-    elif msg_type == OutputType.PRGT:
-        message = ProgressBarTotal(*parse_content(content, 2, 0))
-    elif msg_type == OutputType.SINFO:
-        tid, sid, *info = parse_content(content, 4, 0)
-        message = SInfo(*info, tid, sid)
-    elif msg_type == OutputType.TINFO:
-        tid, *info = parse_content(content, 3, 0)
-        message = TInfo(*info, tid)
-    elif msg_type == OutputType.CINFO:
-        message = CInfo(*parse_content(content, 2, 0))
-    elif msg_type == OutputType.DRV:
-        message = Drive(*reversed(list(parse_content(content, 4, 2))))
-    elif msg_type == OutputType.TCOUNT:
-        message = Titles(*parse_content(content, 0, 0))
-    else:
-        raise MakeMkvParserError(f"Cannot handle '{msg_type}':'{content}'")
-    return msg_type, message
+    try:
+        output_type, parser = PARSERS[msg_type]
+    except KeyError:
+        raise MakeMkvParserError(f"Cannot parse '{msg_type}':'{content}'") from None
+    return output_type, parser(content)
 
 
-def makemkv_info(job, select=None, index=9999, options=None):
+def makemkv_info(job, select=None, index=9999, options=None, stop=None):
     """
     Use MakeMKV info to search the system for optical drives
 
@@ -556,6 +601,7 @@ def makemkv_info(job, select=None, index=9999, options=None):
         select (OutputType): Message Type (default: all)
         index: Makemkv disc index (default: all)
         options: Additional options to be passed to makemkvcon (default: [])
+        stop: Stop condition passed to `run()` (default: read all output)
     Yields:
         dataclasses of selected type:
             - Message
@@ -599,22 +645,21 @@ def makemkv_info(job, select=None, index=9999, options=None):
     max_processes = job.config.MAX_CONCURRENT_MAKEMKVINFO
     job.status = JobState.VIDEO_WAITING.value
     db.session.commit()
-    utils.sleep_check_process("makemkvcon", max_processes, sleep=(10, wait_time, 10))
+    slot = resource_slots.acquire(resource_slots.MAKEMKV_INFO, max_processes, job.job_id)
     job.status = JobState.VIDEO_INFO.value
     db.session.commit()
     try:
-        yield from run(info_options, select)
+        yield from run(info_options, select, stop=stop)
     finally:
         logging.info("MakeMKV info exits.")
         job.status = JobState.VIDEO_WAITING.value
         db.session.commit()
-        if max_processes:
+        if slot is not None:
             logging.info(f"Penalty {wait_time}s")
             # makemkvcon info tends to crash makemkvcon backup|mkv
-            # give other processes time to use this function.
+            # hold the slot a little longer so the next info call doesn't start right away.
             sleep(wait_time)
-        # sleep here until all processes finish (hopefully)
-        utils.sleep_check_process("makemkvcon", max_processes, sleep=wait_time)
+        resource_slots.release(slot)
         job.status = JobState.VIDEO_RIPPING.value
         db.session.commit()
 
@@ -622,10 +667,22 @@ def makemkv_info(job, select=None, index=9999, options=None):
 def get_drives(job):
     """Get information for all active optical drives
 
+    makemkvcon lists all drives before it tries to open any disc, it is stopped
+    as soon as the drive list is complete.
+
     Parameters:
         job: arm.models.job.Job
     """
-    for drive in makemkv_info(job, select=OutputType.DRV):
+    drives_listed = False
+
+    def drive_list_complete(msg_type, data):
+        nonlocal drives_listed
+        if msg_type == OutputType.DRV:
+            drives_listed = True
+            return data.index >= MAX_DEVICES - 1
+        return drives_listed
+
+    for drive in makemkv_info(job, select=OutputType.DRV, stop=drive_list_complete):
         if drive.attached:
             yield drive
 
@@ -646,21 +703,22 @@ def makemkv_backup(job, rawpath):
     cmd += shlex.split(job.config.MKV_ARGS)
     cmd += [
         f"--minlength={job.config.MINLENGTH}",
-        f"--progress={progress_log(job)}",
+        "--progress=-same",
         f"disc:{job.drive.mdisc:d}",
         rawpath,
     ]
     logging.info("Backing up disc")
-    collections.deque(run(cmd, OutputType.MSG), maxlen=0)
+    rip(job, cmd, rawpath)
 
 
-def makemkv_mkv(job, rawpath):
+def makemkv_mkv(job, rawpath, on_ripped=None):
     """
     Rip Blu-ray without enhanced protection or dvd disc
 
     Parameters:
         job: arm.models.job.Job
         rawpath:
+        on_ripped: called with (rawpath, filename) for every title ripped on its own
     """
     # Get drive mode for the current drive
     mode = utils.get_drive_mode(job.devpath)
@@ -681,7 +739,7 @@ def makemkv_mkv(job, rawpath):
             # Response from user provided, process requested tracks
             job.status = JobState.VIDEO_RIPPING.value
             db.session.commit()
-            process_single_tracks(job, rawpath, mode)
+            process_single_tracks(job, rawpath, mode, on_ripped)
         else:
             # Notify User: no action was taken
             title = "ARM is Sad - Job Abandoned"
@@ -697,24 +755,26 @@ def makemkv_mkv(job, rawpath):
         ]
         cmd += shlex.split(job.config.MKV_ARGS)
         cmd += [
-            f"--progress={progress_log(job)}",
+            "--progress=-same",
             f"dev:{job.devpath}",
             "all",
             rawpath,
             f"--minlength={job.config.MINLENGTH}",
         ]
         logging.info("Process all tracks from disc.")
-        collections.deque(run(cmd, OutputType.MSG), maxlen=0)
+        rip(job, cmd, rawpath)
     else:
-        process_single_tracks(job, rawpath, 'auto')
+        process_single_tracks(job, rawpath, 'auto', on_ripped)
 
 
-def makemkv(job):
+def makemkv(job, on_ripped=None):
     """
     Rip Blu-rays/DVDs with MakeMKV
 
     Parameters:
         job: arm.models.job.Job
+        on_ripped: called with (rawpath, filename) for every title ripped on its own,
+            see handbrake.TranscodePipeline
     Returns:
         str: path to ripped files.
     """
@@ -739,7 +799,7 @@ def makemkv(job):
         makemkv_backup(job, rawpath)
     # Rip BluRay or DVD
     elif job.config.RIPMETHOD == "mkv" or job.disctype == "dvd":
-        makemkv_mkv(job, rawpath)
+        makemkv_mkv(job, rawpath, on_ripped)
     else:
         logging.info("I'm confused what to do....  Passing on MakeMKV")
     job.eject()
@@ -763,7 +823,7 @@ def rip_mainfeature(job, track, rawpath):
     ]
     cmd += shlex.split(job.config.MKV_ARGS)
     cmd += [
-        f"--progress={progress_log(job)}",
+        "--progress=-same",
         f"dev:{job.devpath}",
         track.track_number,
         rawpath,
@@ -771,10 +831,10 @@ def rip_mainfeature(job, track, rawpath):
     ]
     logging.info("Ripping main feature")
     # Possibly update db to say track was ripped
-    collections.deque(run(cmd, OutputType.MSG), maxlen=0)
+    rip(job, cmd, rawpath)
 
 
-def process_single_tracks(job, rawpath, mode: str):
+def process_single_tracks(job, rawpath, mode: str, on_ripped=None):
     """
     Process single tracks by MakeMKV one at a time
 
@@ -782,6 +842,7 @@ def process_single_tracks(job, rawpath, mode: str):
         job: arm.models.job.Job
         rawpath:
         mode: drive mode (auto or manual)
+        on_ripped: called with (rawpath, filename) as soon as a track is ripped
     """
     # process one track at a time based on track length
     for track in job.tracks:
@@ -815,13 +876,17 @@ def process_single_tracks(job, rawpath, mode: str):
             ]
             cmd += shlex.split(job.config.MKV_ARGS)
             cmd += [
-                f"--progress={progress_log(job)}",
+                "--progress=-same",
                 f"dev:{job.devpath}",
                 track.track_number,
                 rawpath,
             ]
             logging.debug("Starting to rip single track.")
-            collections.deque(run(cmd, OutputType.MSG), maxlen=0)
+            rip(job, cmd, rawpath, title=int(track.track_number) + 1)
+            track.status = "ripped"
+            db.session.commit()
+            if on_ripped is not None:
+                on_ripped(rawpath, track.filename)
 
 
 def setup_rawpath(job, raw_path):
@@ -879,24 +944,30 @@ def prep_mkv():
         raise UpdateKeyRunTimeError(err.returncode, cmd, output=err.stdout.decode("utf-8"))
 
 
-def progress_log(job):
+def rip(job, cmd, rawpath, title=None):
     """
-    Retrieve the path to the progress log file
-
-    The file path is expected like this by the frontend.
-
-    ToDo: move to Job() class since this is mainly a db wrapper. Then allow the
-          front end to pick up the same method.
+    Run a makemkvcon rip and publish its progress for the UI
 
     Parameters:
         job: arm.models.job.Job
-    Returns:
-        str: log file
-
+        cmd: makemkvcon options, with "--progress=-same"
+        rawpath: output path, to measure bytes written
+        title: number of the title ripped (1 based), if only one
     """
-    logfile = os.path.join(job.config.LOGPATH, "progress", f"{job.job_id:d}.log")
-    logging.debug(f"logging progress to '{logfile}'")
-    return shlex.quote(logfile)
+    reporter = progress.Reporter(job, progress.RIP, titles=job.no_of_titles, output_path=rawpath)
+    reporter.update(title=title)
+    for message in run(cmd, OutputType.MSG | OutputType.PRGV | OutputType.PRGC):
+        if isinstance(message, ProgressBarValues):
+            # the bar of a task without a known size has max 0
+            if message.maximum:
+                reporter.update(percent=round(100 * message.current / message.maximum, 2))
+        elif isinstance(message, ProgressBarCurrent):
+            reporter.update(task=message.name, percent=0.0)
+    reporter.write()
+
+
+CACHED_MESSAGES = {message.__name__: message for message in (CInfo, TInfo, SInfo, Titles)}
+"""Message classes stored in the disc info cache by class name"""
 
 
 class TrackInfoProcessor:
@@ -915,6 +986,7 @@ class TrackInfoProcessor:
         self.fps = 0.0
         self.filename = ""
         self.stream_type = None
+        self.tracks = utils.TrackBatch(job)
 
     def process_messages(self):
         output_types = (
@@ -925,11 +997,25 @@ class TrackInfoProcessor:
         )
         options = []  # add relevant options here if needed
 
-        for message in makemkv_info(self.job, select=output_types, index=self.index, options=options):
-            self._process_message(message)
+        fingerprint = self.job.fingerprint
+        cached = disc_info_cache.load(fingerprint)
+        if cached is not None:
+            logging.info("Using cached disc information, skipping MakeMKV info")
+            for name, *values in cached:
+                self._process_message(CACHED_MESSAGES[name](*values))
+        else:
+            scanned = []
+            for message in makemkv_info(self.job, select=output_types, index=self.index, options=options):
+                scanned.append(message)
+                self._process_message(message)
+            # only complete scans of a readable disc are worth caching
+            if any(isinstance(message, Titles) and message.count for message in scanned):
+                disc_info_cache.save(fingerprint, [[type(message).__name__, *dataclasses.astuple(message)]
+                                                   for message in scanned])
 
         # Add the last track if exists
         self._add_track()
+        self.tracks.flush()
 
     def _process_message(self, message):
         if isinstance(message, (TInfo, SInfo)):
@@ -973,8 +1059,7 @@ class TrackInfoProcessor:
     def _add_track(self):
         if self.track_id is None:
             return
-        utils.put_track(
-            self.job,
+        self.tracks.put(
             self.track_id,
             self.seconds,
             self.aspect,
@@ -1050,6 +1135,16 @@ class MakeMKVOutputChecker:
         MessageID.RIP_BACKUP_FAILED,
     }
 
+    CHECKED_CODES = frozenset({
+        MessageID.RIP_TITLE_ERROR,
+        MessageID.RIP_COMPLETED,
+        MessageID.READ_ERROR,
+        MessageID.WRITE_ERROR,
+        *SPECIAL_ERROR_CODES,
+        *LOG_ONLY_CODES,
+    })
+    """All message codes handled by check(), any other message is passed through"""
+
     def __init__(self, data: MakeMKVMessage):
         if not isinstance(data, MakeMKVMessage):
             raise TypeError(f"Expected MakeMKVMessage, got {type(data)}")
@@ -1133,13 +1228,20 @@ class MakeMKVOutputChecker:
         return self.data
 
 
-def run(options, select):
+def run(options, select, stop=None):
     """
     Run makemkv with input cli options and yield selected messages
 
+    makemkvcon is terminated early if the stop condition is met, if the
+    generator is closed by the caller (e.g. leaving a for loop with `return`)
+    or if processing a message raises. An early stop is not considered an
+    error, makemkvcon's exit code is ignored in that case.
+
     Parameters:
         options (list): makemkvcon cli options
         select (OutputType): output Message Type(s)
+        stop (callable): optional `stop(msg_type, data)`, called for every
+                         parsed line; return True to stop makemkvcon
     Yields:
         dataclasses of selected type
     Raises:
@@ -1160,24 +1262,41 @@ def run(options, select):
     ]
     cmd += list(options)
     buffer = []
+    finished = stopped = False
     logging.debug(f"command: '{' '.join(cmd)}'")
     with subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True) as proc:
         logging.debug(f"PID {proc.pid}: command: '{' '.join(cmd)}'")
-        for line in proc.stdout:
-            line = line.rstrip(os.linesep)
-            logging.debug(line)  # Maybe write the raw output to a separate log
-            if proc.returncode:
-                buffer.append(line)
-                continue
-            try:
-                msg_type, data = parse_line(line)
-            except MakeMkvParserError as err:
-                logging.warning(err)
-                buffer.append(line)
-                continue
-            logging.debug(data)
-            if msg_type in select:
-                yield data
+        try:
+            for line in proc.stdout:
+                line = line.rstrip(os.linesep)
+                # progress values arrive several times a second, see progress.Reporter
+                if not line.startswith("PRGV:"):
+                    logging.debug(line)  # Maybe write the raw output to a separate log
+                if proc.returncode:
+                    buffer.append(line)
+                    continue
+                try:
+                    msg_type, data = parse_line(line)
+                except MakeMkvParserError as err:
+                    logging.warning(err)
+                    buffer.append(line)
+                    continue
+                if msg_type != OutputType.PRGV:
+                    logging.debug(data)
+                if msg_type in select:
+                    yield data
+                if stop is not None and stop(msg_type, data):
+                    stopped = True
+                    break
+            else:
+                finished = True
+        finally:
+            # stop condition, generator closed or exception: don't wait for makemkvcon
+            if not finished:
+                terminate(proc)
+    if stopped:
+        logging.info(f"MakeMKV stopped after the requested output, exit code {proc.returncode}")
+        return
     if proc.returncode:
         raise MakeMkvRuntimeError(proc.returncode, cmd, output=os.linesep.join(buffer))
     if buffer:
@@ -1186,6 +1305,26 @@ def run(options, select):
     logging.info("MakeMKV exits gracefully.")
 
 
+def terminate(proc, timeout=10):
+    """
+    Terminate a running makemkvcon process, kill it if it does not exit in time
+
+    Parameters:
+        proc (subprocess.Popen): makemkvcon process
+        timeout (int): seconds to wait after SIGTERM
+    """
+    if proc.poll() is not None:
+        return
+    logging.debug(f"PID {proc.pid}: terminating makemkvcon")
+    proc.terminate()
+    try:
+        proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        logging.warning(f"PID {proc.pid}: makemkvcon did not terminate, killing it")
+        proc.kill()
+        proc.wait()
+
+
 def manual_wait(job) -> bool:
     """
     Pause execution to allow for user interaction and monitor job readiness.
@@ -1204,7 +1343,8 @@ def manual_wait(job) -> bool:
               within the wait time, otherwise `False`.
 
     Notes:
-        - The function checks in one minute intervals for state changes
+        - The function wakes up as soon as the UI starts the job, see job_events, and
+          checks the database every job_events.POLL_INTERVAL seconds in case it missed that
         - A reminder is sent every 10 minutes.
         - A final notification is sent when one minute is left, warning of potential
           cancellation.
@@ -1218,29 +1358,27 @@ def manual_wait(job) -> bool:
 
     # Wait for the user to set the files and then start
     title = "Waiting for input on job!"
-    for i in range(wait_time, 0, -1):
-        # Wait for a minute
-        sleep(60)
-
-        # Refresh job data
-        db.session.refresh(job)
-        logging.debug(f"Wait time logging: [{i}] mins - Ready: [{job.manual_start}]")
-
-        # Check the job state (true once ready)
-        if job.manual_start:
-            user_ready = True
-            title = "The Wait is Over"
-            message = "Thanks for not forgetting me, I am now processing your job."
-            notify(job, title, message)
-            break
-        else:
-            # If nothing has happened, remind the user every 5 minutes
-            if i % 5 == 0 and i != wait_time:
-                body = f"Don't forget me, I need your help to continue doing ARM things!. You have {i} minutes."
-                notify(job, title, body)
-
-            if i == 1:
-                body = "ARM is about to cancel this job!!! You have less than 1 minute left!"
-                notify(job, title, body)
+    with job_events.Waiter(job.job_id) as waiter:
+        for i in range(wait_time, 0, -1):
+            # Wait for a minute, the UI wakes us when the job is started
+            ready = job_events.wait_for(job, lambda job: job.manual_start, 60, waiter)
+            logging.debug(f"Wait time logging: [{i}] mins - Ready: [{job.manual_start}]")
+
+            # Check the job state (true once ready)
+            if ready:
+                user_ready = True
+                title = "The Wait is Over"
+                message = "Thanks for not forgetting me, I am now processing your job."
+                notify(job, title, message)
+                break
+            else:
+                # If nothing has happened, remind the user every 5 minutes
+                if i % 5 == 0 and i != wait_time:
+                    body = f"Don't forget me, I need your help to continue doing ARM things!. You have {i} minutes."
+                    notify(job, title, body)
+
+                if i == 1:
+                    body = "ARM is about to cancel this job!!! You have less than 1 minute left!"
+                    notify(job, title, body)
 
     return user_ready
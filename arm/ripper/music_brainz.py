@@ -405,7 +405,7 @@ def process_tracks(job, mb_track_list: dict, is_stub=False):
 
     Iterates over a list of track dictionaries obtained from MusicBrainz and
     extracts track number, length, and title. These are then stored using
-    the `put_track` utility function. Handles both stub and full metadata modes.
+    the `TrackBatch` utility. Handles both stub and full metadata modes.
 
     Parameters
     ----------
@@ -424,23 +424,24 @@ def process_tracks(job, mb_track_list: dict, is_stub=False):
     -----
     - Tracks with missing or invalid lengths will be logged but still processed.
     - A default title like "Untitled track X" will be used if no title is found in stub mode.
-    - Each processed track is stored using `u.put_track()`.
+    - All tracks are stored in one transaction using `u.TrackBatch`.
     """
-    for (idx, track) in enumerate(mb_track_list):
-        track_leng = 0
-        try:
+    with u.TrackBatch(job) as tracks:
+        for (idx, track) in enumerate(mb_track_list):
+            track_leng = 0
+            try:
+                if is_stub:
+                    track_leng = int(track['length'])
+                else:
+                    track_leng = int(track['recording']['length'])
+            except ValueError:
+                logging.error("Failed to find track length")
+            trackno = track.get('number', idx + 1)
             if is_stub:
-                track_leng = int(track['length'])
+                title = track.get('title', f"Untitled track {trackno}")
             else:
-                track_leng = int(track['recording']['length'])
-        except ValueError:
-            logging.error("Failed to find track length")
-        trackno = track.get('number', idx + 1)
-        if is_stub:
-            title = track.get('title', f"Untitled track {trackno}")
-        else:
-            title = track['recording']['title']
-        u.put_track(job, trackno, track_leng, "n/a", 0.1, False, "ABCDE", title)
+                title = track['recording']['title']
+            tracks.put(trackno, track_leng, "n/a", 0.1, False, "ABCDE", title)
 
 
 if __name__ == "__main__":
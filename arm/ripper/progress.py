@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Structured job progress, published by the ripper and read by the UI
+
+Each stage of a job has one small json state file,
+LOGPATH/progress/<job_id>.<stage>.json, so a rip and a pipelined transcode of
+the same job don't overwrite each other. It is replaced atomically on every
+update, the UI only has to read and decode it instead of running `tail` and
+regex parsing the logs. A record holds:
+
+- stage: RIP or TRANSCODE
+- task: what the ripping tool reports it is doing, e.g. "Saving to MKV file"
+- title, titles: current title (1 based) and number of titles, when known
+- percent: progress of the current title (or of the whole stage)
+- bytes, rate: bytes written so far and bytes/s, when known
+- eta: estimated seconds left, when known
+- fps: frames per second of a transcode, when known
+- updated: unix time of the update
+"""
+import json
+import logging
+import os
+import tempfile
+import time
+
+import arm.config.config as cfg
+
+RIP = "rip"
+TRANSCODE = "transcode"
+
+MIN_INTERVAL = 1  # [s]
+"""Minimum time between two writes of the same job, unless the task or title changes"""
+
+
+def state_path(job_id, stage, logpath=None):
+    """
+    Path of the state file of a job stage
+
+    :param job_id: job id
+    :param stage: RIP or TRANSCODE
+    :param logpath: LOGPATH of the job, defaults to the current arm.yaml
+    :return: file path
+    """
+    return os.path.join(logpath or cfg.arm_config["LOGPATH"], "progress", f"{job_id}.{stage}.json")
+
+
+def read(job_id, stage, logpath=None):
+    """
+    Read the last published progress of a job stage
+
+    :return: dict or None if nothing was published (yet)
+    """
+    try:
+        with open(state_path(job_id, stage, logpath), "r") as state_file:
+            return json.load(state_file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as error:
+        logging.debug(f"Could not read progress of job {job_id}: {error}")
+        return None
+
+
+def _dir_size(path):
+    """Size of all files in path and its sub folders"""
+    size = 0
+    try:
+        for folder, _, files in os.walk(path):
+            size += sum(os.path.getsize(os.path.join(folder, name)) for name in files)
+    except OSError:
+        return None
+    return size
+
+
+class Reporter:
+    """
+    Publish the progress of one stage of a job
+
+    update() is cheap to call for every progress message of the ripping tool,
+    the state file is only rewritten every MIN_INTERVAL seconds. If an output
+    directory is given, bytes written and the write rate are measured from the
+    size of the files in it.
+    """
+
+    def __init__(self, job, stage, titles=None, output_path=None):
+        self.job_id = job.job_id
+        self.path = state_path(job.job_id, stage, job.config.LOGPATH)
+        self.output_path = output_path
+        self.record = {"job_id": job.job_id, "stage": stage, "task": None, "title": None, "titles": titles,
+                       "percent": 0.0, "bytes": None, "rate": None, "eta": None, "fps": None, "updated": None}
+        self.written = 0.0
+        self.started = self.task_started = time.monotonic()
+        self.start_bytes = _dir_size(output_path) if output_path else None
+
+    def update(self, **fields):
+        """
+        Update fields of the record, write it if it changed enough
+
+        :param fields: any of task, title, titles, percent, eta, fps. Without an eta,
+            it is estimated from the percent done since the task or title started
+        """
+        now = time.monotonic()
+        changed = any(fields.get(key, self.record[key]) != self.record[key] for key in ("task", "title"))
+        if changed:
+            self.task_started = now
+        self.record.update(fields)
+        percent = self.record["percent"]
+        if "eta" not in fields and not changed and percent and 0 < percent < 100:
+            self.record["eta"] = int((now - self.task_started) * (100 - percent) / percent)
+        elif "eta" not in fields:
+            self.record["eta"] = None
+        if changed or now - self.written >= MIN_INTERVAL:
+            self.write()
+
+    def write(self):
+        """Write the record now"""
+        now = time.monotonic()
+        if self.output_path:
+            size = _dir_size(self.output_path)
+            if size is not None and self.start_bytes is not None:
+                self.record["bytes"] = size - self.start_bytes
+                elapsed = now - self.started
+                self.record["rate"] = int(self.record["bytes"] / elapsed) if elapsed > 0 else None
+        self.record["updated"] = time.time()
+        self.written = now
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # readers must never see a partial record
+            with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(self.path), suffix=".tmp",
+                                             delete=False) as state_file:
+                json.dump(self.record, state_file)
+            os.replace(state_file.name, self.path)
+        except OSError as error:
+            logging.debug(f"Could not publish progress of job {self.job_id}: {error}")
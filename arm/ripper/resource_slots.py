@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Counting semaphore for resources shared by all ripper processes
+
+Replaces counting running processes by name. Each waiting process adds a
+`ResourceSlot` row, admission happens in a single UPDATE statement so two
+processes can never take the same free slot. Waiters are admitted by
+priority, then first come first served. Every waiter listens on a job_events
+FIFO, release() wakes the waiters of the resource so a freed slot is taken
+right away. A waiter still checks every POLL_INTERVAL seconds, which covers a
+lost wakeup, a raised transcode limit and slots of processes that died
+without releasing them, those are removed by the next waiter.
+"""
+import datetime
+import logging
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from arm.database import db
+from arm.models.resource_slot import ResourceSlot
+from arm.ripper import job_events
+
+MAKEMKV_INFO = "makemkvinfo"
+"""makemkvcon info calls, limited by MAX_CONCURRENT_MAKEMKVINFO"""
+TRANSCODE = "transcode"
+"""HandBrake transcodes, limited by transcode_limit.current()"""
+
+POLL_INTERVAL = 30  # [s]
+"""Admission check of a waiting process that wasn't woken"""
+CANCEL_INTERVAL = 1  # [s]
+"""Time between two checks of the cancel event of a waiting process"""
+
+_ADMIT = text("""
+    UPDATE resource_slot SET acquired = :now
+    WHERE slot_id = :slot_id AND acquired IS NULL
+      AND (SELECT count(*) FROM resource_slot
+           WHERE resource = :resource AND (
+               acquired IS NOT NULL
+               OR priority > :priority
+               OR (priority = :priority AND slot_id < :slot_id AND acquired IS NULL)
+           )) < :limit
+""")
+"""Admit a slot if the running slots plus the waiters ahead of it leave room"""
+
+
+def remove_dead_slots(resource):
+    """
+    Remove slots held or requested by processes that no longer exist
+
+    :param resource: resource name
+    :return: number of removed slots
+    """
+    rows = db.session.query(ResourceSlot.slot_id, ResourceSlot.pid, ResourceSlot.pid_started) \
+        .filter(ResourceSlot.resource == resource).all()
+    dead = [slot_id for slot_id, pid, pid_started in rows if not ResourceSlot.holder_alive(pid, pid_started)]
+    if dead:
+        logging.warning(f"Removing {len(dead)} {resource} slot(s) of processes that exited without releasing them")
+        ResourceSlot.query.filter(ResourceSlot.slot_id.in_(dead)).delete(synchronize_session=False)
+        db.session.commit()
+        wake(resource)
+    return len(dead)
+
+
+def _fifo_name(slot_id):
+    """Name of the job_events FIFO a waiting slot listens on"""
+    return f"slot-{slot_id}"
+
+
+def wake(resource):
+    """
+    Wake the processes waiting for a slot of the resource, they check their admission again
+
+    :param resource: resource name
+    """
+    waiting = db.session.query(ResourceSlot.slot_id) \
+        .filter(ResourceSlot.resource == resource, ResourceSlot.acquired.is_(None)).all()
+    for slot_id, in waiting:
+        job_events.notify(_fifo_name(slot_id))
+
+
+def _wait(waiter, cancel):
+    """
+    Sleep until woken or for POLL_INTERVAL
+
+    :return: False if the cancel event was set
+    """
+    deadline = time.monotonic() + POLL_INTERVAL
+    while cancel is None or not cancel.is_set():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or waiter.wait(remaining if cancel is None else min(remaining, CANCEL_INTERVAL)):
+            return True
+    return False
+
+
+def _try_admit(slot, limit):
+    """Single admission attempt, returns True if the slot was acquired"""
+    try:
+        remove_dead_slots(slot.resource)
+        result = db.session.execute(_ADMIT, {
+            "now": datetime.datetime.now(),
+            "slot_id": slot.slot_id,
+            "resource": slot.resource,
+            "priority": slot.priority,
+            "limit": limit,
+        })
+        db.session.commit()
+    except OperationalError as error:
+        # most likely "database is locked", try again on the next wakeup or poll
+        logging.debug(f"Admission check of {slot} failed: {error}")
+        db.session.rollback()
+        return False
+    return result.rowcount == 1
+
+
+def acquire(resource, limit, job_id=None, priority=0, cancel=None):
+    """
+    Block until a slot of the resource is free
+
+    :param resource: resource name, e.g. TRANSCODE
+    :param limit: maximum number of concurrent holders, 0 or less disables the limit. Can be a
+        callable returning the limit, it is called again for every admission check
+    :param job_id: id of the job requesting the slot, shown in the UI queue
+    :param int priority: higher priorities are admitted first
+    :param threading.Event cancel: stop waiting once set
+    :return: the acquired ResourceSlot, None if the limit is disabled or the wait was cancelled
+    """
+    current_limit = limit() if callable(limit) else limit
+    if current_limit <= 0:
+        return None
+    slot = ResourceSlot(resource, job_id, priority)
+    db.session.add(slot)
+    db.session.commit()
+    start = time.monotonic()
+    logging.info(f"Waiting for a {resource} slot (limit {current_limit})")
+    # listen before the first check, a release in between wakes the first wait
+    with job_events.Waiter(_fifo_name(slot.slot_id)) as waiter:
+        while not _try_admit(slot, current_limit):
+            if not _wait(waiter, cancel):
+                logging.info(f"Stopped waiting for a {resource} slot")
+                release(slot)
+                return None
+            if callable(limit):
+                current_limit = limit()
+                if current_limit <= 0:
+                    logging.info(f"{resource} limit disabled, stopped waiting")
+                    release(slot)
+                    return None
+    logging.info(f"Acquired {resource} slot after {time.monotonic() - start:.0f}s")
+    return slot
+
+
+def release(slot):
+    """
+    Release a slot returned by acquire() and wake the waiters of its resource
+
+    :param slot: ResourceSlot or None
+    """
+    if slot is None:
+        return
+    logging.debug(f"Releasing {slot}")
+    resource = slot.resource
+    ResourceSlot.query.filter_by(slot_id=slot.slot_id).delete(synchronize_session=False)
+    db.session.commit()
+    wake(resource)
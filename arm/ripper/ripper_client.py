@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Hand a disc event to the ARM ripper service
+
+Called by the udev wrappers instead of starting main.py when the ripper service
+(daemon.py) is running. Only uses the standard library, so it starts in a few
+milliseconds. Exits with 0 if the service started a job for the drive or one is
+already running, otherwise with 1 and the wrapper falls back to main.py.
+
+Usage:
+    ripper_client.py -d sr0 [-s /home/arm/arm-ripper.sock]
+"""
+import argparse
+import socket
+import sys
+
+DEFAULT_SOCKET = "/home/arm/arm-ripper.sock"
+TIMEOUT = 5  # [s]
+
+
+def request(devname, socket_path=DEFAULT_SOCKET, timeout=TIMEOUT):
+    """
+    Send one device name to the ripper service
+
+    :param devname: kernel name of the drive, e.g. sr0
+    :param socket_path: Unix socket of the service
+    :param timeout: seconds to wait for the answer
+    :return: the answer line, e.g. "started 1234" or "duplicate 1234"
+    :raises OSError: if the service can't be reached
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        client.sendall(f"{devname}\n".encode())
+        return client.makefile("r").readline().strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hand a disc event to the ARM ripper service")
+    parser.add_argument("-d", "--devpath", help="Devpath", required=True)
+    parser.add_argument("-s", "--socket", help="Socket of the ripper service", default=DEFAULT_SOCKET)
+    args = parser.parse_args()
+    try:
+        answer = request(args.devpath, args.socket)
+    except OSError as error:
+        print(f"ARM ripper service not reachable on {args.socket}: {error}")
+        return 1
+    print(f"ARM ripper service: {answer}")
+    return 0 if answer.split(" ")[0] in ("started", "duplicate") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
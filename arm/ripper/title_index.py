@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Offline title index, identifies discs ARM has seen before without asking a metadata provider
+
+The index is a small SQLite file, TITLE_INDEX_PATH, built on first use from the
+successful jobs in the ARM database and the "Title (Year)" folders in
+COMPLETED_PATH, and extended by add_job() after every successful rip. It holds
+
+- the crc64/BDMV fingerprint of every identified disc,
+- the normalized disc labels and titles, with their trigrams for fuzzy matching.
+
+lookup() answers from the fingerprint or an exact label first, then from the
+trigram similarity of the label to the known labels and titles. A fuzzy match
+needs the same numbers (digits and roman numerals) as the label, sequels and
+the discs of a season are only a character apart. Only a confident match is
+returned, anything else is left to the online identification.
+"""
+import dataclasses
+import logging
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from typing import Optional
+
+import arm.config.config as cfg
+from arm.database import db
+from arm.models.disc_fingerprint import DiscFingerprint
+from arm.models.job import Job, JobState
+
+MIN_SCORE = 0.85
+"""Trigram similarity (dice coefficient) a fuzzy match needs"""
+MIN_MARGIN = 0.05
+"""Lead the best fuzzy match needs over the next title"""
+FOLDER_TYPES = {"movies": "movie", "tv": "series"}
+"""Sub folders of COMPLETED_PATH and their video type, see utils.convert_job_type()"""
+FOLDER_NAME = re.compile(r"^(?P<title>.+?)(?: \((?P<year>\d{4})\))?$")
+ROMAN = re.compile(r"^x{0,3}(ix|iv|v?i{0,3})$")
+ROMAN_VALUES = {"i": 1, "v": 5, "x": 10}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entry (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    year TEXT,
+    imdb_id TEXT,
+    video_type TEXT,
+    poster_url TEXT
+);
+CREATE TABLE IF NOT EXISTS name (
+    id INTEGER PRIMARY KEY,
+    text TEXT NOT NULL,
+    entry_id INTEGER NOT NULL,
+    grams INTEGER NOT NULL,
+    UNIQUE (text, entry_id)
+);
+CREATE TABLE IF NOT EXISTS gram (
+    gram TEXT NOT NULL,
+    name_id INTEGER NOT NULL,
+    PRIMARY KEY (gram, name_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS fingerprint (
+    crc_id TEXT PRIMARY KEY,
+    entry_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+_lock = threading.Lock()
+_connection = None
+_connection_pid = None
+_connection_path = None
+
+
+@dataclasses.dataclass
+class Match:
+    """A disc found in the index"""
+    title: str
+    year: Optional[str]
+    imdb_id: Optional[str]
+    video_type: Optional[str]
+    poster_url: Optional[str]
+    score: float
+    """1 for a fingerprint or exact label, else the trigram similarity"""
+    reason: str
+    """How the disc was found: crc64, label or trigram"""
+
+
+def normalize(text):
+    """Lower case words of a title or label, without accents and punctuation"""
+    text = unicodedata.normalize("NFKD", str(text or "")).encode("ascii", "ignore").decode().lower()
+    return " ".join(re.findall(r"[a-z0-9]+", text.replace("&", " and ")))
+
+
+def trigrams(text):
+    """Trigrams of the words of a normalized text, each word padded like pg_trgm does"""
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def numbers(text):
+    """
+    Numbers of a normalized text, e.g. the 2 of a sequel or the season and disc of a series
+
+    :param text: normalized text, see normalize()
+    :return: sorted list of the numbers and roman numerals (up to xxxix)
+    """
+    found = [int(number) for number in re.findall(r"\d+", text)]
+    for word in text.split():
+        if ROMAN.match(word):
+            values = [ROMAN_VALUES[char] for char in word]
+            found.append(sum(-value if value < following else value
+                             for value, following in zip(values, values[1:] + [0])))
+    return sorted(found)
+
+
+def _connect():
+    """Connection to the index, None if it is disabled or can't be opened"""
+    global _connection, _connection_pid, _connection_path
+    path = cfg.arm_config.get("TITLE_INDEX_PATH") or None
+    # a connection can't be shared with a forked process
+    if _connection is not None and (_connection_pid != os.getpid() or _connection_path != path):
+        if _connection_pid == os.getpid():
+            _connection.close()
+        _connection = None
+    if _connection is None and path:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(_SCHEMA)
+        except (OSError, sqlite3.Error) as error:
+            logging.warning(f"Title index {path} is not available: {error}")
+            return None
+        _connection, _connection_pid, _connection_path = connection, os.getpid(), path
+    return _connection
+
+
+def _add(connection, title, year=None, imdb_id=None, video_type=None, poster_url=None, labels=(), crc_id=None):
+    """Add a title, its labels and fingerprint to the index, known values are kept"""
+    title_text = normalize(title)
+    if not title_text:
+        return
+    year = re.sub(r"\D", "", str(year or ""))[:4] or None
+    imdb_id, poster_url = imdb_id or None, poster_url or None
+    connection.execute(
+        "INSERT INTO entry (key, title, year, imdb_id, video_type, poster_url) VALUES (?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET title = excluded.title, "
+        "imdb_id = COALESCE(excluded.imdb_id, imdb_id), video_type = COALESCE(excluded.video_type, video_type), "
+        "poster_url = COALESCE(excluded.poster_url, poster_url)",
+        (f"{title_text}|{year or ''}", title, year, imdb_id, video_type, poster_url))
+    entry_id = connection.execute("SELECT id FROM entry WHERE key = ?", (f"{title_text}|{year or ''}",)).fetchone()[0]
+    for text in {title_text, *(normalize(label) for label in labels)}:
+        grams = trigrams(text)
+        if not grams:
+            continue
+        cursor = connection.execute("INSERT OR IGNORE INTO name (text, entry_id, grams) VALUES (?, ?, ?)",
+                                    (text, entry_id, len(grams)))
+        if cursor.rowcount:
+            connection.executemany("INSERT OR IGNORE INTO gram (gram, name_id) VALUES (?, ?)",
+                                   [(gram, cursor.lastrowid) for gram in grams])
+    if crc_id:
+        connection.execute("INSERT OR REPLACE INTO fingerprint (crc_id, entry_id) VALUES (?, ?)",
+                           (str(crc_id), entry_id))
+
+
+def _successful_jobs():
+    """(label, fingerprint, title, year, imdb_id, video_type, poster_url) of the identified video jobs"""
+    return db.session.query(Job.label, db.func.coalesce(DiscFingerprint.fingerprint, Job.crc_id), Job.title,
+                            Job.year, Job.imdb_id, Job.video_type, Job.poster_url) \
+        .outerjoin(DiscFingerprint, DiscFingerprint.fingerprint_id == Job.fingerprint_id) \
+        .filter(Job.status == JobState.SUCCESS.value, Job.hasnicetitle.is_(True),
+                Job.disctype.in_(("dvd", "bluray"))).all()
+
+
+def _build(connection):
+    """Fill the index from the successful jobs and the completed folders"""
+    jobs = _successful_jobs()
+    for label, crc_id, title, year, imdb_id, video_type, poster_url in jobs:
+        _add(connection, title, year, imdb_id, video_type, poster_url, (label,), crc_id)
+    folders = 0
+    for sub_folder, video_type in FOLDER_TYPES.items():
+        try:
+            names = os.listdir(os.path.join(cfg.arm_config["COMPLETED_PATH"], sub_folder))
+        except OSError:
+            continue
+        for folder_name in names:
+            match = FOLDER_NAME.match(folder_name)
+            if match:
+                _add(connection, match.group("title"), match.group("year"), video_type=video_type)
+                folders += 1
+    connection.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('built', '1')")
+    logging.info(f"Built the title index from {len(jobs)} jobs and {folders} completed folders")
+
+
+def _ready():
+    """Connection to a built index, None if it is disabled"""
+    connection = _connect()
+    if connection is None:
+        return None
+    if connection.execute("SELECT value FROM meta WHERE name = 'built'").fetchone() is None:
+        with connection:
+            _build(connection)
+    return connection
+
+
+def rebuild():
+    """Build the index again from scratch"""
+    with _lock:
+        connection = _connect()
+        if connection is None:
+            return
+        with connection:
+            for table in ("gram", "name", "fingerprint", "entry", "meta"):
+                connection.execute(f"DELETE FROM {table}")
+            _build(connection)
+
+
+def add_job(job):
+    """
+    Add a successful job to the index
+
+    Never raises, a job that is missing from the index is only identified online again.
+
+    :param job: Current job
+    """
+    if not job.hasnicetitle or not job.title or job.disctype not in ("dvd", "bluray"):
+        return
+    try:
+        with _lock:
+            connection = _ready()
+            if connection is None:
+                return
+            with connection:
+                _add(connection, job.title, job.year, job.imdb_id, job.video_type, job.poster_url,
+                     (job.label,), job.fingerprint)
+        logging.debug(f"Added {job.title} ({job.year}) to the title index")
+    except (sqlite3.Error, OSError) as error:
+        logging.warning(f"Could not add the job to the title index: {error}")
+
+
+def _entry(connection, entry_id, score, reason):
+    title, year, imdb_id, video_type, poster_url = connection.execute(
+        "SELECT title, year, imdb_id, video_type, poster_url FROM entry WHERE id = ?", (entry_id,)).fetchone()
+    return Match(title, year, imdb_id, video_type, poster_url, score, reason)
+
+
+def _fuzzy(connection, text, year):
+    """Best (score, entry id) of each entry sharing trigrams and numbers with text, best first"""
+    grams = trigrams(text)
+    if not grams:
+        return []
+    text_numbers = numbers(text)
+    rows = connection.execute(
+        f"SELECT name.entry_id, name.text, name.grams, COUNT(*), entry.year FROM gram "
+        f"JOIN name ON name.id = gram.name_id JOIN entry ON entry.id = name.entry_id "
+        f"WHERE gram.gram IN ({','.join('?' * len(grams))}) GROUP BY gram.name_id", sorted(grams)).fetchall()
+    best = {}
+    for entry_id, name_text, name_grams, common, entry_year in rows:
+        if numbers(name_text) != text_numbers:
+            continue
+        score = 2 * common / (len(grams) + name_grams)
+        if year and entry_year and abs(int(entry_year) - int(year)) > 1:
+            score *= 0.8
+        best[entry_id] = max(score, best.get(entry_id, 0))
+    return sorted(((score, entry_id) for entry_id, score in best.items()), key=lambda item: (-item[0], item[1]))
+
+
+def lookup(crc_id=None, label=None, year=None):
+    """
+    Find a disc in the index
+
+    :param crc_id: crc64 or BDMV fingerprint of the disc
+    :param label: disc label
+    :param year: year if known, a fuzzy match more than a year off scores lower
+    :return: Match or None if the disc isn't known with confidence
+    """
+    year = re.sub(r"\D", "", str(year or ""))[:4] or None
+    try:
+        with _lock:
+            connection = _ready()
+            if connection is None:
+                return None
+            if crc_id:
+                row = connection.execute("SELECT entry_id FROM fingerprint WHERE crc_id = ?",
+                                         (str(crc_id),)).fetchone()
+                if row:
+                    return _entry(connection, row[0], 1.0, "crc64")
+            text = normalize(label)
+            if not text:
+                return None
+            exact = [row[0] for row in connection.execute("SELECT DISTINCT entry_id FROM name WHERE text = ?",
+                                                          (text,))]
+            if len(exact) == 1:
+                return _entry(connection, exact[0], 1.0, "label")
+            ranked = _fuzzy(connection, text, year)
+            if not ranked or ranked[0][0] < MIN_SCORE:
+                return None
+            if len(ranked) > 1 and ranked[0][0] - ranked[1][0] < MIN_MARGIN:
+                logging.debug(f"Title index: {label} is ambiguous, {ranked[:2]}")
+                return None
+            return _entry(connection, ranked[0][1], round(ranked[0][0], 3), "trigram")
+    except (sqlite3.Error, OSError) as error:
+        logging.warning(f"Title index lookup failed: {error}")
+        return None
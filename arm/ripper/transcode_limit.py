@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Load adaptive limit of concurrent HandBrake transcodes
+
+With TRANSCODE_LIMIT_AUTO the number of admitted transcodes is not fixed at
+MAX_CONCURRENT_TRANSCODES. While a ripper waits for a transcode slot, the load
+of the server is sampled every ADJUST_INTERVAL seconds with the psutil calls
+the UI's ServerUtil makes:
+
+- cpu: CPU utilisation [%]
+- load: run queue, 1 minute load average per CPU
+- memory: memory in use [%]
+- temp: CPU temperature [°C], 0 if the sensor is unknown
+
+The limit is lowered by one after LOWER_AFTER overloaded samples in a row and
+raised by one after RAISE_AFTER samples in a row with spare capacity, within
+TRANSCODE_LIMIT_MIN and MAX_CONCURRENT_TRANSCODES (the number of CPUs if 0).
+Lowering the limit never stops a running transcode, fewer are admitted.
+
+All ripper processes share one state file, LOGPATH/progress/transcode_limit.json,
+updated under a file lock. It holds the limit, the last sample and the last
+decisions, which the UI shows.
+"""
+import datetime
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import time
+
+import psutil
+
+import arm.config.config as cfg
+
+ADJUST_INTERVAL = 30  # [s]
+"""Minimum time between two samples"""
+CPU_SAMPLE = 0.5  # [s]
+"""Time psutil measures the CPU utilisation of a sample"""
+LOWER_AFTER = 2
+"""Overloaded samples in a row that lower the limit"""
+RAISE_AFTER = 3
+"""Samples in a row with spare capacity that raise the limit"""
+HIGH = {"cpu": 95, "load": 1.5, "memory": 90, "temp": 85}
+"""The server is overloaded if any value reaches its mark"""
+LOW = {"cpu": 70, "load": 0.9, "memory": 75, "temp": 75}
+"""The server has spare capacity if all values are below their mark"""
+DECISIONS = 20
+"""Number of decisions kept in the state file"""
+
+
+def state_path(logpath=None):
+    """
+    Path of the shared state file
+
+    :param logpath: LOGPATH, defaults to the current arm.yaml
+    :return: file path
+    """
+    return os.path.join(logpath or cfg.arm_config["LOGPATH"], "progress", "transcode_limit.json")
+
+
+def read(logpath=None):
+    """
+    Read the state of the adaptive limit
+
+    :return: dict with limit, min, max, sample and decisions or None if the limit isn't adaptive (yet)
+    """
+    try:
+        with open(state_path(logpath), "r") as state_file:
+            return json.load(state_file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as error:
+        logging.debug(f"Could not read the transcode limit: {error}")
+        return None
+
+
+def bounds():
+    """
+    Lowest and highest limit from arm.yaml
+
+    :return: (min, max)
+    """
+    highest = int(cfg.arm_config["MAX_CONCURRENT_TRANSCODES"]) or os.cpu_count() or 1
+    lowest = max(1, min(int(cfg.arm_config.get("TRANSCODE_LIMIT_MIN") or 1), highest))
+    return lowest, highest
+
+
+def cpu_temperature():
+    """CPU temperature [°C] from the sensors ServerUtil knows, 0 if there is none"""
+    try:
+        temps = psutil.sensors_temperatures()
+    except (EnvironmentError, AttributeError):
+        return 0
+    for sensor in ("coretemp", "cpu_thermal", "k10temp"):
+        if temps.get(sensor):
+            return temps[sensor][0].current
+    return 0
+
+
+def sample():
+    """
+    Measure the load of the server
+
+    :return: dict of cpu, load, memory and temp
+    """
+    try:
+        cpu = psutil.cpu_percent(interval=CPU_SAMPLE)
+        load = psutil.getloadavg()[0] / (psutil.cpu_count() or 1)
+        memory = psutil.virtual_memory().percent
+    except EnvironmentError as error:
+        logging.debug(f"Could not sample the server load: {error}")
+        cpu = load = memory = 0
+    return {"cpu": round(cpu, 1), "load": round(load, 2), "memory": round(memory, 1),
+            "temp": round(cpu_temperature(), 1)}
+
+
+def pressure(values):
+    """
+    Rate a sample
+
+    :param values: dict of sample()
+    :return: (direction, reason), direction is -1 if overloaded, 1 with spare capacity, else 0
+    """
+    high = [f"{key} {values[key]} >= {mark}" for key, mark in HIGH.items() if values[key] >= mark]
+    if high:
+        return -1, ", ".join(high)
+    if all(values[key] < mark for key, mark in LOW.items()):
+        return 1, ", ".join(f"{key} {values[key]} < {mark}" for key, mark in LOW.items())
+    return 0, ""
+
+
+def adjust(state, values):
+    """
+    Update the state with a sample, change the limit by one step if the load asks for it
+
+    :param state: dict of the state file, changed in place
+    :param values: dict of sample()
+    :return: the decision dict if the limit changed, else None
+    """
+    direction, reason = pressure(values)
+    streak = state.get("streak", 0)
+    if direction == 0 or (direction > 0) != (streak > 0):
+        streak = 0
+    streak += direction
+    state.update(sample=values, streak=streak, sampled=time.time())
+
+    new_limit = state["limit"]
+    if streak <= -LOWER_AFTER:
+        new_limit = max(state["min"], state["limit"] - 1)
+    elif streak >= RAISE_AFTER:
+        new_limit = min(state["max"], state["limit"] + 1)
+    if new_limit == state["limit"]:
+        return None
+    decision = {"at": datetime.datetime.now().isoformat(timespec="seconds"), "from": state["limit"],
+                "to": new_limit, "reason": reason}
+    state.update(limit=new_limit, streak=0)
+    state["decisions"] = (state.get("decisions", []) + [decision])[-DECISIONS:]
+    return decision
+
+
+def _write(path, state):
+    """Replace the state file, readers never see a partial state"""
+    with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(path), suffix=".tmp", delete=False) as state_file:
+        json.dump(state, state_file)
+    os.replace(state_file.name, path)
+
+
+def current():
+    """
+    Number of transcodes to admit now
+
+    Without TRANSCODE_LIMIT_AUTO this is MAX_CONCURRENT_TRANSCODES. Otherwise the
+    adaptive limit, sampled again if the last sample is ADJUST_INTERVAL old.
+    Called by resource_slots.acquire() on every admission check.
+
+    :return: int, 0 or less disables the limit
+    """
+    if not cfg.arm_config.get("TRANSCODE_LIMIT_AUTO"):
+        return int(cfg.arm_config["MAX_CONCURRENT_TRANSCODES"])
+    lowest, highest = bounds()
+    path = state_path()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            state = read() or {"limit": lowest, "decisions": []}
+            state.update(min=lowest, max=highest, limit=max(lowest, min(state["limit"], highest)))
+            if time.time() - state.get("sampled", 0) >= ADJUST_INTERVAL:
+                decision = adjust(state, sample())
+                if decision is not None:
+                    logging.info(f"Transcode limit {decision['from']} -> {decision['to']}: {decision['reason']}")
+                else:
+                    logging.debug(f"Transcode limit stays {state['limit']}: {state['sample']}")
+                _write(path, state)
+    except OSError as error:
+        logging.warning(f"Could not update the transcode limit, using {highest}: {error}")
+        return highest
+    return state["limit"]
@@ -8,7 +8,6 @@ import logging.handlers
 import subprocess
 import shutil
 import time
-import random
 import re
 from pathlib import Path, PurePath
 from math import ceil
@@ -21,13 +20,15 @@ import psutil
 from netifaces import interfaces, ifaddresses, AF_INET
 
 import arm.config.config as cfg
-from arm.ui import db  # needs to be imported before models
+from arm import http_client
+from arm.database import db, db_commit
+from arm.models.disc_fingerprint import DiscFingerprint
 from arm.models.job import Job, JobState
 from arm.models.notifications import Notifications
 from arm.models.track import Track
 from arm.models.user import User
 from arm.models.system_drives import SystemDrives
-from arm.ripper import apprise_bulk
+from arm.ripper import apprise_bulk, job_events
 
 NOTIFY_TITLE = "ARM notification"
 
@@ -122,39 +123,6 @@ def notify_entry(job):
         sys.exit()
 
 
-def sleep_check_process(process_str, max_processes, sleep=(20, 120, 10)):
-    """
-    New function to check for max_transcode from job.config and force obey limits\n
-    :param str process_str: The process string from arm.yaml
-    :param int max_processes: The user defined limit for maximum transcodes
-    :param (tuple, int) sleep: tuple: (min sleep time, max sleep time, step) or sleep time as int.
-    :return bool: when we have space in the transcode queue
-    """
-    if max_processes <= 0:
-        return False  # sleep limit disabled
-    if isinstance(sleep, int):
-        sleep = (sleep, sleep + 1, 1)
-    if not isinstance(sleep, tuple):
-        raise TypeError(sleep)
-    loop_count = max_processes + 1
-    logging.info(f"Starting sleep check of {process_str}")
-    while loop_count >= max_processes:
-        # The process might disappear during loops, so we need to query the
-        # name upfront.
-        loop_count = sum(
-            1 for proc in psutil.process_iter(['name'])
-            if proc.info.get('name') == process_str
-        )
-        if max_processes > loop_count:
-            break
-        # Try to make each check at different times
-        random_time = random.randrange(*sleep)
-        logging.debug(f"{loop_count} processes running. Sleeping for {random_time}s.")
-        time.sleep(random_time)
-    logging.info(f"Exiting sleep check of {process_str}")
-    return True
-
-
 def convert_job_type(video_type):
     """
     Converts the job_type to the correct sub-folder
@@ -266,7 +234,7 @@ def scan_emby():
         logging.info("Sending Emby library scan request")
         url = f"http://{cfg.arm_config['EMBY_SERVER']}:{cfg.arm_config['EMBY_PORT']}/Library/Refresh?api_key={cfg.arm_config['EMBY_API_KEY']}"  # noqa: E501
         try:
-            req = requests.post(url)
+            req = http_client.post(url)
             if req.status_code > 299:
                 req.raise_for_status()
             logging.info("Emby Library Scan request successful")
@@ -493,6 +461,7 @@ def put_track(job, t_no, seconds, aspect, fps, mainfeature, source, filename="")
     """
     Put data into a track instance.\n
     Having this here saves importing the models file everywhere\n
+    Use TrackBatch to add more than one track.\n
 
     :param job: instance of job class
     :param str t_no: track number
@@ -503,24 +472,68 @@ def put_track(job, t_no, seconds, aspect, fps, mainfeature, source, filename="")
     :param str source: Source of information (HandBrake, MakeMKV, abcde)
     :param str filename: filename of track
     """
-
-    logging.debug(
-        f"Track #{int(t_no):02} Length: {seconds: >4} fps: {float(fps):2.3f} "
-        f"aspect: {aspect: >4} Mainfeature: {mainfeature} Source: {source}")
-
-    job_track = Track(
-        job_id=job.job_id,
-        track_number=t_no,
-        length=seconds,
-        aspect_ratio=aspect,
-        fps=fps,
-        main_feature=mainfeature,
-        source=source,
-        basename=job.title,
-        filename=filename
-    )
-    job_track.ripped = (seconds > int(job.config.MINLENGTH))
-    database_adder(job_track)
+    with TrackBatch(job) as tracks:
+        tracks.put(t_no, seconds, aspect, fps, mainfeature, source, filename)
+
+
+class TrackBatch:
+    """
+    Collect the tracks of a job and write them in a single transaction\n
+    A disc scan can find hundreds of titles, one insert and one commit for all
+    of them keeps the database lock short for the other ARM processes.
+
+    with TrackBatch(job) as tracks:
+        tracks.put(...)
+
+    The tracks are written when the with block exits without an error, or by
+    calling flush().
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+
+    def put(self, t_no, seconds, aspect, fps, mainfeature, source, filename="", audio=None, subtitles=None):
+        """
+        Add a track, see put_track() for the parameters\n
+        :param audio: language codes of the audio streams, comma separated
+        :param subtitles: language codes of the subtitle streams, comma separated
+        """
+        logging.debug(
+            f"Track #{int(t_no):02} Length: {seconds: >4} fps: {float(fps):2.3f} "
+            f"aspect: {aspect: >4} Mainfeature: {mainfeature} Source: {source}")
+        self.rows.append({
+            "job_id": self.job.job_id,
+            "track_number": t_no,
+            "length": seconds,
+            "aspect_ratio": aspect,
+            "fps": fps,
+            "main_feature": mainfeature,
+            "source": source,
+            "basename": self.job.title,
+            "filename": filename,
+            "ripped": seconds > int(self.job.config.MINLENGTH),
+            "process": False,
+            "audio_streams": audio,
+            "subtitle_streams": subtitles,
+        })
+
+    def flush(self):
+        """
+        Write all collected tracks
+        """
+        if not self.rows:
+            return
+        db_commit(lambda: db.session.execute(Track.__table__.insert(), self.rows))
+        logging.debug(f"successfully written {len(self.rows)} tracks to the database")
+        self.rows = []
 
 
 def arm_setup(arm_log):
@@ -554,36 +567,28 @@ def arm_setup(arm_log):
                       f"Cant find/create the folders set in arm.yaml - Error:{error} - ARM Will Fail!")
 
 
-def database_updater(args, job, wait_time=90):
+def database_updater(args, job):
     """
-    Try to update our db for x seconds and handle it nicely if we can't
+    Update the job and handle it nicely if the database is locked
     If args isn't a dict assume we are wanting a rollback\n
 
     :param args: This needs to be a Dict with the key being the job.method
     you want to change and the value being
     the new value.
     :param job: This is the job object
-    :param int wait_time: Number of times to try(1 sec sleep between try)
     :return: Success
     """
     if not isinstance(args, dict):
         db.session.rollback()
         return False
-    # Loop through our args and try to set any of our job variables
-    for (key, value) in args.items():
-        setattr(job, key, value)
-        logging.debug(f"ID:{job.job_id} {key}={value}:{type(value)}")
 
-    for i in range(wait_time):  # give up after the users wait period in seconds
-        try:
-            db.session.commit()
-        except Exception as error:
-            if "locked" in str(error):
-                time.sleep(1)
-                logging.debug(f"database is locked - try {i}/{wait_time}")
-            else:
-                logging.debug(f"Error: {error}")
-                raise RuntimeError(str(error)) from error
+    def apply():
+        # Loop through our args and try to set any of our job variables
+        for (key, value) in args.items():
+            setattr(job, key, value)
+            logging.debug(f"ID:{job.job_id} {key}={value}:{type(value)}")
+
+    db_commit(apply)
     logging.debug("successfully written to the database")
     return True
 
@@ -595,19 +600,8 @@ def database_adder(obj_class):
     :param obj_class: Job/Config/Track/ etc
     :return: True if success
     """
-    for i in range(90):  # give up after the users wait period in seconds
-        try:
-            logging.debug(f"Trying to add {type(obj_class).__name__}")
-            db.session.add(obj_class)
-            db.session.commit()
-            break
-        except Exception as error:
-            if "locked" in str(error):
-                time.sleep(1)
-                logging.debug(f"database is locked - try {i}/90")
-            else:
-                logging.error(f"Error: {error}")
-                raise RuntimeError(str(error)) from error
+    logging.debug(f"Trying to add {type(obj_class).__name__}")
+    db_commit(lambda: db.session.add(obj_class))
     logging.debug(f"successfully written {type(obj_class).__name__} to the database")
     return True
 
@@ -700,6 +694,22 @@ def duplicate_run_check(dev_path):
     sys.exit(1)
 
 
+def update_drive_job(job):
+    """
+    Function to take the current job task and update the associated drive ID into the database
+    """
+    drive = SystemDrives.query.filter_by(mount=job.devpath).first()
+    drive.new_job(job.job_id)
+    logging.debug(f"Updating Drive: ['{drive.serial_id}'|'{drive.mount}']"
+                  f" Current Job: [{drive.job_id_current}]"
+                  f" Previous Job: [{drive.job_id_previous}]")
+    try:
+        db.session.commit()
+        logging.debug("Database update with new Job ID to associated drive")
+    except Exception as error:  # noqa: E722
+        logging.error(f"Failed to update the database with the associated drive. {error}")
+
+
 def save_disc_poster(final_directory, job):
     """
      Use FFMPeg to convert Large Poster if enabled in config
@@ -707,15 +717,11 @@ def save_disc_poster(final_directory, job):
     :param job: Current Job
     :return: None
     """
-    if job.disctype == "dvd" and cfg.arm_config["RIP_POSTER"]:
-        os.system(f"mount {job.devpath}")
-        if os.path.isfile(job.mountpoint + "/JACKET_P/J00___5L.MP2"):
-            logging.info("Converting NTSC Poster Image")
-            os.system(f'ffmpeg -i "{job.mountpoint}/JACKET_P/J00___5L.MP2" "{final_directory}/poster.png"')
-        elif os.path.isfile(job.mountpoint + "/JACKET_P/J00___6L.MP2"):
-            logging.info("Converting PAL Poster Image")
-            os.system(f'ffmpeg -i "{job.mountpoint}/JACKET_P/J00___6L.MP2" "{final_directory}/poster.png"')
-        os.system(f"umount {job.devpath}")
+    # the disc probe copied the poster, no need to mount the disc again
+    poster = job.probe.poster if job.probe else None
+    if job.disctype == "dvd" and cfg.arm_config["RIP_POSTER"] and poster:
+        logging.info("Converting Poster Image")
+        os.system(f'ffmpeg -i "{poster}" "{final_directory}/poster.png"')
 
 
 def check_for_dupe_folder(have_dupes, hb_out_path, job):
@@ -758,51 +764,62 @@ def check_for_dupe_folder(have_dupes, hb_out_path, job):
     return hb_out_path
 
 
-def job_dupe_check(job):
+def previous_label_rip(job, unlinked=False):
     """
-    function for checking the database to look for jobs that have completed
-    successfully with the same label
-    :param job: The job obj, so we can use the crc/title etc.
-    :return: True/False, dict/None
+    Only successful rip with the label of the job
+    :param job: Current job
+    :param unlinked: only count rips that aren't linked to a fingerprint, i.e. ripped before fingerprints were kept
+    :return: row with job_id, title, year, poster_url, hasnicetitle, video_type or None
     """
-    logging.debug(f"Trying to find jobs with matching Label={job.label}")
     if job.label is None:
         logging.info("Disc title 'None' not searched in database")
-        return False
-    else:
-        previous_rips = Job.query.filter_by(label=job.label, status=JobState.SUCCESS.value)
-        results = {}
-        i = 0
-        for j in previous_rips:
-            # logging.debug(f"job obj= {j.get_d()}")
-            job_dict = j.get_d().items()
-            results[i] = {}
-            for key, value in iter(job_dict):
-                results[i][str(key)] = str(value)
-            i += 1
-
-    # logging.debug(f"previous rips = {results}")
-    if results:
-        logging.debug(f"we have {len(results)} jobs")
-        # Check if results too large (over 1), skip if too many
-        if len(results) == 1:
-            # This might need some tweaks to because of title/year manual
-            title = results[0]['title'] if results[0]['title'] else job.label
-            year = results[0]['year'] if results[0]['year'] != "" else ""
-            poster_url = results[0]['poster_url'] if results[0]['poster_url'] != "" else None
-            hasnicetitle = (str(results[0]['hasnicetitle']).lower() == 'true')
-            video_type = results[0]['video_type'] if results[0]['hasnicetitle'] != "" else "unknown"
-            active_rip = {
-                "title": title, "year": year, "poster_url": poster_url, "hasnicetitle": hasnicetitle,
-                "video_type": video_type}
-            database_updater(active_rip, job)
-            return True
-        else:
-            logging.debug(f"Skipping - There are too many results [{len(results)}]")
-            return False
+        return None
+    logging.debug(f"Trying to find jobs with matching Label={job.label}")
+    query = db.session.query(Job.job_id, Job.title, Job.year, Job.poster_url, Job.hasnicetitle, Job.video_type) \
+        .filter(Job.label == job.label, Job.status == JobState.SUCCESS.value)
+    if unlinked:
+        query = query.filter(Job.fingerprint_id.is_(None))
+    # Only ever use a label that matches a single rip
+    previous_rips = query.limit(2).all()
+    if len(previous_rips) > 1:
+        logging.debug("Skipping - There are too many results")
+        return None
+    return previous_rips[0] if previous_rips else None
+
+
+def job_dupe_check(job):
+    """
+    function for checking the database to look for jobs that have completed
+    successfully with the same disc fingerprint, or the same label for discs without one.
+    Links the job to the fingerprint of its disc.
+    :param job: The job obj, so we can use the crc/title etc.
+    :return: True/False
+    """
+    fingerprint = job.probe.fingerprint if job.probe else None
+    if not fingerprint and job.disctype in ("dvd", "bluray"):
+        fingerprint = job.crc_id
+    if fingerprint:
+        logging.debug(f"Trying to find jobs with matching fingerprint={fingerprint}")
+        db_commit(lambda: DiscFingerprint.link(job, fingerprint))
+        previous_rip = DiscFingerprint.previous_rip(fingerprint, exclude_job_id=job.job_id)
+        if previous_rip is None and not db.session.get(DiscFingerprint, job.fingerprint_id).rips:
+            # first time the fingerprint is seen, the disc may have been ripped before it was kept,
+            # e.g. a Blu-ray, there was no fingerprint to backfill from crc_id for those
+            previous_rip = previous_label_rip(job, unlinked=True)
     else:
-        logging.info("We have no previous rips/jobs matching this label")
+        previous_rip = previous_label_rip(job)
+
+    if previous_rip is None:
+        logging.info("We have no previous rips/jobs matching this disc")
         return False
+    logging.debug(f"Disc was ripped before by job {previous_rip.job_id}")
+    # This might need some tweaks to because of title/year manual
+    active_rip = {
+        "title": previous_rip.title or job.label, "year": previous_rip.year or "",
+        "poster_url": previous_rip.poster_url or None, "hasnicetitle": bool(previous_rip.hasnicetitle),
+        "video_type": previous_rip.video_type or "unknown"}
+    database_updater(active_rip, job)
+    return True
 
 
 def check_for_wait(job):
@@ -815,17 +832,13 @@ def check_for_wait(job):
     if job.config.MANUAL_WAIT:
         logging.info(f"Waiting {job.config.MANUAL_WAIT_TIME} seconds for manual override.")
         database_updater({"status": JobState.MANUAL_WAIT_STARTED.value}, job)
-        sleep_time = 0
-        while sleep_time < job.config.MANUAL_WAIT_TIME:
-            time.sleep(5)
-            sleep_time += 5
-            db.session.refresh(job)
-            if job.title_manual:
+        # the UI wakes us when a title is set
+        with job_events.Waiter(job.job_id) as waiter:
+            if job_events.wait_for(job, lambda job: job.title_manual, job.config.MANUAL_WAIT_TIME, waiter):
                 logging.info("Manual override found.  Overriding auto identification values.")
                 job.updated = True
                 job.hasnicetitle = True
                 database_updater({"hasnicetitle": True, "updated": True}, job)
-                break
         database_updater({"status": JobState.IDLE.value}, job)
 
 
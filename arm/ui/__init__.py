@@ -13,8 +13,8 @@ from flask_wtf import CSRFProtect
 from flask_login import LoginManager
 import bcrypt  # noqa: F401
 import arm.config.config as cfg
-
-sqlitefile = 'sqlite:///' + cfg.arm_config['DBFILE']
+from arm import database
+from arm.database import sqlitefile
 
 # Setup logging, but because of werkzeug issues, we need to set up that later down file
 dictConfig({
@@ -61,9 +61,12 @@ app.logger.debug(f"Disable Login: {cfg.arm_config['DISABLE_LOGIN']}")
 os.environ["WERKZEUG_DEBUG_PIN"] = "12345"  # make this random!
 app.logger.debug("Debugging pin: " + os.environ["WERKZEUG_DEBUG_PIN"])
 
-db = SQLAlchemy(app)
+# Flask-SQLAlchemy on the models of the shared database layer, which then uses its session
+db = SQLAlchemy(app, model_class=database.db.Model)
+database.db.use_session(db.session)
 migrate = Migrate(app, db)
 
+
 # Register route blueprints
 # loaded post database declaration to avoid circular loops
 from arm.ui.settings.settings import route_settings  # noqa: E402,F811
@@ -7,6 +7,3 @@ SETUP_STAGE_2 = '/setup'
 NO_ADMIN_ACCOUNT = "No admin account found"
 NO_JOB = "No job supplied"
 JSON_TYPE = "application/json"
-# Ripper
-NOTIFY_TITLE = "ARM notification"
-PROCESS_COMPLETE = "processing complete."
@@ -16,7 +16,7 @@ import arm.ui.utils as ui_utils
 from arm.ui import app, db, constants
 from arm.models.job import Job
 import arm.config.config as cfg
-from arm.ui.metadata import get_omdb_poster
+from arm.metadata import get_omdb_poster
 from arm.ui.forms import DBUpdate
 
 app.app_context().push()
@@ -22,6 +22,7 @@ import arm.ui.utils as ui_utils
 from arm.ui import app, db, constants, json_api
 from arm.models.job import Job, JobState
 from arm.models.notifications import Notifications
+from arm.ripper import job_events
 import arm.config.config as cfg
 from arm.ui.forms import TitleSearchForm, ChangeParamsForm, TrackFormDynamic
 
@@ -111,6 +112,7 @@ def jobdetail_load():
         # Set job to ready
         job.manual_start = True
         db.session.commit()
+        job_events.notify(job.job_id)
         app.logger.debug(f"Setting [{job.job_id}] to [{job.manual_start}], lets get ripping")
         flash("Tracks was updated", "success")
 
@@ -154,6 +156,7 @@ def customtitle():
                                      f'{request.args.get("title")} ({request.args.get("year")})')
         db.session.add(notification)
         ui_utils.database_updater(args, job)
+        job_events.notify(job.job_id)
         flash(f'Custom title changed. Title={job.title}, Year={job.year}.', "success")
         return redirect(url_for('home'))
     return render_template('customTitle.html', title='Change Title', form=form, job=job)
@@ -229,6 +232,7 @@ def updatetitle():
                                  f'{request.args.get("title")} ({request.args.get("year")})')
     db.session.add(notification)
     db.session.commit()
+    job_events.notify(job.job_id)
     flash(f'Title: {old_title} ({old_year}) was updated to '
           f'{request.args.get("title")} ({request.args.get("year")})', "success")
     return redirect("/")
@@ -312,6 +316,9 @@ def feed_json():
             'fail': 'fail',
             'success': 'success',
             'joblist': 'joblist',
+            'before': request.args.get('before', type=int),
+            'limit': request.args.get('limit', json_api.JOBS_PAGE_SIZE, type=int),
+            'with_config': request.args.get('config') == '1',
             'mode': mode,
             'config_id': request.args.get('config_id'),
             'notify_id': request.args.get('notify_id'),
@@ -325,19 +332,20 @@ def feed_json():
             'full': {'funct': json_api.generate_log, 'args': ('logpath', 'j_id')},
             'search': {'funct': json_api.search, 'args': ('searchq',)},
             'getfailed': {
-                'funct': json_api.get_x_jobs,
-                'args': (JobState.FAILURE.value,),
+                'funct': json_api.get_finished_jobs,
+                'args': (JobState.FAILURE.value, 'before', 'limit', 'with_config'),
             },
             'getsuccessful': {
-                'funct': json_api.get_x_jobs,
-                'args': (JobState.SUCCESS.value,),
+                'funct': json_api.get_finished_jobs,
+                'args': (JobState.SUCCESS.value, 'before', 'limit', 'with_config'),
             },
             'fixperms': {'funct': ui_utils.fix_permissions, 'args': ('j_id',)},
             'joblist': {'funct': json_api.get_x_jobs, 'args': ('joblist',)},
             'send_item': {'funct': ui_utils.send_to_remote_db, 'args': ('j_id',)},
             'change_job_params': {'funct': json_api.change_job_params, 'args': ('config_id',)},
             'read_notification': {'funct': json_api.read_notification, 'args': ('notify_id',)},
-            'notify_timeout': {'funct': json_api.get_notify_timeout, 'args': ('notify_timeout',)}
+            'notify_timeout': {'funct': json_api.get_notify_timeout, 'args': ('notify_timeout',)},
+            'slots': {'funct': json_api.get_resource_slots, 'args': ()},
         }
     else:
         valid_data = {
@@ -353,6 +361,6 @@ def feed_json():
     return_json['notes'] = json_api.get_notifications()
 
     # return JSON data
-    return app.response_class(response=json.dumps(return_json, indent=4, sort_keys=True),
+    return app.response_class(response=json.dumps(return_json, separators=(",", ":")),
                               status=200,
                               mimetype=constants.JSON_TYPE)
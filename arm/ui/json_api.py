@@ -15,13 +15,25 @@ import arm.config.config as cfg
 from arm.models.config import Config
 from arm.models.job import Job, JobState, JOB_STATUS_FINISHED
 from arm.models.notifications import Notifications
+from arm.models.resource_slot import ResourceSlot
 from arm.models.track import Track
 from arm.models.ui_settings import UISettings
+from arm.ripper import progress, transcode_limit
 from arm.ui import app, db
 from arm.ui.forms import ChangeParamsForm
 from arm.ui.utils import job_id_validator, database_updater, authenticated_state
 from arm.ui.settings import DriveUtils as drive_utils # noqa E402
 
+LOG_TAIL_BYTES = 64 * 1024
+"""Bytes read from the end of a logfile to find the last progress lines"""
+FINISHED_JOB_FIELDS = ("job_id", "title", "title_manual", "year", "video_type", "devpath", "status", "stage",
+                       "disctype", "label", "imdb_id", "poster_url", "logfile", "start_time", "job_length")
+"""Job columns in the getsuccessful/getfailed results, what the database page shows"""
+FINISHED_CONFIG_FIELDS = ("RIPMETHOD", "MAINFEATURE", "MINLENGTH", "MAXLENGTH")
+"""Config values in the getsuccessful/getfailed results, only read when asked for"""
+JOBS_PAGE_SIZE = 100
+JOBS_MAX_PAGE_SIZE = 1000
+
 
 def get_notifications():
     """Get all current notifications"""
@@ -76,6 +88,62 @@ def get_x_jobs(job_status):
             "authenticated": authenticated}
 
 
+def finished_jobs_page(session, job_status, before=None, limit=JOBS_PAGE_SIZE, with_config=False):
+    """
+    One page of the finished jobs, newest first
+
+    Pages are cut by job_id (keyset pagination), so every page is one range scan
+    of the status index no matter how deep it is. Only FINISHED_JOB_FIELDS are
+    read, and the config values come from the same query when asked for
+    (config=1 in the request), nothing in the UI reads them.
+
+    :param session: database session
+    :param job_status: success or fail
+    :param before: job_id the page starts below, None for the newest jobs
+    :param limit: jobs per page, at most JOBS_MAX_PAGE_SIZE
+    :param with_config: add FINISHED_CONFIG_FIELDS as 'config'
+    :return: ({index: job dict}, job_id of the next page or None on the last page)
+    """
+    limit = max(1, min(int(limit or JOBS_PAGE_SIZE), JOBS_MAX_PAGE_SIZE))
+    fields = FINISHED_JOB_FIELDS
+    columns = [getattr(Job, field) for field in FINISHED_JOB_FIELDS]
+    if with_config:
+        fields += FINISHED_CONFIG_FIELDS
+        columns += [getattr(Config, field) for field in FINISHED_CONFIG_FIELDS]
+    query = session.query(*columns).filter(Job.status == job_status)
+    if with_config:
+        query = query.outerjoin(Config, Config.job_id == Job.job_id)
+    if before is not None:
+        query = query.filter(Job.job_id < before)
+    rows = query.order_by(Job.job_id.desc()).limit(limit + 1).all()
+
+    job_results = {}
+    for i, row in enumerate(rows[:limit]):
+        values = dict(zip(fields, row))
+        job_results[i] = {field: str(values[field]) for field in FINISHED_JOB_FIELDS}
+        if with_config:
+            job_results[i]['config'] = {field: str(values[field]) for field in FINISHED_CONFIG_FIELDS}
+    next_before = rows[limit - 1][0] if len(rows) > limit else None
+    return job_results, next_before
+
+
+def get_finished_jobs(job_status, before=None, limit=JOBS_PAGE_SIZE, with_config=False):
+    """
+    function for getting a page of the Failed/Successful jobs, see finished_jobs_page()
+
+    :return: dict/json, 'next' is the 'before' of the next page
+    """
+    if JobState(job_status) not in JOB_STATUS_FINISHED:
+        raise ValueError(f"{job_status} is not a valid option")
+    job_results, next_before = finished_jobs_page(db.session, job_status, before, limit, with_config)
+    return {"success": True,
+            "mode": job_status,
+            "results": job_results,
+            "next": next_before,
+            "arm_name": cfg.arm_config['ARM_NAME'],
+            "authenticated": authenticated_state()}
+
+
 def process_logfile(logfile, job, job_results):
     """
         Decide if we need to process HandBrake or MakeMKV
@@ -91,7 +159,7 @@ def process_logfile(logfile, job, job_results):
             return process_makemkv_logfile(job, job_results)
         if job.status == JobState.TRANSCODE_ACTIVE.value:
             app.logger.debug("using handbrake")
-            return process_handbrake_logfile(logfile, job, job_results)
+            return process_handbrake_progress(logfile, job, job_results)
     if job.disctype == "music" and job.status == JobState.AUDIO_RIPPING.value:
         app.logger.debug("using audio disc")
         return process_audio_logfile(job.logfile, job, job_results)
@@ -106,37 +174,53 @@ def percentage(part, whole):
 
 def process_makemkv_logfile(job, job_results):
     """
-    Process the logfile and find current status and job progress percent\n
+    Get the current MakeMKV stage and progress percent published by the ripper\n
     :return: job_results dict
     """
-    job_progress_status = None
-    job_stage_index = None
-    progress_log = os.path.join(job.config.LOGPATH, 'progress', str(job.job_id)) + '.log'
-    lines = read_log_line(progress_log)
-    # Correctly get last entry for progress bar
-    for line in lines:
-        job_progress_status = re.search(r"PRGV:(\d{3,}),(\d+),(\d{3,})", str(line))
-        job_stage_index = re.search(r"PRGC:\d+,(\d+),\"([\w -]{2,})\"", str(line))
-
-    if job_progress_status is not None:
-        app.logger.debug(f"job_progress_status: {job_progress_status}")
-        job.progress = job_results['progress'] = \
-            f"{percentage(job_progress_status.group(1), job_progress_status.group(3)):.2f}"
-        job.progress_round = percentage(job_progress_status.group(1),
-                                        job_progress_status.group(3))
-    else:
+    state = progress.read(job.job_id, progress.RIP, job.config.LOGPATH)
+    job_results['progress_state'] = state
+    if state is None:
         app.logger.debug(f"Job [{job.job_id}] MakeMKV status not defined - setting progress to 0%")
         job.progress = job.progress_round = job_results['progress'] = 0
+        job.eta = "Unknown"
+        return job_results
+
+    job.progress = job_results['progress'] = f"{state['percent']:.2f}"
+    job.progress_round = state['percent']
+    stage = state['task'] or "Ripping"
+    if state['title'] is not None:
+        stage = f"{state['title']}/{job.no_of_titles} - {stage}"
+    if state['rate']:
+        stage += f" ({state['rate'] / 1024 / 1024:.1f} MB/s)"
+    # not committed, job.stage of the database is used for the raw folder name
+    job.stage = job_results['stage'] = stage
+    job.eta = str(datetime.timedelta(seconds=state['eta'])) if state['eta'] is not None else "Unknown"
 
-    if job_stage_index is not None:
-        try:
-            current_index = f"{(int(job_stage_index.group(1)) + 1)}/{job.no_of_titles} - {job_stage_index.group(2)}"
-            job.stage = job_results['stage'] = current_index
-            db.session.commit()
-        except Exception as error:
-            job.stage = f"Unknown -  {error}"
+    return job_results
 
-    job.eta = "Unknown"
+
+def process_handbrake_progress(logfile, job, job_results):
+    """
+    Get the current HandBrake task, progress percent, fps and ETA published by the ripper\n
+    :return: job_results dict
+    """
+    state = progress.read(job.job_id, progress.TRANSCODE, job.config.LOGPATH)
+    job_results['progress_state'] = state
+    if state is None:
+        # transcode started by a ripper that didn't publish its progress yet
+        return process_handbrake_logfile(logfile, job, job_results)
+
+    job.progress = job_results['progress'] = f"{state['percent']:.2f}"
+    job.progress_round = job_results['progress_round'] = int(state['percent'])
+    stage = state['task'] or "Encoding"
+    if state['title'] is not None:
+        stage = f"{stage} - {state['title']}/{state['titles'] or job.no_of_titles}"
+    if state.get('fps'):
+        stage += f" ({state['fps']:.1f} fps)"
+    # not committed, job.stage of the database is used for the raw folder name
+    job.stage = job_results['stage'] = stage
+    job.eta = job_results['eta'] = str(datetime.timedelta(seconds=state['eta'])) \
+        if state['eta'] is not None else "Unknown"
 
     return job_results
 
@@ -234,13 +318,17 @@ def calc_process_time(starttime, cur_iter, max_iter):
 
 def read_log_line(log_file):
     """
+    Read the last lines of a logfile without reading the whole file\n
     Try to catch if the logfile gets delete before the job is finished\n
     :param log_file:
-    :return:
+    :return: list of the last 20 lines as bytes
     """
     try:
-        line = subprocess.check_output(['tail', '-n', '20', log_file]).splitlines()
-    except subprocess.CalledProcessError:
+        with open(log_file, "rb") as read_log_file:
+            read_log_file.seek(0, os.SEEK_END)
+            read_log_file.seek(max(0, read_log_file.tell() - LOG_TAIL_BYTES))
+            line = read_log_file.read().splitlines()[-20:]
+    except OSError:
         app.logger.debug(f"Error while reading {log_file}, unable to calculate ETA")
         line = ["", ""]
     return line
@@ -519,6 +607,17 @@ def get_notify_timeout(notify_timeout):
     return return_json
 
 
+def get_resource_slots():
+    """
+    Return running and waiting jobs per limited resource (transcodes, makemkv info)
+    and, with TRANSCODE_LIMIT_AUTO, the adaptive transcode limit and its last decisions
+    """
+    return {'success': True,
+            'mode': 'slots',
+            'slots': ResourceSlot.status(),
+            'transcode_limit': transcode_limit.read() if cfg.arm_config.get("TRANSCODE_LIMIT_AUTO") else None}
+
+
 def restart_ui():
     app.logger.debug("Arm ui shutdown....")
     shutdown_code = subprocess.check_output(
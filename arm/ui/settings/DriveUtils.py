@@ -4,8 +4,6 @@ UI Utils
 - drives_search
 - drives_update
 - update_job_status
-Ripper Utils
-- update_drive_job
 """
 
 import dataclasses
@@ -306,22 +304,6 @@ def job_cleanup(job_id):
     db.session.commit()
 
 
-def update_drive_job(job):
-    """
-    Function to take the current job task and update the associated drive ID into the database
-    """
-    drive = SystemDrives.query.filter_by(mount=job.devpath).first()
-    drive.new_job(job.job_id)
-    app.logger.debug(f"Updating Drive: ['{drive.serial_id}'|'{drive.mount}']"
-                     f" Current Job: [{drive.job_id_current}]"
-                     f" Previous Job: [{drive.job_id_previous}]")
-    try:
-        db.session.commit()
-        logging.debug("Database update with new Job ID to associated drive")
-    except Exception as error:  # noqa: E722
-        logging.error(f"Failed to update the database with the associated drive. {error}")
-
-
 def update_tray_status(drives):
     for drive in drives:
         drive.tray_status()
@@ -15,7 +15,6 @@ Covers
 - updatesysinfo [GET]
 """
 import platform
-import importlib
 import re
 import subprocess
 from datetime import datetime
@@ -31,6 +30,7 @@ from flask import render_template, request, flash, \
 import arm.ui.utils as ui_utils
 from arm.ui import app, db
 from arm.models.job import Job
+from arm.models.resource_slot import ResourceSlot
 from arm.models.system_drives import SystemDrives
 from arm.models.system_info import SystemInfo
 from arm.models.ui_settings import UISettings
@@ -39,6 +39,7 @@ from arm.ui.settings import DriveUtils as drive_utils
 from arm.ui.forms import SettingsForm, UiSettingsForm, AbcdeForm, SystemInfoDrives
 from arm.ui.settings.ServerUtil import ServerUtil
 import arm.ripper.utils as ripper_utils
+from arm.ripper import transcode_limit
 
 route_settings = Blueprint('route_settings', __name__,
                            template_folder='templates',
@@ -133,7 +134,10 @@ def settings():
                            arm_path=arm_path,
                            media_path=media_path,
                            drives=drives,
-                           form_drive=form_drive)
+                           form_drive=form_drive,
+                           resource_slots=ResourceSlot.status(),
+                           transcode_limit=transcode_limit.read()
+                           if cfg.arm_config.get("TRANSCODE_LIMIT_AUTO") else None)
 
 
 def check_hw_transcode_support():
@@ -190,7 +194,7 @@ def save_settings():
             settings_file.write(arm_cfg)
             settings_file.close()
         success = True
-        importlib.reload(cfg)
+        cfg.reload()
         # Set the ARM Log level to the config
         app.logger.info(f"Setting log level to: {cfg.arm_config['LOGLEVEL']}")
         app.logger.setLevel(cfg.arm_config['LOGLEVEL'])
@@ -252,7 +256,7 @@ def save_abcde():
             abcde_file.close()
         success = True
         # Update the abcde config
-        cfg.abcde_config = clean_abcde_str
+        cfg.reload()
 
     # If we get to here, there was no post-data
     return {'success': success,
@@ -278,7 +282,7 @@ def save_apprise_cfg():
             settings_file.write(apprise_cfg)
             settings_file.close()
         success = True
-        importlib.reload(cfg)
+        cfg.reload()
     # If we get to here there was no post data
     return {'success': success, 'settings': cfg.apprise_config, 'form': 'Apprise config'}
 
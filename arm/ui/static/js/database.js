@@ -8,6 +8,7 @@ let hrrref = "";
 let activeJob = null;
 let actionType = null;
 let z = "";
+const LOAD_MORE_ID = "#loadMore";
 
 /**
  * Check if users has the understands cookie - if not show the warning dialog
@@ -226,16 +227,24 @@ function checkHref() {
 
 /**
  * Function to get jobs (success/fail buttons) from the arm api
+ * The api sends one page of jobs at a time, a "Load more" button fetches the next page
  * @param getJobsHREF link to the json api
+ * @param before job id the page starts below, undefined for the first page
  */
-function fetchJobs(getJobsHREF) {
-    // Add the spinner to let them know we are loading
-    $(MODEL_ID).modal("show");
-    $(MODAL_TITLE).text("Loading...");
-    $(".modal-body").html("<div class=\"d-flex justify-content-center\"><div class=\"spinner-border\" role=\"status\"><span class=\"sr-only\">Loading...</span></div></div>");
-    $.get(getJobsHREF, function (data) {
+function fetchJobs(getJobsHREF, before) {
+    const firstPage = before === undefined;
+    if (firstPage) {
+        // Add the spinner to let them know we are loading
+        $(MODEL_ID).modal("show");
+        $(MODAL_TITLE).text("Loading...");
+        $(".modal-body").html("<div class=\"d-flex justify-content-center\"><div class=\"spinner-border\" role=\"status\"><span class=\"sr-only\">Loading...</span></div></div>");
+    }
+    $(LOAD_MORE_ID).remove();
+    $.get(firstPage ? getJobsHREF : `${getJobsHREF}&before=${before}`, function (data) {
         if (data.success === true) {
-            $(CARD_DECK).html("");
+            if (firstPage) {
+                $(CARD_DECK).html("");
+            }
             const size = Object.keys(data.results).length;
             if (size > 0) {
                 $(MSG_1_ID).html("Here are all the jobs you asked for....");
@@ -245,6 +254,13 @@ function fetchJobs(getJobsHREF) {
             } else {
                 $(MSG_1_ID).html("I couldn't find any results matching that title").removeClass("d-none");
             }
+            if (data.next !== null && data.next !== undefined) {
+                $(CARD_DECK).append(`<div class="col-md-12 text-center my-3" id="${LOAD_MORE_ID.substring(1)}">
+                                     <button type="button" class="btn btn-secondary">Load more</button></div>`);
+                $(`${LOAD_MORE_ID} button`).bind("click", function () {
+                    fetchJobs(getJobsHREF, data.next);
+                });
+            }
             setTimeout(
                 function () {
                     $("#message1").addClass("d-none");
@@ -252,7 +268,9 @@ function fetchJobs(getJobsHREF) {
                 5000
             );
         }
-        timeOutModal()
+        if (firstPage) {
+            timeOutModal()
+        }
     }, "json");
     $(MODAL_FOOTER).removeClass("d-none");
 }
@@ -23,44 +23,37 @@ import arm.config.config as cfg
 from arm.config.config_utils import arm_yaml_test_bool
 from arm.config import config_utils
 from arm.models.alembic_version import AlembicVersion
+from arm.models.disc_fingerprint import DiscFingerprint
 from arm.models.job import Job
 from arm.models.system_info import SystemInfo
 from arm.models.ui_settings import UISettings
 from arm.models.user import User
 from arm.ui import app, db
-from arm.ui.metadata import tmdb_search, get_tmdb_poster, tmdb_find, call_omdb_api
+from arm.database import db_commit
+from arm import http_client
+from arm.metadata import tmdb_search, get_tmdb_poster, tmdb_find, call_omdb_api
 from arm.ui.settings import DriveUtils
 
 # Path definitions
 path_migrations = "arm/migrations"
 
 
-def database_updater(args, job, wait_time=90):
+def database_updater(args, job):
     """
-    Try to update our db for x seconds and handle it nicely if we cant\n
+    Update the job and handle it nicely if the database is locked\n
 
     :param args: This needs to be a Dict with the key being the
     job.method you want to change and the value being the new value.
     :param job: This is the job object
-    :param wait_time: The time to wait in seconds
     :returns : Boolean
     """
-    # Loop through our args and try to set any of our job variables
-    for (key, value) in args.items():
-        setattr(job, key, value)
-        app.logger.debug(f"Setting {key}: {value}")
-    for i in range(wait_time):  # give up after the users wait period in seconds
-        try:
-            db.session.commit()
-        except Exception as error:
-            if "locked" in str(error):
-                sleep(1)
-                app.logger.debug(f"database is locked - trying in 1 second {i}/{wait_time} - {error}")
-            else:
-                app.logger.debug("Error: " + str(error))
-                db.session.rollback()
-                raise RuntimeError(str(error)) from error
+    def apply():
+        # Loop through our args and try to set any of our job variables
+        for (key, value) in args.items():
+            setattr(job, key, value)
+            app.logger.debug(f"Setting {key}: {value}")
 
+    db_commit(apply)
     app.logger.debug("successfully written to the database")
     return True
 
@@ -446,33 +439,20 @@ def job_dupe_check(crc_id):
     function for checking the database to look for jobs that have completed
     successfully with the same crc
 
-    :param crc_id: The job obj so we can use the crc/title etc
-    :return: True if we have found dupes with the same crc
-              - Will also return a dict of all the jobs found.
+    :param crc_id: fingerprint of the disc, see DiscFingerprint
+    :return: True if we have found a successful rip with a nice title with the same crc
+              - Will also return a dict with the last of these jobs.
              False if we didnt find any with the same crc
               - Will also return None as a secondary param
     """
     if crc_id is None:
         return False, None
-    jobs = Job.query.filter_by(crc_id=crc_id, status="success", hasnicetitle=True)
-    # app.logger.debug("search - posts=" + str(jobs))
-    return_results = {}
-    i = 0
-    for j in jobs:
-        app.logger.debug("job obj= " + str(j.get_d()))
-        return_results[i] = {}
-        for key, value in iter(j.get_d().items()):
-            return_results[i][str(key)] = str(value)
-            # logging.debug(str(key) + "= " + str(value))
-        i += 1
-
-    app.logger.debug(return_results)
-    app.logger.debug("r len=" + str(len(return_results)))
-    if jobs is not None and len(return_results) > 0:
-        app.logger.debug("jobs is none or len(r) - we have jobs")
-        return True, return_results
-    app.logger.debug("jobs is none or len(r) is 0 - we have no jobs")
-    return False, None
+    previous_rip = DiscFingerprint.previous_rip(crc_id, identified=True)
+    if previous_rip is None:
+        app.logger.debug("no successful jobs with this crc")
+        return False, None
+    app.logger.debug(f"crc {crc_id} was ripped by job {previous_rip.job_id}")
+    return True, {0: {key: str(value) for key, value in previous_rip._asdict().items()}}
 
 
 def metadata_selector(func, query="", year="", imdb_id=""):
@@ -591,8 +571,7 @@ def send_to_remote_db(job_id):
           f"&y={job.year}&imdb={job.imdb_id}" \
           f"&hnt={job.hasnicetitle}&l={job.label}&vt={job.video_type}"
     app.logger.debug(url.replace(api_key, "<api_key>"))
-    response = requests.get(url)
-    req = json.loads(response.text)
+    req = http_client.get_json(url, "arm")
     app.logger.debug("req= " + str(req))
     job_dict = job.get_d().items()
     return_dict['config'] = job.config.get_d()
@@ -835,6 +814,10 @@ def import_movie_add(poster_image, imdb_id, movie_group, my_path):
     new_movie.path = my_path
     app.logger.debug(new_movie)
     db.session.add(new_movie)
+    if new_movie.status == 'success':
+        # The job_id is needed to link the job to its fingerprint
+        db.session.flush()
+        DiscFingerprint.record_success(new_movie, new_movie.crc_id)
     return movie_dict
 
 
@@ -878,7 +861,7 @@ def git_check_updates(current_hash) -> bool:
     arm_current = True      # set True, any exceptions will return a true value
 
     try:
-        response = requests.get(url, timeout=10)
+        response = http_client.get(url, timeout=10)
         response.raise_for_status()  # Raise an error for HTTP failures (4xx, 5xx)
 
         latest_commit = response.json().get("sha", "").strip()
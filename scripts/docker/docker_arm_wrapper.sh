@@ -57,4 +57,9 @@ else
 	  exit #bail out
 fi
 cd /home/arm
+# Hand the disc to the ARM ripper service if it is running, otherwise start a new ARM process
+if [ -S "${CONFIG_RIPPER_SOCKET}" ] && ANSWER=$(/usr/bin/python3 /opt/arm/arm/ripper/ripper_client.py -d "${DEVNAME}" -s "${CONFIG_RIPPER_SOCKET}"); then
+    echo "[ARM] ${ANSWER}" | logger -t ARM -s
+    exit 0
+fi
 /usr/bin/python3 /opt/arm/arm/ripper/main.py -d "${DEVNAME}" | logger -t ARM -s
@@ -59,7 +59,12 @@ else
 
 fi
 
-/bin/su -l -c "echo /opt/arm/venv/bin/python3 /opt/arm/arm/ripper/main.py -d ${DEVNAME} | at now" -s /bin/bash ${USER}
+# Hand the disc to the ARM ripper service if it is running, otherwise start a new ARM process
+if [ -S "${CONFIG_RIPPER_SOCKET}" ] && ANSWER=$(/opt/arm/venv/bin/python3 /opt/arm/arm/ripper/ripper_client.py -d "${DEVNAME}" -s "${CONFIG_RIPPER_SOCKET}"); then
+	echo "[ARM] ${ANSWER}" | logger -t ARM -s
+else
+	/bin/su -l -c "echo /opt/arm/venv/bin/python3 /opt/arm/arm/ripper/main.py -d ${DEVNAME} | at now" -s /bin/bash ${USER}
+fi
 
 #######################################################################################
 # Check to see if the admin page is running, if not, start it
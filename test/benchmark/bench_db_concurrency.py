@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Benchmark concurrent rippers and UI polling against one SQLite database
+
+Starts several simulated rippers, each committing job updates and track
+inserts as fast as it can, plus UI pollers reading the job list, all on one
+scratch database. This runs twice: with the old SQLite defaults (rollback
+journal, synchronous=FULL, 5s busy timeout, sleep 1s and retry on "database is
+locked") and with the connection tuning ARM now applies on connect
+(`arm.database._sqlite_pragmas`). For each run it reports the commits per second,
+the commit latency, the lock errors and the UI polls per second.
+
+Usage:
+    python3 test/benchmark/bench_db_concurrency.py [--rippers 4] [--pollers 2] [--updates 200]
+
+Exits with 1 if the tuned connections still hit lock errors.
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+SCHEMA = """
+CREATE TABLE job (job_id INTEGER PRIMARY KEY, status TEXT, stage TEXT, progress TEXT);
+CREATE TABLE track (track_id INTEGER PRIMARY KEY, job_id INTEGER, track_number TEXT, length INTEGER);
+"""
+
+
+def connect(path, tuned):
+    """Open a connection like the ripper does before or after the tuning"""
+    if tuned:
+        from arm.database import _sqlite_pragmas
+        connection = sqlite3.connect(path)
+        _sqlite_pragmas(connection, None)
+    else:
+        connection = sqlite3.connect(path, timeout=5)
+        connection.execute("PRAGMA journal_mode=DELETE")
+    return connection
+
+
+def commit(connection, statements):
+    """Run statements in a transaction, retry like the old database_updater, returns lock errors"""
+    errors = 0
+    while True:
+        try:
+            with connection:
+                for sql, params in statements:
+                    connection.execute(sql, params)
+            return errors
+        except sqlite3.OperationalError as error:
+            if "locked" not in str(error):
+                raise
+            errors += 1
+            time.sleep(1)
+
+
+def ripper(path, tuned, job_id, updates, go, results):
+    """Commit progress updates and a track insert every 10 updates"""
+    connection = connect(path, tuned)
+    results.put(("ready",))
+    go.wait()
+    latencies = []
+    errors = commit(connection, [("INSERT INTO job VALUES (?, 'ripping', '', '0')", (job_id,))])
+    for update in range(updates):
+        statements = [("UPDATE job SET progress = ?, stage = ? WHERE job_id = ?", (str(update), f"{update}", job_id))]
+        if update % 10 == 0:
+            statements.append(("INSERT INTO track (job_id, track_number, length) VALUES (?, ?, ?)",
+                               (job_id, str(update), update * 7)))
+        start = time.perf_counter()
+        errors += commit(connection, statements)
+        latencies.append(time.perf_counter() - start)
+    connection.close()
+    results.put(("ripper", latencies, errors))
+
+
+def poller(path, tuned, go, stop, results):
+    """Read the job list like /json?mode=joblist until stopped"""
+    connection = connect(path, tuned)
+    results.put(("ready",))
+    go.wait()
+    polls = errors = 0
+    while not stop.is_set():
+        try:
+            connection.execute("SELECT job.*, count(track.track_id) FROM job "
+                               "LEFT JOIN track ON track.job_id = job.job_id GROUP BY job.job_id").fetchall()
+            polls += 1
+        except sqlite3.OperationalError:
+            errors += 1
+        time.sleep(0.01)
+    connection.close()
+    results.put(("poller", polls, errors))
+
+
+def run(tuned, rippers, pollers, updates):
+    """One benchmark run on a fresh database, returns a dict of results"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "arm.db")
+        with sqlite3.connect(path) as connection:
+            connection.executescript(SCHEMA)
+        results = multiprocessing.Queue()
+        go = multiprocessing.Event()
+        stop = multiprocessing.Event()
+        poll_procs = [multiprocessing.Process(target=poller, args=(path, tuned, go, stop, results))
+                      for _ in range(pollers)]
+        rip_procs = [multiprocessing.Process(target=ripper, args=(path, tuned, job_id, updates, go, results))
+                     for job_id in range(1, rippers + 1)]
+        for proc in poll_procs + rip_procs:
+            proc.start()
+        # connecting (and importing ARM) is not part of the timing
+        for _ in poll_procs + rip_procs:
+            results.get()
+        start = time.perf_counter()
+        go.set()
+        collected = [results.get() for _ in rip_procs]
+        elapsed = time.perf_counter() - start
+        stop.set()
+        collected += [results.get() for _ in poll_procs]
+        for proc in rip_procs + poll_procs:
+            proc.join()
+    latencies = sorted(latency for kind, latency_list, _ in collected if kind == "ripper" for latency in latency_list)
+    return {
+        "commits/s": len(latencies) / elapsed,
+        "p50 ms": statistics.median(latencies) * 1000,
+        "p95 ms": latencies[int(len(latencies) * 0.95)] * 1000,
+        "max ms": latencies[-1] * 1000,
+        "locked": sum(errors for kind, _, errors in collected if kind == "ripper"),
+        "polls/s": sum(polls for kind, polls, _ in collected if kind == "poller") / elapsed,
+        "poll errors": sum(errors for kind, _, errors in collected if kind == "poller"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rippers", type=int, default=4, help="concurrent simulated rippers")
+    parser.add_argument("--pollers", type=int, default=2, help="concurrent UI pollers")
+    parser.add_argument("--updates", type=int, default=200, help="job updates per ripper")
+    args = parser.parse_args()
+
+    columns = ("commits/s", "p50 ms", "p95 ms", "max ms", "locked", "polls/s", "poll errors")
+    print(f"{'connections':<12}" + "".join(f"{column:>13}" for column in columns))
+    results = {}
+    for name, tuned in (("legacy", False), ("tuned", True)):
+        results[name] = run(tuned, args.rippers, args.pollers, args.updates)
+        print(f"{name:<12}" + "".join(f"{results[name][column]:>13,.1f}" for column in columns))
+    return 1 if results["tuned"]["locked"] or results["tuned"]["poll errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark the time from a disc event to the start of its processing
+
+Compares starting a new ARM process per disc, measured as the time python
+needs to start and import arm/ripper/main.py, with handing the event to the
+ripper service, measured as a run of ripper_client.py against a RipperDaemon
+whose workers exit right away. Reports the median of several runs.
+
+Usage:
+    python3 test/benchmark/bench_dispatch.py [--runs 5]
+
+Exits with 1 if the service is not faster.
+"""
+import argparse
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+sys.path.insert(0, ROOT)
+from arm.ripper import daemon  # noqa: E402
+
+CLIENT = os.path.join(ROOT, "arm", "ripper", "ripper_client.py")
+
+
+def exit_worker(_devpath, _arm_log):
+    """Worker that does nothing"""
+    os._exit(0)
+
+
+def timed(command):
+    """Seconds to run command"""
+    start = time.perf_counter()
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL, env=dict(os.environ, PYTHONPATH=os.pathsep.join(
+        filter(None, (ROOT, os.environ.get("PYTHONPATH"))))))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5, help="runs of each variant")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    with tempfile.TemporaryDirectory() as tmp:
+        socket_path = os.path.join(tmp, "ripper.sock")
+        service = daemon.RipperDaemon(socket_path, logging.getLogger("bench"), exit_worker)
+        thread = threading.Thread(target=service.serve, daemon=True)
+        thread.start()
+        while not os.path.exists(socket_path):
+            time.sleep(0.01)
+        results = {
+            "process per disc": [timed([sys.executable, "-c", "import arm.ripper.main"]) for _ in range(args.runs)],
+            "ripper service": [timed([sys.executable, CLIENT, "-d", f"sr{run}", "-s", socket_path])
+                               for run in range(args.runs)],
+        }
+        service.stop()
+        thread.join()
+    for name, seconds in results.items():
+        print(f"{name:<17} {statistics.median(seconds) * 1000:>9.1f} ms")
+    speedup = statistics.median(results["process per disc"]) / statistics.median(results["ripper service"])
+    print(f"speedup           {speedup:>9.1f}x")
+    return 0 if speedup > 1 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark the HandBrake title scan of handbrake_all()
+
+Scans --source (a disc device, an ISO or a VIDEO_TS/BDMV folder) with
+HandBrakeCLI twice: with HandBrake's default previews per title, as ARM did
+before, and with handbrake.SCAN_PREVIEWS as get_track_info() does now. Prints
+the time of both scans and the titles and durations they found, which must be
+the same. handbrake_all() scans once and then transcodes the selected titles,
+so the scan is the fixed cost of every DVD/Blu-ray in HandBrake mode.
+
+Every HandBrakeCLI run opens the source and scans its title again,
+handbrake_all() encodes the titles after the first in one queued run (see
+handbrake.TitleTranscoder). With --per-title the scan of each title on its own
+(`-t N --scan`) is timed as well. Their sum is about the time the queued run
+saves over a run per title.
+
+Usage:
+    python3 test/benchmark/bench_handbrake_scan.py --source /dev/sr0 [--handbrake HandBrakeCLI] [--repeat 3]
+        [--per-title]
+
+Exits with 1 if HandBrakeCLI is missing, the scans disagree or the new scan is not faster.
+"""
+import argparse
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from arm.ripper import handbrake  # noqa: E402
+
+TITLE = re.compile(r"^\s*\+ title (\d+):")
+DURATION = re.compile(r"^\s*\+ duration: (\d{2}:\d{2}:\d{2})")
+
+
+def scan(hb_cli, source, previews, title_number=0):
+    """Run one title scan, return (seconds, {title: duration})"""
+    cmd = [hb_cli, "-i", source, "-t", str(title_number), "--scan"]
+    if previews is not None:
+        cmd += ["--previews", f"{previews}:0"]
+    start = time.perf_counter()
+    output = subprocess.run(cmd, capture_output=True, check=False).stderr.decode("utf-8", "replace")
+    seconds = time.perf_counter() - start
+    titles, title = {}, None
+    for line in output.splitlines():
+        if match := TITLE.match(line):
+            title = match.group(1)
+        elif (match := DURATION.match(line)) and title is not None:
+            titles[title] = match.group(1)
+    return seconds, titles
+
+
+def timed(hb_cli, source, previews, repeat):
+    """Median seconds of repeat scans and the titles of the last one"""
+    runs = [scan(hb_cli, source, previews) for _ in range(repeat)]
+    return statistics.median(seconds for seconds, _ in runs), runs[-1][1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--source", required=True, help="disc device, ISO or VIDEO_TS/BDMV folder")
+    parser.add_argument("--handbrake", default="HandBrakeCLI", help="HandBrakeCLI binary")
+    parser.add_argument("--repeat", type=int, default=3, help="scans of each kind, the median is shown")
+    parser.add_argument("--per-title", action="store_true", help="also time the scan of every title on its own")
+    args = parser.parse_args()
+
+    hb_cli = shutil.which(args.handbrake)
+    if hb_cli is None:
+        print(f"{args.handbrake} not found")
+        return 1
+    before_s, before_titles = timed(hb_cli, args.source, None, args.repeat)
+    after_s, after_titles = timed(hb_cli, args.source, handbrake.SCAN_PREVIEWS, args.repeat)
+
+    print(f"{'title':>5} {'duration':>9}")
+    for title, duration in after_titles.items():
+        print(f"{title:>5} {duration:>9}")
+    print(f"default previews {before_s:>8.2f}s   {handbrake.SCAN_PREVIEWS} preview(s) {after_s:>8.2f}s   "
+          f"{before_s / after_s:>5.1f}x")
+    if before_titles != after_titles:
+        print(f"scans disagree: {before_titles} != {after_titles}")
+        return 1
+    if args.per_title:
+        per_title_s = sum(scan(hb_cli, args.source, None, int(title))[0] for title in after_titles)
+        print(f"{len(after_titles)} titles scanned one by one {per_title_s:>8.2f}s, "
+              f"the source opened again by every encode of a run per title")
+    return 0 if after_titles and after_s < before_s else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
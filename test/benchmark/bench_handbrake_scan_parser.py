@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Benchmark the HandBrake scan parsers
+
+Generates the text scan (stderr of `HandBrakeCLI -t 0 --scan`) and the json
+scan (stdout of `HandBrakeCLI -t 0 --scan --json`) of the same made up DVD and
+Blu-ray in HandBrake 1.6 output format, parses the text scan with
+`arm.ripper.handbrake.parse_scan_text` and the json scan with
+`arm.ripper.handbrake.parse_scan_json`. Reports the time per scan of both and
+checks they find the same titles, lengths, aspect, fps and main feature.
+Recorded scans can be given instead, a text scan with the json scan of the same
+disc in a .json next to it.
+
+Usage:
+    python3 test/benchmark/bench_handbrake_scan_parser.py [--repeat 50] [scan.txt ...]
+
+Exits with 1 if the parsers disagree or the json parser is slower.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from arm.ripper.handbrake import parse_scan_json, parse_scan_text  # noqa: E402
+
+DISCS = (("dvd", 31, 1), ("bluray", 64, 2))
+"""Generated discs: kind, titles, random seed"""
+LANGUAGES = (("English", "eng"), ("Français", "fra"), ("Deutsch", "deu"), ("Español", "spa"),
+             ("Italiano", "ita"), ("Japanese", "jpn"), ("Unknown", "und"))
+SOURCE = "/dev/sr0"
+
+
+class Tracks:
+    """Collects the titles like utils.TrackBatch, without a database"""
+
+    def __init__(self):
+        self.rows = []
+
+    def put(self, t_no, seconds, aspect, fps, mainfeature, source, filename="", audio=None, subtitles=None):
+        self.rows.append((int(t_no), seconds, str(aspect), float(fps), mainfeature))
+
+
+def make_titles(kind, count, seed):
+    """Titles of a made up disc, the longest is the main feature"""
+    rng = random.Random(seed)
+    titles = []
+    for index in range(1, count + 1):
+        if kind == "bluray":
+            seconds = rng.choice([rng.randint(5, 300), rng.randint(300, 1800), rng.randint(5400, 9000)])
+            height, par, fps = 1080, (1, 1), rng.choice([(24000, 1001), (24000, 1001), (30000, 1001)])
+            audio = [(rng.choice(LANGUAGES), rng.choice(["TrueHD", "AC3", "DTS-HD MA", "DTS"]),
+                      rng.choice(["7.1 ch", "5.1 ch", "2.0 ch"])) for _ in range(rng.randint(1, 6))]
+            subtitles = [(rng.choice(LANGUAGES), "PGS") for _ in range(rng.randint(0, 12))]
+        else:
+            seconds = rng.choice([rng.randint(1, 120), rng.randint(120, 1500), rng.randint(5400, 8000)])
+            height = rng.choice([480, 576])
+            par = rng.choice([(64, 45), (16, 15)]) if height == 576 else rng.choice([(32, 27), (8, 9)])
+            fps = (30000, 1001) if height == 480 else (25, 1)
+            audio = [(rng.choice(LANGUAGES), "AC3", rng.choice(["5.1 ch", "2.0 ch"])) for _ in range(rng.randint(1, 4))]
+            subtitles = [(rng.choice(LANGUAGES), "VOBSUB") for _ in range(rng.randint(0, 8))]
+        titles.append({"index": index, "seconds": seconds, "width": 1920 if kind == "bluray" else 720,
+                       "height": height, "par": par, "fps": fps, "audio": audio, "subtitles": subtitles,
+                       "chapters": rng.randint(8, 32) if seconds > 3600 else rng.randint(1, 3)})
+    main = max(titles, key=lambda title: title["seconds"])["index"]
+    return titles, main
+
+
+def hms(seconds):
+    return f"{seconds // 3600:02}:{seconds % 3600 // 60:02}:{seconds % 60:02}"
+
+
+def text_scan(kind, titles, main):
+    """Lines HandBrake logs for a scan of titles"""
+    lines = ["[19:02:11] hb_init: starting libhb thread",
+             "HandBrake 1.6.1 (2023010900) - Linux x86_64 - https://handbrake.fr", "4 CPUs detected",
+             f"Opening {SOURCE}...", f"[19:02:11] hb_scan: path={SOURCE}, title_index=0"]
+    if kind == "bluray":
+        lines += [f"[19:02:11] bd: scanning {SOURCE}", f"[19:02:12] bd: {len(titles)} titles"]
+    else:
+        lines += ["libdvdnav: Using dvdnav version 6.1.1", f"[19:02:12] scan: DVD has {len(titles)} title(s)"]
+    for title in titles:
+        aspect = title["width"] * title["par"][0] / (title["height"] * title["par"][1])
+        fps = title["fps"][0] / title["fps"][1]
+        if kind == "bluray":
+            lines += [f"[19:02:12] bd: scanning title {title['index']}",
+                      f"[19:02:12] bd: playlist {title['index']:05}.MPLS",
+                      f"[19:02:12] bd: duration is {hms(title['seconds'])} ({title['seconds'] * 1000} ms)"]
+        else:
+            lines += [f"[19:02:12] scan: scanning title {title['index']}",
+                      f"[19:02:12] scan: duration is {hms(title['seconds'])} ({title['seconds'] * 1000} ms)",
+                      f"[19:02:12] scan: checking audio {len(title['audio'])}"]
+        for number, ((language, _), codec, channels) in enumerate(title["audio"], 1):
+            lines.append(f"[19:02:12] scan: audio 0x{number:x}: {codec.lower()}, rate=48000Hz, bitrate=448000 "
+                         f"{language} ({codec}) ({channels})")
+        for number, ((language, code), fmt) in enumerate(title["subtitles"], 1):
+            lines.append(f"[19:02:12] scan: subtitle id=0x{number + 0x1f:x} lang={language} (Bitmap)({fmt}) "
+                         f"3cc={code}")
+        lines += [f"[19:02:12] scan: decoding previews for title {title['index']}",
+                  f"[19:02:12] scan: 1 previews, {title['width']}x{title['height']}, {fps:.3f} fps, "
+                  f"autocrop = 0/0/0/0, aspect {aspect:.2f}:1, PAR {title['par'][0]}:{title['par'][1]}, "
+                  f"color profile: 1-1-1, chroma location: left"]
+    if kind == "bluray":
+        lines.append(f"[19:02:14] scan: BD has {len(titles)} title(s)")
+    lines.append(f"[19:02:14] libhb: scan thread found {len(titles)} valid title(s)")
+    for title in titles:
+        aspect = title["width"] * title["par"][0] / (title["height"] * title["par"][1])
+        lines.append(f"+ title {title['index']}:")
+        if title["index"] == main:
+            lines.append("  + Main Feature")
+        if kind == "bluray":
+            lines.append(f"  + playlist: {title['index']:05}.MPLS")
+        else:
+            lines += [f"  + index {title['index']}",
+                      f"  + vts {title['index'] % 9 + 1}, ttn 1, cells 0->{title['chapters'] - 1} "
+                      f"({title['seconds'] * 580} blocks)"]
+        lines += [f"  + duration: {hms(title['seconds'])}",
+                  f"  + size: {title['width']}x{title['height']}, pixel aspect: {title['par'][0]}/{title['par'][1]}, "
+                  f"display aspect: {aspect:.2f}, {title['fps'][0] / title['fps'][1]:.3f} fps",
+                  "  + autocrop: 0/0/0/0", "  + chapters:"]
+        lines += [f"    + {chapter}: duration {hms(title['seconds'] // title['chapters'])}"
+                  for chapter in range(1, title["chapters"] + 1)]
+        lines.append("  + audio tracks:")
+        lines += [f"    + {number}, {language} ({codec}) ({channels}) (iso639-2: {code}), 48000Hz, 448000bps"
+                  for number, ((language, code), codec, channels) in enumerate(title["audio"], 1)]
+        lines.append("  + subtitle tracks:")
+        lines += [f"    + {number}, {language} [{fmt}]"
+                  for number, ((language, _), fmt) in enumerate(title["subtitles"], 1)]
+    return lines + ["[19:02:14] libhb: work result = 0", "", "HandBrake has exited."]
+
+
+def duration(seconds):
+    return {"Hours": seconds // 3600, "Minutes": seconds % 3600 // 60, "Seconds": seconds % 60,
+            "Ticks": seconds * 90000}
+
+
+def json_scan(kind, titles, main):
+    """stdout of HandBrake --json for a scan of titles"""
+    version = {"Arch": "x86_64", "Name": "HandBrake", "Official": True, "RepoDate": "2023-01-09 19:49:44",
+               "System": "Linux", "Type": "release", "Version": {"Major": 1, "Minor": 6, "Point": 1},
+               "VersionString": "1.6.1", "APIVersion": 10}
+    blocks = ["Version: " + json.dumps(version, indent=4, sort_keys=True)]
+    for done in range(0, len(titles), max(1, len(titles) // 20)):
+        blocks.append("Progress: " + json.dumps(
+            {"Scanning": {"Preview": 0, "PreviewCount": 1, "Progress": done / len(titles), "SequenceID": 0,
+                          "Title": done + 1, "TitleCount": len(titles)}, "State": "SCANNING"}, indent=4,
+            sort_keys=True))
+    no_attributes = dict.fromkeys(("4By3", "Children", "ClosedCaption", "Commentary", "Default", "Forced", "Large",
+                                   "Letterbox", "Normal", "PanScan", "Wide"), False)
+    title_list = [{
+        "AngleCount": 1,
+        "AudioList": [{"BitRate": 448000, "ChannelCount": 8 if channels == "7.1 ch" else 6 if channels == "5.1 ch"
+                       else 2, "ChannelLayout": 1551, "Codec": 2048, "CodecName": codec.lower(), "CodecParam": 86019,
+                       "Description": f"{language} ({codec}, {channels})", "LFECount": int(channels != "2.0 ch"),
+                       "Language": language, "LanguageCode": code, "SampleRate": 48000}
+                      for (language, code), codec, channels in title["audio"]],
+        "ChapterList": [{"Duration": duration(title["seconds"] // title["chapters"]), "Name": f"Chapter {chapter}"}
+                        for chapter in range(1, title["chapters"] + 1)],
+        "Color": {"ChromaLocation": 1, "Format": 0, "Matrix": 1, "Primary": 1, "Range": 1, "Transfer": 1},
+        "Crop": [0, 0, 0, 0],
+        "Duration": duration(title["seconds"]),
+        "FrameRate": {"Den": title["fps"][1], "Num": title["fps"][0]},
+        "Geometry": {"Height": title["height"], "PAR": {"Den": title["par"][1], "Num": title["par"][0]},
+                     "Width": title["width"]},
+        "Index": title["index"],
+        "InterlaceDetected": False,
+        "LooseCrop": [0, 0, 0, 0],
+        "Metadata": {},
+        "Name": "LONG_MOVIE_TITLE",
+        "Path": SOURCE,
+        "Playlist": title["index"] if kind == "bluray" else -1,
+        "SubtitleList": [{"Attributes": no_attributes, "Format": "bitmap", "Language": language, "LanguageCode": code,
+                          "Source": 0 if fmt == "VOBSUB" else 4, "SourceName": fmt}
+                         for (language, code), fmt in title["subtitles"]],
+        "Type": 2 if kind == "bluray" else 1,
+        "VideoCodec": "h264" if kind == "bluray" else "mpeg2",
+    } for title in titles]
+    blocks.append("JSON Title Set: " + json.dumps({"MainFeature": main, "TitleList": title_list}, indent=4,
+                                                  sort_keys=True))
+    return "\n".join(blocks) + "\n"
+
+
+def scans(paths):
+    """(name, text scan lines, json scan output) of the recorded scans in paths or of the generated discs"""
+    for path in paths:
+        with open(path, encoding="utf-8") as scan:
+            lines = scan.read().splitlines()
+        with open(os.path.splitext(path)[0] + ".json", encoding="utf-8") as scan:
+            yield os.path.basename(path), lines, scan.read()
+    if not paths:
+        for kind, count, seed in DISCS:
+            titles, main = make_titles(kind, count, seed)
+            yield f"generated {kind}", text_scan(kind, titles, main), json_scan(kind, titles, main)
+
+
+def timed(parser, scan, repeat):
+    """ms per parse of a scan and the collected titles"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        tracks = Tracks()
+        titles = parser(scan, tracks)
+    return (time.perf_counter() - start) * 1000 / repeat, titles, tracks.rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=50, help="parses of every scan")
+    parser.add_argument("scans", nargs="*", help="recorded text scans, the json scan is the .json next to each")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    ok = True
+    for name, lines, output in scans(args.scans):
+        text_ms, text_titles, text_rows = timed(parse_scan_text, lines, args.repeat)
+        json_ms, json_titles, json_rows = timed(parse_scan_json, output, args.repeat)
+        print(f"{name:<28} {json_titles:>4} titles   text {text_ms:>7.2f}ms   "
+              f"json {json_ms:>7.2f}ms   {text_ms / json_ms:>5.1f}x")
+        if (text_titles, text_rows) != (json_titles, json_rows):
+            mismatch = [(text, js) for text, js in zip(text_rows, json_rows) if text != js]
+            print(f"  parsers disagree: {text_titles} != {json_titles} titles, {mismatch[:3]}")
+            ok = False
+        ok = ok and json_ms < text_ms
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
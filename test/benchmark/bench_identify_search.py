@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Benchmark the metadata search of a badly labelled disc
+
+Every provider search is simulated with a fixed round trip time and finds
+nothing except for the shortest title, the worst case of identification. Compares
+asking the candidate queries one after another, like ARM did before, with
+identify_loop() asking them on SEARCH_WORKERS threads.
+
+Usage:
+    python3 test/benchmark/bench_identify_search.py [--latency-ms 300]
+
+Exits with 1 if the concurrent search is not faster.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from unittest.mock import patch
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+sys.path.insert(0, ROOT)
+from arm.ripper import identify  # noqa: E402
+
+TITLE = "THE+LORD+OF+THE+RINGS-FELLOWSHIP+OF+THE+RING+DISC+1"
+YEAR = "2002"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency-ms", type=float, default=300, help="simulated round trip of a search")
+    args = parser.parse_args()
+
+    def provider_search(title, year=None):
+        time.sleep(args.latency_ms / 1000)
+        if title == "THE":
+            return {'Search': [{'Title': "The Lord of the Rings", 'Year': "2001"}]}
+        return None
+
+    logging.disable(logging.CRITICAL)
+    candidates = identify.candidate_queries(TITLE, YEAR)
+    with patch.object(identify, "provider_search", side_effect=provider_search), \
+            patch.object(identify, "update_job"):
+        start = time.perf_counter()
+        for query, year in candidates:
+            if provider_search(query, year):
+                break
+        sequential = time.perf_counter() - start
+        start = time.perf_counter()
+        identify.identify_loop(None, TITLE, YEAR)
+        concurrent = time.perf_counter() - start
+    print(f"{len(candidates)} candidate queries, {args.latency_ms:.0f} ms per search")
+    print(f"one after another {sequential:>7.2f} s")
+    print(f"concurrent        {concurrent:>7.2f} s")
+    print(f"speedup           {sequential / concurrent:>7.1f}x")
+    return 0 if concurrent < sequential else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
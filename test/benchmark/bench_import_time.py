@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark the import time of the ripper
+
+Runs `python -X importtime -c "import arm.ripper.main"` several times in fresh
+interpreters and reports the median cumulative import time of arm.ripper.main
+and the modules that take longest to import. With --baseline, the arm package
+of that git revision is imported in turns with the current one on the same
+machine and the ratio of the medians is reported.
+
+The ripper must not import Flask, the UI (arm.ui) or anything only the UI
+needs. Fails if one of those modules is imported, or if the import time is
+more than --max-ratio times that of the baseline.
+
+Usage:
+    python3 test/benchmark/bench_import_time.py [--runs 7] [--top 10] [--baseline REV [--max-ratio 1.2]]
+"""
+import argparse
+import io
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+MODULE = "arm.ripper.main"
+UI_ONLY = ("arm.ui", "flask", "flask_login", "flask_sqlalchemy", "flask_migrate", "flask_wtf", "flask_cors",
+           "wtforms")
+"""Modules that mean the ripper pulls in the UI again"""
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+
+def import_times(root=ROOT):
+    """
+    Import MODULE in a fresh interpreter
+
+    :param root: directory with the arm package to import
+    :return: dict of module name: (self us, cumulative us) of top level imports
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (root, os.environ.get("PYTHONPATH")))))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {MODULE}"], env=env, cwd=root,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    times = {}
+    for match in LINE.finditer(result.stderr):
+        times[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return times
+
+
+def checkout(revision, directory):
+    """Extract the arm package of a git revision into directory"""
+    archive = subprocess.run(["git", "archive", "--format=tar", revision, "arm"], cwd=ROOT,
+                             stdout=subprocess.PIPE, check=True).stdout
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=7, help="fresh interpreters to measure")
+    parser.add_argument("--top", type=int, default=10, help="slowest modules to list")
+    parser.add_argument("--baseline", help="git revision to compare with, e.g. HEAD~1 or main")
+    parser.add_argument("--max-ratio", type=float, default=1.2, help="fail above this ratio to the baseline")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as baseline_root:
+        if args.baseline:
+            checkout(args.baseline, baseline_root)
+        runs = []
+        baseline_runs = []
+        # in turns, so both see the same load and disk cache
+        for _ in range(args.runs):
+            runs.append(import_times())
+            if args.baseline:
+                baseline_runs.append(import_times(baseline_root))
+    total = statistics.median(times[MODULE][1] for times in runs) / 1000
+    last = runs[-1]
+    print(f"{MODULE}: {total:.0f} ms median cumulative import time, {len(last)} modules")
+    print(f"{'self ms':>9} {'cumulative ms':>14}  module")
+    for name, (self_us, cumulative_us) in sorted(last.items(), key=lambda item: -item[1][0])[:args.top]:
+        print(f"{self_us / 1000:>9.1f} {cumulative_us / 1000:>14.1f}  {name}")
+
+    ui_modules = sorted(name for name in last
+                        if any(name == module or name.startswith(f"{module}.") for module in UI_ONLY))
+    if ui_modules:
+        print(f"FAIL: the ripper imports UI modules: {', '.join(ui_modules)}")
+        return 1
+    if args.baseline:
+        baseline = statistics.median(times[MODULE][1] for times in baseline_runs) / 1000
+        ratio = total / baseline
+        print(f"{args.baseline}: {baseline:.0f} ms median cumulative import time, ratio {ratio:.2f}")
+        if ratio > args.max_ratio:
+            print(f"FAIL: import time is {ratio:.2f} times that of {args.baseline}, above {args.max_ratio:.2f}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark the getsuccessful json api of the database page
+
+Fills a scratch SQLite database with --sizes successful jobs and their config,
+then builds the getsuccessful answer twice: as ARM did before (every job and
+its config loaded, all columns stringified, pretty printed json) and as one
+keyset page of json_api.finished_jobs_page() with compact json. Also walks
+all pages once to check they return every job exactly once.
+
+Usage:
+    python3 test/benchmark/bench_json_jobs.py [--sizes 10000,100000] [--page 100]
+
+Exits with 1 if the paged answer is not smaller and faster.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import sqlalchemy
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from arm.database import db  # noqa: E402
+from arm.models.config import Config  # noqa: E402
+from arm.models.job import Job, JobState  # noqa: E402
+from arm.ui import json_api  # noqa: E402
+
+
+def fill(engine, jobs):
+    """Successful jobs with a config each"""
+    with engine.begin() as connection:
+        connection.execute(Job.__table__.insert(), [{
+            "job_id": job_id, "status": JobState.SUCCESS.value, "devpath": "/dev/sr0",
+            "label": f"DISC_{job_id}", "crc_id": f"{job_id:016x}", "title": f"Title {job_id}",
+            "title_manual": None, "year": "2001", "video_type": "movie", "disctype": "dvd",
+            "hasnicetitle": True, "logfile": f"DISC_{job_id}.log", "poster_url": f"https://example.com/{job_id}.jpg",
+            "start_time": None, "job_length": "1:02:03", "stage": str(job_id), "imdb_id": f"tt{job_id:07d}",
+        } for job_id in range(1, jobs + 1)])
+        connection.execute(Config.__table__.insert(), [
+            {"job_id": job_id, "RIPMETHOD": "mkv", "MAINFEATURE": False, "MINLENGTH": "600", "MAXLENGTH": "99999"}
+            for job_id in range(1, jobs + 1)])
+
+
+def before(session):
+    """getsuccessful as ARM answered it before"""
+    job_results = {}
+    for i, job in enumerate(session.query(Job).filter_by(status=JobState.SUCCESS.value)):
+        job_results[i] = {'config': job.config.get_d()}
+        for key, value in job.get_d().items():
+            if key != "config":
+                job_results[i][str(key)] = str(value)
+    return json.dumps({"success": True, "mode": "success", "results": job_results}, indent=4, sort_keys=True)
+
+
+def after(session, page, before_id=None):
+    """One page of getsuccessful"""
+    job_results, next_before = json_api.finished_jobs_page(session, JobState.SUCCESS.value, before_id, page)
+    answer = json.dumps({"success": True, "mode": "success", "results": job_results, "next": next_before},
+                        separators=(",", ":"))
+    return answer, job_results, next_before
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def run(jobs, page, tmp):
+    engine = sqlalchemy.create_engine(f"sqlite:///{os.path.join(tmp, f'arm_{jobs}.db')}")
+    db.metadata.create_all(engine, tables=[Job.__table__, Config.__table__])
+    fill(engine, jobs)
+    with Session(engine) as session:
+        before_ms, before_json = timed(before, session)
+    with Session(engine) as session:
+        after_ms, (after_json, _, next_before) = timed(after, session, page)
+        # walk every page, the last one is as cheap as the first
+        seen, last_ms = set(), 0
+        next_before = None
+        while True:
+            last_ms, (_, job_results, next_before) = timed(after, session, page, next_before)
+            seen.update(job["job_id"] for job in job_results.values())
+            if next_before is None:
+                break
+    engine.dispose()
+    if len(seen) != jobs:
+        print(f"pages returned {len(seen)} of {jobs} jobs")
+        return False
+    print(f"{jobs:>7} jobs  before {before_ms:>9.1f}ms {len(before_json) / 1e6:>8.2f}MB   "
+          f"page of {page}: first {after_ms:>6.2f}ms last {last_ms:>6.2f}ms {len(after_json) / 1e3:>7.1f}kB")
+    return after_ms < before_ms and len(after_json) < len(before_json)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="10000,100000", help="comma separated numbers of jobs")
+    parser.add_argument("--page", type=int, default=json_api.JOBS_PAGE_SIZE, help="jobs per page")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    with tempfile.TemporaryDirectory() as tmp:
+        results = [run(int(jobs), args.page, tmp) for jobs in args.sizes.split(",")]
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
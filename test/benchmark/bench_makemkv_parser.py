@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Benchmark the MakeMKV robot output parser
+
+Generates the `makemkvcon --robot` output of an info scan and of a mkv rip of
+a made up Blu-ray, replays it through `arm.ripper.makemkv.parse_line` and
+reports the throughput in lines per second and the peak memory held by the
+parsed messages. Recorded transcripts (one output line per line) can be given
+instead.
+
+Usage:
+    python3 test/benchmark/bench_makemkv_parser.py [--repeat 20] [--min-lines-per-sec 0] [transcript ...]
+
+Exits with 1 if a transcript contains lines the parser rejects or if the
+throughput drops below `--min-lines-per-sec`.
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from arm.ripper.makemkv import MakeMkvParserError, parse_line  # noqa: E402
+
+TITLES = 48
+"""Titles of the generated Blu-ray"""
+SEED = 1
+LABEL = "LONG_MOVIE_TITLE"
+NAME = "Long Movie Title"
+AUDIO = (("eng", "English", "A_TRUEHD", "TrueHD", "Dolby TrueHD", "7.1", 8),
+         ("eng", "English", "A_AC3", "DD", "Dolby Digital", "5.1(side)", 6),
+         ("fra", "French", "A_DTS", "DTS", "DTS", "5.1(side)", 6),
+         ("deu", "German", "A_AC3", "DD", "Dolby Digital", "5.1(side)", 6))
+SUBTITLES = (("eng", "English"), ("fra", "French"), ("deu", "German"), ("spa", "Spanish"), ("ita", "Italian"))
+
+
+def msg(code, text, fmt, *params):
+    return ",".join([f"MSG:{code},0,{len(params)}", f'"{text}"', f'"{fmt}"'] + [f'"{param}"' for param in params])
+
+
+def progress(rng, maximum=65536, step=600):
+    """PRGV lines of one progress bar, in uneven steps of up to step like makemkvcon sends them"""
+    lines = []
+    current = 0
+    while current < maximum:
+        lines.append(f"PRGV:{current},{current},{maximum}")
+        current += rng.randint(1, step)
+    return lines + [f"PRGV:{maximum},{maximum},{maximum}"]
+
+
+def header(rng, drives):
+    """Start of every makemkvcon run, the drive list and opening the disc"""
+    lines = [msg(1005, "MakeMKV v1.17.7 linux(x64-release) started", "%1 started",
+                 "MakeMKV v1.17.7 linux(x64-release)")]
+    lines += [f'DRV:{index},{state},999,{flags},"{description}","{label}","{path}"'
+              for index, (state, flags, description, label, path) in enumerate(drives)]
+    lines += [f'DRV:{index},256,999,0,"","",""' for index in range(len(drives), 16)]
+    lines += [msg(3007, "Using direct disc access mode", "Using direct disc access mode"),
+              'PRGT:5018,0,"Scanning CD-ROM devices"', 'PRGC:5018,0,"Scanning CD-ROM devices"']
+    lines += progress(rng, 0)
+    return lines + ['PRGT:5010,0,"Opening Blu-ray disc"', 'PRGC:5010,0,"Opening Blu-ray disc"']
+
+
+def make_titles(rng):
+    """Titles of a made up Blu-ray: chapters, seconds, bytes, segments, audio and subtitle tracks"""
+    titles = []
+    for index in range(TITLES):
+        seconds = rng.choice([rng.randint(120, 900), rng.randint(5400, 8400)])
+        titles.append({"index": index, "seconds": seconds, "chapters": max(2, seconds // 300),
+                       "bytes": seconds * rng.randint(4000, 4200) * 1000,
+                       "segments": ",".join(map(str, sorted(rng.sample(range(10), rng.randint(1, 4))))),
+                       "audio": AUDIO[:rng.randint(1, len(AUDIO))],
+                       "subtitles": rng.sample(SUBTITLES, rng.randint(0, len(SUBTITLES)))})
+    return titles
+
+
+def title_info(title):
+    index = title["index"]
+    seconds = title["seconds"]
+    size = f"{title['bytes'] / 1e9:.1f} GB"
+    lines = [f'TINFO:{index},{code},{flags},"{value}"' for code, flags, value in (
+        (2, 0, NAME), (8, 0, title["chapters"]),
+        (9, 0, f"{seconds // 3600}:{seconds % 3600 // 60:02}:{seconds % 60:02}"),
+        (10, 0, size), (11, 0, title["bytes"]), (16, 0, f"{800 + index:05}.mpls"),
+        (25, 0, title["segments"].count(",") + 1), (26, 0, title["segments"]),
+        (27, 0, f"Long_Movie_Title_t{index:02}.mkv"),
+        (28, 0, "eng"), (29, 0, "English"), (30, 0, f"{NAME} - {title['chapters']} chapter(s) , {size}"),
+        (31, 6120, "<b>Title information</b><br>"), (33, 0, "0"))]
+    streams = [((1, 6201, "Video"), (5, 0, "V_MPEG4/ISO/AVC"), (6, 0, "Mpeg4"), (7, 0, "Mpeg4 AVC High@L4.1"),
+                (19, 0, "1920x1080"), (20, 0, "16:9"), (21, 0, "23.976 (24000/1001)"), (22, 0, "0"),
+                (30, 0, "Mpeg4 AVC High@L4.1"), (31, 6121, "<b>Track information</b><br>"), (33, 0, "0"),
+                (38, 0, ""), (42, 5088, "( Lossless conversion )"))]
+    streams += [((1, 6202, "Audio"), (2, 5091, f"Surround {layout}"), (3, 0, code), (4, 0, language),
+                 (5, 0, codec_id), (6, 0, codec_short), (7, 0, codec_long), (14, 0, channels), (17, 0, "48000"),
+                 (22, 0, "0"), (30, 0, f"{codec_long} Surround {layout} {language}"),
+                 (31, 6121, "<b>Track information</b><br>"), (33, 0, "90"), (38, 0, ""), (39, 0, "Default"),
+                 (40, 0, layout), (42, 5088, "( Lossless conversion )"))
+                for code, language, codec_id, codec_short, codec_long, layout, channels in title["audio"]]
+    streams += [((1, 6203, "Subtitles"), (3, 0, code), (4, 0, language), (5, 0, "S_HDMV/PGS"), (6, 0, ""),
+                 (7, 0, "HDMV PGS Subtitles"), (22, 0, "0"), (30, 0, language),
+                 (31, 6122, "<b>Track information</b><br>"), (33, 0, "90"), (38, 0, ""),
+                 (42, 5088, "( Lossless conversion )"))
+                for code, language in title["subtitles"]]
+    for stream, attributes in enumerate(streams):
+        lines += [f'SINFO:{index},{stream},{code},{flags},"{value}"' for code, flags, value in attributes]
+    return lines
+
+
+def info_transcript(seed=SEED):
+    """Output of `makemkvcon --robot info` for the made up Blu-ray"""
+    rng = random.Random(seed)
+    titles = make_titles(rng)
+    lines = header(rng, [(2, 12, "BD-RE HL-DT-ST BD-RE  WH16NS60 1.02 KLBL1K08523", LABEL, "/dev/sr0"),
+                         (0, 0, "DVD+R-DL ASUS DRW-24F1ST   b 1.00 KZWF4LA2401", "", "/dev/sr1")])
+    lines += [msg(3338, "Downloading latest SDF to /home/arm/.MakeMKV ...", "Downloading latest %1 to %2 ...",
+                  "SDF", "/home/arm/.MakeMKV"),
+              msg(3344, "Using LibreDrive mode (v06.3 id=1A4C9E5D2A7B)", "Using LibreDrive mode (v%1 id=%2)",
+                  "06.3 id=1A4C9E5D2A7B"),
+              msg(3018, "Using Java runtime from /usr/lib/jvm/java-17-openjdk-amd64", "Using Java runtime from %1",
+                  "/usr/lib/jvm/java-17-openjdk-amd64")]
+    lines += progress(rng)
+    for title in titles:
+        playlist = f"{800 + title['index']:05}.mpls"
+        lines.append(msg(3307, f"File {playlist} was added as title #{title['index']}",
+                         "File %1 was added as title #%2", playlist, title["index"]))
+        if rng.random() < 0.15:
+            short = f"{900 + title['index']:05}.mpls"
+            seconds = rng.randint(1, 119)
+            lines.append(msg(3025, f"Title #{short} has length of {seconds} seconds which is less than minimum title "
+                                   "length of 120 seconds and was therefore skipped",
+                             "Title #%1 has length of %2 seconds which is less than minimum title length of %3 seconds "
+                             "and was therefore skipped", short, seconds, 120))
+    lines += [msg(5011, "Operation successfully completed", "Operation successfully completed"), f"TCOUNT:{TITLES}"]
+    lines += [f'CINFO:{code},{flags},"{value}"' for code, flags, value in (
+        (1, 6209, "Blu-ray disc"), (2, 0, NAME), (28, 0, "eng"), (29, 0, "English"), (30, 0, NAME),
+        (31, 6119, "<b>Source information</b><br>"), (32, 0, LABEL), (33, 0, "0"))]
+    for title in titles:
+        lines += title_info(title)
+    return lines
+
+
+def mkv_transcript(seed=SEED):
+    """Output of `makemkvcon --robot mkv` of the main feature of the made up Blu-ray, with one read error"""
+    rng = random.Random(seed)
+    lines = header(rng, [(2, 12, "BD-RE HL-DT-ST BD-RE  WH16NS60 1.02 KLBL1K08523", LABEL, "/dev/sr0")])
+    lines += [msg(3307, "File 00800.mpls was added as title #0", "File %1 was added as title #%2", "00800.mpls", 0),
+              msg(5085, "Loaded content hash table, will verify integrity of M2TS files.",
+                  "Loaded content hash table, will verify integrity of M2TS files."),
+              msg(5014, f"Saving 1 titles into directory file:///home/arm/media/raw/{NAME}",
+                  "Saving %1 titles into directory %2", 1, f"file:///home/arm/media/raw/{NAME}"),
+              'PRGT:5017,0,"Saving to MKV file"', 'PRGC:5017,0,"Saving to MKV file"',
+              'PRGC:5019,0,"Analyzing seamless segments"']
+    # A rip reports progress in much smaller steps than a scan
+    rip = progress(rng, step=56)
+    middle = len(rip) // 2
+    error = ("Scsi error - MEDIUM ERROR:L-EC UNCORRECTABLE ERROR", "/BDMV/STREAM/00055.m2ts", "1048576")
+    lines += rip[:middle] + [msg(2003, "Error '{}' occurred while reading '{}' at offset '{}'".format(*error),
+                                 "Error '%1' occurred while reading '%2' at offset '%3'", *error)] + rip[middle:]
+    return lines + [msg(5011, "Operation successfully completed", "Operation successfully completed"),
+                    msg(5036, "Copy complete. 1 titles saved.", "Copy complete. %1 titles saved.", 1)]
+
+
+def transcripts(paths):
+    """(name, lines) of the recorded transcripts in paths or of the generated ones"""
+    for path in paths:
+        with open(path, encoding="utf-8") as transcript:
+            yield os.path.basename(path), transcript.read().splitlines()
+    if not paths:
+        yield "generated info bluray", info_transcript()
+        yield "generated mkv bluray", mkv_transcript()
+
+
+def replay(lines):
+    """Parse all lines, returns the parsed messages and the number of rejected lines"""
+    messages = []
+    rejected = 0
+    for line in lines:
+        try:
+            messages.append(parse_line(line))
+        except MakeMkvParserError:
+            rejected += 1
+    return messages, rejected
+
+
+def measure(lines, repeat):
+    """
+    Time `repeat` replays of a transcript and trace the memory of one extra replay
+
+    Returns:
+        (lines per second, peak memory in bytes, rejected lines)
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        _, rejected = replay(lines)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    messages, _ = replay(lines)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del messages
+    return len(lines) * repeat / elapsed, peak, rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("transcripts", nargs="*",
+                        help="recorded makemkvcon --robot transcripts, defaults to generated ones")
+    parser.add_argument("--repeat", type=int, default=20, help="replays per transcript for the timing")
+    parser.add_argument("--min-lines-per-sec", type=float, default=0,
+                        help="fail if any transcript is parsed slower than this")
+    args = parser.parse_args()
+
+    # The output checker logs read errors etc., keep that out of the timing
+    logging.disable(logging.CRITICAL)
+    failed = False
+    print(f"{'transcript':<32} {'lines':>8} {'lines/sec':>12} {'peak KiB':>10} {'rejected':>9}")
+    for name, lines in transcripts(args.transcripts):
+        rate, peak, rejected = measure(lines, args.repeat)
+        print(f"{name:<32} {len(lines):>8} {rate:>12,.0f} {peak / 1024:>10,.1f} {rejected:>9}")
+        if rejected or rate < args.min_lines_per_sec:
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Benchmark the hot UI and ripper queries with and without the query indexes
+
+Fills a scratch SQLite database with a synthetic history of --jobs jobs, their
+tracks and config, notifications and drives, then runs the queries behind the
+/json modes, /history and /database, the settings page counts and the ripper
+checks. Every query is timed without the indexes of migration 3a6a555ccd17 and
+again with them, and its query plan is shown.
+
+Usage:
+    python3 test/benchmark/bench_query_indexes.py [--jobs 50000] [--repeat 5] [--plans]
+
+Exits with 1 if the queries are slower with the indexes.
+"""
+import argparse
+import glob
+import importlib.util
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import sqlalchemy
+from sqlalchemy import func, select
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+sys.path.insert(0, ROOT)
+from arm.database import db  # noqa: E402
+from arm.models.config import Config  # noqa: E402
+from arm.models.job import Job, JobState  # noqa: E402
+from arm.models.notifications import Notifications  # noqa: E402
+from arm.models.system_drives import SystemDrives  # noqa: E402
+from arm.models.track import Track  # noqa: E402
+
+DEVPATHS = ("sr0", "sr1", "sr2", "sr3")
+STATUSES = [JobState.SUCCESS.value] * 90 + [JobState.FAILURE.value] * 9 + [JobState.TRANSCODE_ACTIVE.value]
+
+
+def load_indexes():
+    """INDEXES of the migration, the single place they are listed"""
+    path, = glob.glob(os.path.join(ROOT, "arm", "migrations", "versions", "3a6a555ccd17_*.py"))
+    spec = importlib.util.spec_from_file_location("add_query_indexes", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.INDEXES
+
+
+def fill(connection, jobs, rng):
+    """Synthetic history, a few jobs are still running"""
+    connection.execute(Job.__table__.insert(), [{
+        "job_id": job_id, "status": rng.choice(STATUSES), "devpath": f"/dev/{rng.choice(DEVPATHS)}",
+        "label": f"DISC_{rng.randrange(jobs // 2)}", "crc_id": f"{rng.getrandbits(64):016x}",
+        "title": f"Title {job_id}", "year": str(rng.randint(1950, 2025)),
+        "video_type": rng.choice(("movie", "movie", "series", "unknown")),
+        "disctype": rng.choice(("dvd", "dvd", "bluray", "music", "data")), "hasnicetitle": True,
+        "logfile": f"DISC_{job_id}.log", "poster_url": f"https://example.com/{job_id}.jpg",
+    } for job_id in range(1, jobs + 1)])
+    connection.execute(Config.__table__.insert(), [
+        {"job_id": job_id, "RIPMETHOD": "mkv", "MINLENGTH": "600"} for job_id in range(1, jobs + 1)])
+    connection.execute(Track.__table__.insert(), [
+        {"job_id": job_id, "track_number": str(t_no), "length": 600 + t_no, "filename": f"t{t_no:02}.mkv"}
+        for job_id in range(1, jobs + 1) for t_no in range(4)])
+    connection.execute(Notifications.__table__.insert(), [
+        {"title": "ARM notification", "message": f"Job {n}", "seen": n > 1000, "cleared": n > 1010}
+        for n in range(1, jobs // 10)])
+    connection.execute(SystemDrives.__table__.insert(), [
+        {"mount": f"/dev/{name}", "serial_id": f"MAKER{name}", "stale": False} for name in DEVPATHS])
+
+
+def queries(jobs):
+    """(name, statement) of the hot queries, as the routes build them"""
+    job_id = jobs // 2
+    return [
+        ("json joblist", select(Job).where(~Job.finished)),
+        ("json getsuccessful", select(Job).where(Job.status == JobState.SUCCESS.value)),
+        ("json getfailed", select(Job).where(Job.status == JobState.FAILURE.value)),
+        ("json config of a job", select(Config).where(Config.job_id == job_id)),
+        ("history/database page", select(Job).order_by(Job.job_id.desc()).limit(200).offset(200)),
+        ("history/database count", select(func.count()).select_from(Job)),
+        ("job tracks", select(Track).where(Track.job_id == job_id)),
+        ("settings failed rips", select(func.count()).select_from(Job).where(Job.status == "fail")),
+        ("settings movies", select(func.count()).select_from(Job).where(Job.video_type == "movie")),
+        ("settings series", select(func.count()).select_from(Job).where(Job.video_type == "series")),
+        ("settings cds", select(func.count()).select_from(Job).where(Job.disctype == "music")),
+        ("notification count", select(func.count()).select_from(Notifications)
+         .where(Notifications.cleared.is_(False))),
+        ("notifications unseen", select(Notifications).where(Notifications.seen.is_(False))),
+        ("drive by mount", select(SystemDrives).where(SystemDrives.mount == "/dev/sr1")),
+        ("drive by serial", select(SystemDrives).where(SystemDrives.serial_id == "MAKERsr1")),
+        ("ripper duplicate run", select(Job).where(~Job.finished, Job.devpath == "/dev/sr1")),
+        ("ripper label dupe", select(Job.job_id, Job.title).where(Job.label == "DISC_42",
+                                                                  Job.status == JobState.SUCCESS.value).limit(2)),
+        ("ripper crc lookup", select(Job.job_id).where(Job.crc_id == "0123456789abcdef")),
+    ]
+
+
+def plan(connection, statement):
+    """Query plan of a statement, one line"""
+    sql = str(statement.compile(connection, compile_kwargs={"literal_binds": True}))
+    return "; ".join(row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}"))
+
+
+def measure(connection, statements, repeat):
+    """Median time [ms] and plan of every statement"""
+    results = {}
+    for name, statement in statements:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            connection.execute(statement).fetchall()
+            times.append((time.perf_counter() - start) * 1000)
+        results[name] = (statistics.median(times), plan(connection, statement))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--jobs", type=int, default=50000, help="jobs in the synthetic history")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of every query, the median is shown")
+    parser.add_argument("--plans", action="store_true", help="show the query plans without the indexes too")
+    args = parser.parse_args()
+
+    indexes = load_indexes()
+    statements = queries(args.jobs)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = sqlalchemy.create_engine(f"sqlite:///{os.path.join(tmp, 'arm.db')}")
+        db.metadata.create_all(engine, tables=[Job.__table__, Config.__table__, Track.__table__,
+                                               Notifications.__table__, SystemDrives.__table__])
+        with engine.begin() as connection:
+            start = time.perf_counter()
+            fill(connection, args.jobs, random.Random(42))
+            print(f"filled {args.jobs} jobs in {time.perf_counter() - start:.1f}s")
+            for name, _, _ in indexes:
+                connection.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+            connection.exec_driver_sql("ANALYZE")
+        with engine.connect() as connection:
+            before = measure(connection, statements, args.repeat)
+        with engine.begin() as connection:
+            for name, table, columns in indexes:
+                connection.exec_driver_sql(f"CREATE INDEX {name} ON {table} ({', '.join(columns)})")
+            connection.exec_driver_sql("ANALYZE")
+        with engine.connect() as connection:
+            after = measure(connection, statements, args.repeat)
+        engine.dispose()
+
+    print(f"{'query':<24} {'before':>10} {'after':>10} {'speedup':>8}  plan with indexes")
+    for name, _ in statements:
+        (before_ms, before_plan), (after_ms, after_plan) = before[name], after[name]
+        print(f"{name:<24} {before_ms:>8.2f}ms {after_ms:>8.2f}ms {before_ms / after_ms:>7.1f}x  {after_plan}")
+        if args.plans:
+            print(f"{'':<55}without: {before_plan}")
+    total_before = sum(ms for ms, _ in before.values())
+    total_after = sum(ms for ms, _ in after.values())
+    print(f"{'total':<24} {total_before:>8.2f}ms {total_after:>8.2f}ms {total_before / total_after:>7.1f}x")
+    return 0 if total_after < total_before else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark per-row and bulk Track ingestion
+
+Writes the tracks of a synthetic disc into a scratch SQLite database twice:
+once per row as `utils.put_track` did before (one add and one commit per
+track) and once with `utils.TrackBatch` (one insert and one commit for all
+tracks). Reports the tracks per second and the speedup.
+
+Usage:
+    python3 test/benchmark/bench_track_ingest.py [--tracks 1000] [--min-speedup 1]
+
+Exits with 1 if the bulk ingestion is not at least `--min-speedup` times faster.
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import sqlalchemy
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from arm.ripper import utils  # noqa: E402
+from arm.models.job import Job  # noqa: E402
+from arm.models.track import Track  # noqa: E402
+
+JOB = SimpleNamespace(job_id=1, title="Benchmark Disc", config=SimpleNamespace(MINLENGTH="600"))
+
+
+def synthetic_disc(count):
+    """Track arguments of put_track for a disc with count titles"""
+    return [(str(t_no), 60 + t_no * 7 % 7200, "16:9", "23.976", t_no == 0, "MakeMKV", f"title_t{t_no:02}.mkv")
+            for t_no in range(count)]
+
+
+def per_row(session, tracks):
+    """One add and one commit per track"""
+    for t_no, seconds, aspect, fps, mainfeature, source, filename in tracks:
+        track = Track(JOB.job_id, t_no, seconds, aspect, fps, mainfeature, source, JOB.title, filename)
+        track.ripped = seconds > int(JOB.config.MINLENGTH)
+        session.add(track)
+        session.commit()
+
+
+def bulk(_session, tracks):
+    """TrackBatch, one insert and one commit"""
+    with utils.TrackBatch(JOB) as batch:
+        for track in tracks:
+            batch.put(*track)
+
+
+def measure(ingest, tracks, path):
+    """Ingest the tracks into a new database at path, returns (seconds, rows written)"""
+    engine = sqlalchemy.create_engine(f"sqlite:///{path}")
+    utils.db.metadata.create_all(engine, tables=[Job.__table__, Track.__table__])
+    with Session(engine) as session, patch.object(utils.db, "session", session):
+        start = time.perf_counter()
+        ingest(session, tracks)
+        elapsed = time.perf_counter() - start
+        rows = session.query(Track).count()
+    engine.dispose()
+    return elapsed, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tracks", type=int, default=1000, help="titles on the synthetic disc")
+    parser.add_argument("--min-speedup", type=float, default=1, help="fail if bulk is not this many times faster")
+    args = parser.parse_args()
+
+    # put() logs every track, keep that out of the timing
+    logging.disable(logging.CRITICAL)
+    tracks = synthetic_disc(args.tracks)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, ingest in (("per-row", per_row), ("bulk", bulk)):
+            elapsed, rows = measure(ingest, tracks, os.path.join(tmp, f"{name}.db"))
+            if rows != len(tracks):
+                print(f"{name}: wrote {rows} of {len(tracks)} tracks")
+                return 1
+            results[name] = elapsed
+            print(f"{name:<8} {len(tracks):>6} tracks {elapsed:>8.3f}s {len(tracks) / elapsed:>12,.0f} tracks/sec")
+    speedup = results["per-row"] / results["bulk"]
+    print(f"speedup  {speedup:.1f}x")
+    return 0 if speedup >= args.min_speedup else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
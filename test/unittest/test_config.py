@@ -0,0 +1,83 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, '/opt/arm')
+import arm.config.config as cfg    # noqa: E402
+
+COMMENTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "arm", "ui", "comments.json")
+
+
+class TestConfigCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        paths = {name: os.path.join(self.tmp.name, file) for name, file in (
+            ("arm_config_path", "arm.yaml"), ("arm_template_path", "template.yaml"),
+            ("abcde_config_path", "abcde.conf"), ("apprise_config_path", "apprise.yaml"),
+            ("CONFIG_CACHE", ".config_cache.json"))}
+        for name, path in paths.items():
+            patcher = patch.object(cfg, name, path)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch.object(cfg, "comments_path", COMMENTS)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.write("arm.yaml", "RAW_PATH: /raw\nLOGLEVEL: INFO\n")
+        self.write("template.yaml", "RAW_PATH: /home/arm/media/raw\nLOGLEVEL: INFO\n")
+        self.write("abcde.conf", "OUTPUTTYPE=flac\n")
+        self.write("apprise.yaml", "KODI_HOST: ''\n")
+        self.parsed = []
+        load_config = cfg._load_config
+        patcher = patch.object(cfg, "_load_config", side_effect=lambda fp: self.parsed.append(fp) or load_config(fp))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write(self, name, content):
+        with open(os.path.join(self.tmp.name, name), "w") as config_file:
+            config_file.write(content)
+
+    def test_snapshot(self):
+        """
+        CHECK unchanged files are read from the snapshot, changed files are parsed again
+        """
+        arm_config, abcde_config, apprise_config = cfg.load()
+        self.assertEqual(arm_config, {"RAW_PATH": "/raw", "LOGLEVEL": "INFO"})
+        self.assertEqual((abcde_config, apprise_config), ("OUTPUTTYPE=flac\n", {"KODI_HOST": ""}))
+        self.assertEqual(len(self.parsed), 3)
+
+        self.parsed.clear()
+        self.assertEqual(cfg.load(), (arm_config, abcde_config, apprise_config))
+        self.assertEqual(self.parsed, [])
+
+        self.write("arm.yaml", "RAW_PATH: /raw\nLOGLEVEL: DEBUG\n")
+        self.assertEqual(cfg.load()[0]["LOGLEVEL"], "DEBUG")
+        self.assertEqual(self.parsed, [cfg.arm_config_path])
+
+    def test_migration(self):
+        """
+        CHECK a new template key is added to arm.yaml, the current values are kept
+        """
+        cfg.load()
+        self.write("template.yaml", "RAW_PATH: /home/arm/media/raw\nLOGLEVEL: INFO\nRIPPER_SOCKET: /tmp/arm.sock\n")
+        arm_config = cfg.load()[0]
+        self.assertEqual(arm_config, {"RAW_PATH": "/raw", "LOGLEVEL": "INFO", "RIPPER_SOCKET": "/tmp/arm.sock"})
+        with open(cfg.arm_config_path) as arm_yaml:
+            self.assertIn('RIPPER_SOCKET: "/tmp/arm.sock"', arm_yaml.read())
+
+    def test_reload(self):
+        """
+        CHECK reload updates arm_config in place
+        """
+        arm_config = cfg.arm_config
+        with patch.dict(cfg.arm_config, clear=True):
+            self.write("arm.yaml", "RAW_PATH: /new\nLOGLEVEL: INFO\n")
+            cfg.reload()
+            self.assertIs(cfg.arm_config, arm_config)
+            self.assertEqual(arm_config, {"RAW_PATH": "/new", "LOGLEVEL": "INFO"})
+
+
+if __name__ == '__main__':
+    unittest.main()
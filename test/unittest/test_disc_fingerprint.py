@@ -0,0 +1,105 @@
+import sys
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import sqlalchemy
+import sqlalchemy.orm
+
+sys.path.insert(0, '/opt/arm')
+from arm.database import db    # noqa: E402
+from arm.models.disc_fingerprint import DiscFingerprint    # noqa: E402
+from arm.models.job import Job, JobState    # noqa: E402
+from arm.ripper import utils    # noqa: E402
+
+
+class TestDiscFingerprint(unittest.TestCase):
+    def setUp(self):
+        engine = sqlalchemy.create_engine("sqlite://")
+        db.metadata.create_all(engine, tables=[Job.__table__, DiscFingerprint.__table__])
+        # the ripper's session, also when the UI replaced db.session
+        session = sqlalchemy.orm.scoped_session(sqlalchemy.orm.sessionmaker(bind=engine))
+        self.addCleanup(session.remove)
+        for target, name, value in ((db, "session", session), (db.Model, "query", session.query_property())):
+            patcher = patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for name in ("parse_udev", "get_pid"):
+            patcher = patch.object(Job, name)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def job(self, label, crc_id=None, status=JobState.SUCCESS.value, title=None):
+        job = Job("/dev/sr0")
+        job.label, job.crc_id, job.disctype, job.status = label, crc_id, "dvd", status
+        job.title, job.year, job.hasnicetitle = title, "1999", title is not None
+        db.session.add(job)
+        db.session.commit()
+        return job
+
+    def test_record_success(self):
+        """
+        CHECK the fingerprint points to the last successful rip and counts the rips
+        """
+        first = self.job("MATRIX", "abc", title="The Matrix")
+        DiscFingerprint.record_success(first, "abc")
+        second = self.job("MATRIX", "abc", title="The Matrix")
+        DiscFingerprint.record_success(second, "abc")
+        DiscFingerprint.record_success(second)
+        db.session.commit()
+        row = DiscFingerprint.query.one()
+        self.assertEqual((row.job_id, row.rips), (second.job_id, 2))
+        self.assertEqual(first.fingerprint_id, row.fingerprint_id)
+        previous_rip = DiscFingerprint.previous_rip("abc")
+        self.assertEqual((previous_rip.job_id, previous_rip.title), (second.job_id, "The Matrix"))
+        self.assertIsNone(DiscFingerprint.previous_rip("abc", exclude_job_id=second.job_id))
+        self.assertIsNone(DiscFingerprint.previous_rip("other"))
+
+        # a later unidentified rip doesn't hide the identified one
+        third = self.job("MATRIX", "abc")
+        DiscFingerprint.record_success(third, "abc")
+        db.session.commit()
+        self.assertEqual(DiscFingerprint.previous_rip("abc").job_id, third.job_id)
+        self.assertEqual(DiscFingerprint.previous_rip("abc", identified=True).job_id, second.job_id)
+
+    def test_job_dupe_check(self):
+        """
+        CHECK a new job of a ripped disc takes over the title of the last rip and is linked to the disc
+        """
+        DiscFingerprint.record_success(self.job("MATRIX", "abc", title="The Matrix"), "abc")
+        db.session.commit()
+        job = self.job("MATRIX_DISC", "abc", status=JobState.IDLE.value)
+        with patch.object(utils, "database_updater") as database_updater:
+            self.assertTrue(utils.job_dupe_check(job))
+        self.assertEqual(database_updater.call_args[0][0]["title"], "The Matrix")
+        self.assertEqual(job.fingerprint_id, DiscFingerprint.query.one().fingerprint_id)
+
+        # without a fingerprint only a label matching a single rip counts
+        job = self.job("MATRIX", status=JobState.IDLE.value)
+        job.disctype = "data"
+        with patch.object(utils, "database_updater"):
+            self.assertTrue(utils.job_dupe_check(job))
+            self.job("MATRIX", title="The Matrix")
+            self.assertFalse(utils.job_dupe_check(job))
+
+    def test_job_dupe_check_unlinked(self):
+        """
+        CHECK a disc seen the first time is found by the label of a rip from before fingerprints were kept
+        """
+        old = self.job("AVATAR_BD", title="Avatar")
+        old.disctype = "bluray"
+        db.session.commit()
+        job = self.job("AVATAR_BD", status=JobState.IDLE.value)
+        job.disctype, job.probe = "bluray", SimpleNamespace(fingerprint="bdmv1")
+        with patch.object(utils, "database_updater") as database_updater:
+            self.assertTrue(utils.job_dupe_check(job))
+            self.assertEqual(database_updater.call_args[0][0]["title"], "Avatar")
+
+            # a rip linked to another fingerprint is another disc with the same label
+            old.fingerprint_id = DiscFingerprint.link(self.job("OTHER"), "other").fingerprint_id
+            db.session.commit()
+            self.assertFalse(utils.job_dupe_check(job))
+
+
+if __name__ == '__main__':
+    unittest.main()
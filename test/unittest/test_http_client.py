@@ -0,0 +1,77 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from urllib3.exceptions import ConnectTimeoutError, ProtocolError
+
+sys.path.insert(0, '/opt/arm')
+from arm import http_client    # noqa: E402
+
+
+class TestHttpClient(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        patcher = patch.dict(http_client.cfg.arm_config, {"DBFILE": os.path.join(self.tmp.name, "arm.db")})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.dict(http_client.RATE_LIMITS, {"test": (2, 3)})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.waits = []
+        patcher = patch.object(http_client.time, "sleep", side_effect=self.waits.append)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reserve(self):
+        """
+        CHECK a bucket allows its burst, then one request per 1/rate seconds, and refills over time
+        """
+        state = None
+        waits = []
+        for _ in range(5):
+            state, wait = http_client._reserve(state, 100.0, 2, 3)
+            waits.append(wait)
+        self.assertEqual(waits, [0, 0, 0, 0.5, 1.0])
+        state, wait = http_client._reserve(state, 110.0, 2, 3)
+        self.assertEqual((state[0], wait), (2, 0))
+
+    def test_rate_limit_shared(self):
+        """
+        CHECK the bucket is kept in a file, so every process takes from the same bucket
+        """
+        with patch.object(http_client.time, "time", return_value=1000.0):
+            for _ in range(4):
+                http_client.rate_limit("test")
+            http_client.rate_limit("unlimited")
+        self.assertEqual(self.waits, [0.5])
+        with open(http_client._bucket_path("test")) as bucket_file:
+            self.assertEqual(bucket_file.read(), "-1.0 1000.0")
+
+    def test_request(self):
+        """
+        CHECK requests get the default timeouts, the session is reused and retries are jittered
+        """
+        session = http_client.session()
+        self.assertIs(session, http_client.session())
+        with patch.object(session, "request") as request:
+            http_client.get("https://example.com/", "test")
+            request.assert_called_once_with("GET", "https://example.com/", timeout=http_client.TIMEOUT)
+        retry = session.get_adapter("https://example.com/").max_retries
+        self.assertIsInstance(retry, http_client._JitterRetry)
+        # a POST that may have reached the server is not sent again
+        self.assertTrue(retry.is_retry("GET", 503))
+        self.assertFalse(retry.is_retry("POST", 503))
+        with self.assertRaises(ProtocolError):
+            retry.increment("POST", "/", error=ProtocolError("Connection aborted."))
+        self.assertEqual(retry.increment("POST", "/", error=ConnectTimeoutError()).total, http_client.RETRIES - 1)
+        for _ in range(3):
+            retry = retry.increment("GET", "/", error=ConnectionError())
+        for _ in range(20):
+            self.assertTrue(0 <= retry.get_backoff_time() <= http_client.BACKOFF * 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
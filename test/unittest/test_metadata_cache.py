@@ -0,0 +1,91 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, '/opt/arm')
+from arm import metadata_cache    # noqa: E402
+
+
+class TestMetadataCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        patcher = patch.dict(metadata_cache.cfg.arm_config, {
+            "METADATA_CACHE_PATH": os.path.join(self.tmp.name, "cache", "metadata.db"),
+            "METADATA_CACHE_DAYS": 30, "METADATA_CACHE_MISS_HOURS": 1, "METADATA_CACHE_MB": 1})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.fetched = []
+
+    def lookup(self, key, answer, status=metadata_cache.HIT):
+        def fetch():
+            self.fetched.append(key)
+            return answer
+        return metadata_cache.lookup(key, fetch, lambda _: status)
+
+    def test_normalize(self):
+        """
+        CHECK spellings of the same query share a key, other years and ids don't
+        """
+        key = metadata_cache.normalize("OMDB", "search", "Star+Wars", "1977")
+        self.assertEqual(key, metadata_cache.normalize("omdb", "search", " star_wars ", 1977))
+        self.assertEqual(key, metadata_cache.normalize("omdb", "search", "Star%20Wars", "(1977)"))
+        self.assertNotEqual(key, metadata_cache.normalize("omdb", "search", "Star Wars", "1978"))
+        self.assertEqual(metadata_cache.normalize("omdb", "search", "x", None, "None"),
+                         metadata_cache.normalize("omdb", "search", "x", "None", ""))
+
+    def test_lookup(self):
+        """
+        CHECK answers and misses are asked once, errors every time, counters add up
+        """
+        hit = metadata_cache.normalize("omdb", "search", "Serenity")
+        miss = metadata_cache.normalize("omdb", "search", "Sernity")
+        error = metadata_cache.normalize("omdb", "search", "Firefly")
+        for _ in range(3):
+            self.assertEqual(self.lookup(hit, {"Title": "Serenity"}), {"Title": "Serenity"})
+            self.assertEqual(self.lookup(miss, {"Response": "False"}, metadata_cache.MISS), {"Response": "False"})
+            self.lookup(error, {"Error": "Invalid API key!"}, None)
+        self.assertEqual(self.fetched, [hit, miss, error, error, error])
+        stats = metadata_cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"]), (4, 5, 2))
+
+        # misses expire first
+        with patch("time.time", return_value=metadata_cache.time.time() + 7200):
+            self.lookup(hit, {"Title": "Serenity"})
+            self.lookup(miss, {"Response": "False"}, metadata_cache.MISS)
+        self.assertEqual(self.fetched[5:], [miss])
+
+    def test_evict(self):
+        """
+        CHECK the least recently used entries are removed once the cache is bigger than METADATA_CACHE_MB
+        """
+        answer = {"Plot": "x" * 100 * 1024}
+        keys = [metadata_cache.normalize("tmdb", "find", item_id=f"tt{number}") for number in range(12)]
+        for key in keys[:9]:
+            self.lookup(key, answer)
+        # keep the first one in use
+        self.lookup(keys[0], answer)
+        for key in keys[9:]:
+            self.lookup(key, answer)
+        self.assertLessEqual(metadata_cache.stats()["bytes"], 1024 * 1024)
+        self.fetched.clear()
+        self.lookup(keys[0], answer)
+        self.lookup(keys[1], answer)
+        self.assertEqual(self.fetched, [keys[1]])
+
+    def test_disabled(self):
+        """
+        CHECK an empty METADATA_CACHE_PATH asks the provider every time
+        """
+        key = metadata_cache.normalize("arm", "crc64", item_id="abc")
+        with patch.dict(metadata_cache.cfg.arm_config, {"METADATA_CACHE_PATH": ""}):
+            self.lookup(key, {"success": True})
+            self.lookup(key, {"success": True})
+            self.assertIsNone(metadata_cache.stats())
+        self.assertEqual(self.fetched, [key, key])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, '/opt/arm')
+from arm.ripper import daemon, ripper_client    # noqa: E402
+
+
+def wait_for_file(path):
+    """Worker that runs until path exists"""
+    def worker(_devpath, _arm_log):
+        deadline = time.monotonic() + 10
+        while not os.path.exists(path) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        os._exit(0)
+    return worker
+
+
+class TestRipperDaemon(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.socket_path = os.path.join(self.tmp.name, "ripper.sock")
+        self.done = os.path.join(self.tmp.name, "done")
+        self.service = daemon.RipperDaemon(self.socket_path, logging.getLogger("test"), wait_for_file(self.done))
+        thread = threading.Thread(target=self.service.serve, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.service.stop)
+        deadline = time.monotonic() + 5
+        while not os.path.exists(self.socket_path) and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_duplicate_events(self):
+        """
+        CHECK a second event for a busy drive is ignored, other drives and later events start workers
+        """
+        started = ripper_client.request("sr0", self.socket_path)
+        self.assertTrue(started.startswith("started "))
+        self.assertEqual(ripper_client.request("sr0", self.socket_path), f"duplicate {started.split()[1]}")
+        self.assertTrue(ripper_client.request("sr1", self.socket_path).startswith("started "))
+        open(self.done, "w").close()
+        deadline = time.monotonic() + 5
+        while self.service.workers and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertTrue(ripper_client.request("sr0", self.socket_path).startswith("started "))
+
+    def test_drive_released(self):
+        """
+        CHECK a new disc in a drive whose worker is still transcoding gets a worker once the drive is released
+        """
+        started = ripper_client.request("sr0", self.socket_path)
+        with patch.object(daemon, "DEBOUNCE", 0), \
+                patch.object(daemon, "drive_has_job", side_effect=[True, False]) as drive_has_job:
+            self.assertEqual(ripper_client.request("sr0", self.socket_path), f"duplicate {started.split()[1]}")
+            second = ripper_client.request("sr0", self.socket_path)
+        self.assertTrue(second.startswith("started "))
+        self.assertNotEqual(second, started)
+        drive_has_job.assert_called_with("/dev/sr0")
+        self.assertEqual(sorted(devpath for devpath, _ in self.service.workers.values()), ["/dev/sr0", "/dev/sr0"])
+        open(self.done, "w").close()
+
+    def test_invalid_device(self):
+        """
+        CHECK device names are validated before anything is started
+        """
+        self.assertEqual(ripper_client.request("../sda", self.socket_path), "error invalid device name")
+        self.assertEqual(self.service.workers, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, '/opt/arm')
+import arm.config.config as cfg    # noqa: E402
+from arm.ripper import disc_info_cache    # noqa: E402
+
+MESSAGES = [["Titles", 1], ["TInfo", 9, 0, "1:52:33", 0], ["SInfo", 20, 0, "16:9", 0, 0]]
+
+
+class TestDiscInfoCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        config = {
+            "MAKEMKV_INFO_CACHE_PATH": self.tmp.name,
+            "MAKEMKV_INFO_CACHE_DAYS": 90,
+            "MAKEMKV_INFO_CACHE_MB": 50,
+        }
+        patcher = patch.dict(cfg.arm_config, config)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_save_load(self):
+        """
+        CHECK saved messages are loaded again for the same fingerprint only
+        """
+        disc_info_cache.save("bdmv:0123abcd", MESSAGES)
+        self.assertEqual(disc_info_cache.load("bdmv:0123abcd"), MESSAGES)
+        self.assertIsNone(disc_info_cache.load("0123abcd"))
+        self.assertIsNone(disc_info_cache.load(None))
+
+    def test_disabled(self):
+        """
+        CHECK an empty cache path disables the cache
+        """
+        with patch.dict(cfg.arm_config, {"MAKEMKV_INFO_CACHE_PATH": ""}):
+            disc_info_cache.save("1234", MESSAGES)
+            self.assertIsNone(disc_info_cache.load("1234"))
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_expired(self):
+        """
+        CHECK entries older than MAKEMKV_INFO_CACHE_DAYS are a cache miss and get removed
+        """
+        with patch("time.time", return_value=time.time() - 91 * 86400):
+            disc_info_cache.save("1234", MESSAGES)
+        self.assertIsNone(disc_info_cache.load("1234"))
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_evict_size(self):
+        """
+        CHECK the oldest entries are removed once the cache exceeds MAKEMKV_INFO_CACHE_MB
+        """
+        big = [["CInfo", 2, 0, "x" * 400 * 1024]]
+        with patch.dict(cfg.arm_config, {"MAKEMKV_INFO_CACHE_MB": 1}):
+            for index in range(3):
+                disc_info_cache.save(str(index), big)
+                path = os.path.join(self.tmp.name, f"{index}.json")
+                os.utime(path, (time.time() - 100 + index, time.time() - 100 + index))
+            disc_info_cache.save("3", big)
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ["2.json", "3.json"])
+
+    def test_bluray_fingerprint(self):
+        """
+        CHECK the BDMV hash is stable and follows playlist changes
+        """
+        playlist = os.path.join(self.tmp.name, "BDMV", "PLAYLIST")
+        os.makedirs(playlist)
+        with open(os.path.join(playlist, "00800.mpls"), "wb") as mpls:
+            mpls.write(b"MPLS0200")
+        first = disc_info_cache.bluray_fingerprint(self.tmp.name)
+        self.assertTrue(first.startswith(disc_info_cache.BDMV_PREFIX))
+        self.assertEqual(first, disc_info_cache.bluray_fingerprint(self.tmp.name))
+        with open(os.path.join(playlist, "00800.mpls"), "wb") as mpls:
+            mpls.write(b"MPLS0300")
+        self.assertNotEqual(first, disc_info_cache.bluray_fingerprint(self.tmp.name))
+        self.assertIsNone(disc_info_cache.bluray_fingerprint(playlist))
+
+
+if __name__ == '__main__':
+    unittest.main()
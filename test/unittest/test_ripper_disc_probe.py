@@ -0,0 +1,96 @@
+import os
+import struct
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+sys.path.insert(0, '/opt/arm')
+from arm.ripper import disc_probe    # noqa: E402
+
+
+class TestDiscProbe(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.commands = []
+        patcher = patch.object(disc_probe.subprocess, "run",
+                               side_effect=lambda cmd, **kwargs: self.commands.append(cmd[0])
+                               or SimpleNamespace(returncode=0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.dict(disc_probe.cfg.arm_config, {"RIP_POSTER": True})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write(self, name, content):
+        path = os.path.join(self.tmp.name, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as disc_file:
+            disc_file.write(content)
+
+    def dvd(self, titles):
+        """VIDEO_TS.IFO with the title search pointer table in sector 1"""
+        header = b"DVDVIDEO-VMG".ljust(0xC4, b"\0") + struct.pack(">I", 1)
+        self.write("VIDEO_TS/VIDEO_TS.IFO", header.ljust(disc_probe.DVD_SECTOR, b"\0") + struct.pack(">H", titles))
+
+    def job(self, disctype="dvd", label="MOVIE"):
+        return SimpleNamespace(devpath="/dev/sr0", mountpoint=self.tmp.name, disctype=disctype, label=label)
+
+    def test_dvd(self):
+        """
+        CHECK one mount finds the type, title count, crc64 and poster of a DVD, lsdvd is not needed
+        """
+        self.dvd(99)
+        self.write("JACKET_P/J00___5L.MP2", b"poster")
+        # an empty AUDIO_TS doesn't make it a data disc
+        os.makedirs(os.path.join(self.tmp.name, "AUDIO_TS"))
+        with patch.object(disc_probe.disc_info_cache, "disc_fingerprint", return_value="abc") as fingerprint:
+            probe = disc_probe.probe(self.job())
+        self.addCleanup(probe.discard)
+        self.assertEqual(self.commands, ["mount", "findmnt", "umount"])
+        self.assertEqual((probe.disctype, probe.title_count, probe.has_track_99), ("dvd", 99, True))
+        fingerprint.assert_called_once_with("dvd", self.tmp.name)
+        self.assertEqual(probe.fingerprint, "abc")
+        with open(probe.poster, "rb") as poster:
+            self.assertEqual(poster.read(), b"poster")
+        poster = probe.poster
+        probe.discard()
+        self.assertFalse(os.path.exists(poster))
+
+    def test_dvd_without_label(self):
+        """
+        CHECK lsdvd runs once for the label of a DVD without one
+        """
+        self.dvd(12)
+        output = "lsdvd = {\n  'title' : 'MOVIE_DISC',\n  'track' : [\n    {'ix' : 1},\n    {'ix' : 2},\n  ],\n}"
+        with patch.object(disc_probe, "arm_subprocess", return_value=output) as lsdvd:
+            probe = disc_probe.probe(self.job(label=None))
+        lsdvd.assert_called_once()
+        self.assertEqual((probe.label, probe.title_count), ("MOVIE_DISC", 2))
+
+    def test_dvd_label(self):
+        """
+        CHECK the label for the log file is read with lsdvd, without mounting the disc
+        """
+        output = "lsdvd = {\n  'title' : 'MOVIE_DISC',\n  'track' : [],\n}"
+        with patch.object(disc_probe, "arm_subprocess", return_value=output):
+            self.assertEqual(disc_probe.dvd_label("/dev/sr0"), "MOVIE_DISC")
+        with patch.object(disc_probe, "arm_subprocess", return_value=None):
+            self.assertIsNone(disc_probe.dvd_label("/dev/sr0"))
+        self.assertEqual(self.commands, [])
+
+    def test_bluray(self):
+        """
+        CHECK bdmt_eng.xml of a Blu-ray is read during the probe
+        """
+        self.write(disc_probe.BDMT_ENG, b"<disclib/>")
+        probe = disc_probe.probe(self.job("bluray"))
+        self.assertEqual((probe.disctype, probe.bdmt_eng), ("bluray", b"<disclib/>"))
+        self.assertTrue(probe.fingerprint.startswith("bdmv:"))
+        self.assertIsNone(probe.title_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,321 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, '/opt/arm')
+import arm.config.config as cfg    # noqa: E402
+from arm.ripper import handbrake    # noqa: E402
+
+TITLE_SET = {
+    "MainFeature": 2,
+    "TitleList": [
+        {"Index": 1, "Duration": {"Hours": 0, "Minutes": 1, "Seconds": 30, "Ticks": 8100000},
+         "FrameRate": {"Den": 1, "Num": 25},
+         "Geometry": {"Height": 576, "PAR": {"Den": 15, "Num": 16}, "Width": 720},
+         "AudioList": [{"Language": "English", "LanguageCode": "eng"}], "SubtitleList": []},
+        {"Index": 2, "Duration": {"Hours": 1, "Minutes": 58, "Seconds": 3, "Ticks": 637470000},
+         "FrameRate": {"Den": 1001, "Num": 24000},
+         "Geometry": {"Height": 1080, "PAR": {"Den": 1, "Num": 1}, "Width": 1920},
+         "AudioList": [{"Language": "English", "LanguageCode": "eng"}, {"Language": "Unknown", "LanguageCode": ""}],
+         "SubtitleList": [{"Language": "Deutsch", "LanguageCode": "deu"}]},
+    ],
+}
+
+
+class Tracks:
+    def __init__(self):
+        self.rows = []
+
+    def put(self, t_no, seconds, aspect, fps, mainfeature, source, filename="", audio=None, subtitles=None):
+        self.rows.append((t_no, seconds, aspect, fps, mainfeature, audio, subtitles))
+
+
+class TestHandBrakeScan(unittest.TestCase):
+    def test_parse_scan_json(self):
+        """
+        CHECK the titles of the json title set after the progress blocks are read
+        """
+        output = 'Version: {\n    "Name": "HandBrake"\n}\nProgress: {\n    "State": "SCANNING"\n}\n' \
+                 f'JSON Title Set: {json.dumps(TITLE_SET, indent=4)}\n'
+        tracks = Tracks()
+        self.assertEqual(handbrake.parse_scan_json(output, tracks), 2)
+        self.assertEqual(tracks.rows, [
+            (1, 90, "1.33", 25.0, False, "eng", ""),
+            (2, 7083, "1.78", 23.976, True, "eng,und", "deu"),
+        ])
+
+    def test_parse_scan_json_fallback(self):
+        """
+        CHECK scans without a readable title set are left to the text parser
+        """
+        for output in (None, "", "Unknown argument: --json\n", "JSON Title Set: {\n    \"TitleList\": [\n"):
+            tracks = Tracks()
+            self.assertIsNone(handbrake.parse_scan_json(output, tracks))
+            self.assertEqual(tracks.rows, [])
+
+    def test_parse_scan_text(self):
+        """
+        CHECK the text parser finds the same titles
+        """
+        lines = ["[19:02:12] scan: DVD has 2 title(s)",
+                 "+ title 1:", "  + duration: 00:01:30",
+                 "  + size: 720x576, pixel aspect: 16/15, display aspect: 1.33, 25.000 fps",
+                 "+ title 2:", "  + Main Feature", "  + duration: 01:58:03",
+                 "  + size: 1920x1080, pixel aspect: 1/1, display aspect: 1.78, 23.976 fps"]
+        tracks = Tracks()
+        self.assertEqual(handbrake.parse_scan_text(lines, tracks), 2)
+        self.assertEqual([row[:5] for row in tracks.rows], [
+            ("1", 90, "1.33", "25.000", False),
+            ("2", 7083, "1.78", "23.976", True),
+        ])
+
+
+FAKE_HANDBRAKE = """import json, sys, time
+print("HandBrake 1.6.1 (2023010900) - Linux x86_64", file=sys.stderr, flush=True)
+print("Version: " + json.dumps({"VersionString": "1.6.1"}, indent=4), flush=True)
+for done in (0.25, 0.5):
+    print("Progress: " + json.dumps({"State": "WORKING", "Working": {
+        "ETASeconds": 60, "Pass": 1, "PassCount": 1, "Progress": done, "Rate": 123.45}}, indent=4), flush=True)
+print("Progress: " + json.dumps({"State": "MUXING", "Muxing": {"Progress": 0.0}}), flush=True)
+print("ERROR: encode failed", file=sys.stderr, flush=True)
+time.sleep(float(sys.argv[-2]))
+sys.exit(int(sys.argv[-3]) if len(sys.argv) > 3 else 3)
+"""
+
+FAKE_HANDBRAKE_QUEUE = """import json, os, sys
+args = sys.argv[1:-1]
+with open(os.environ["HB_CALLS"], "a") as calls:
+    calls.write(json.dumps(args) + "\\n")
+if "--queue-import-file" in args:
+    with open(args[args.index("--queue-import-file") + 1]) as queue:
+        jobs = [item["Job"] for item in json.load(queue)]
+    if os.environ.get("HB_QUEUE_FAIL"):
+        sys.exit(2)
+else:
+    jobs = [{"Source": {"Title": int(args[args.index("-t") + 1]), "Range": {"Type": "chapter", "End": 9}},
+             "Destination": {"File": args[args.index("-o") + 1], "ChapterList": []}}]
+    print("JSON Job:")
+    print(json.dumps(jobs[0], indent=4), flush=True)
+for sequence, job in enumerate(jobs, 1):
+    print("Progress: " + json.dumps({"State": "WORKING", "Working": {"Progress": 0.5, "SequenceID": sequence}}))
+    with open(job["Destination"]["File"], "w") as output:
+        output.write(json.dumps(job))
+"""
+
+
+class TrackQuery:
+    def __init__(self, rows):
+        self.rows = list(rows)
+
+    def filter_by(self, filename):
+        return [track for track in self.rows if track.filename == filename]
+
+
+class Reporter:
+    def __init__(self, fail=False):
+        self.updates = []
+        self.fail = fail
+
+    def update(self, **fields):
+        if self.fail:
+            raise RuntimeError("reporter failed")
+        self.updates.append(fields)
+
+    def write(self):
+        pass
+
+
+class TestHandBrakeRun(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        script = os.path.join(tmp.name, "fake_handbrake.py")
+        with open(script, "w") as fake:
+            fake.write(FAKE_HANDBRAKE)
+        self.logfile = os.path.join(tmp.name, "job.log")
+        patcher = patch.dict(cfg.arm_config, {"HANDBRAKE_CLI": f"{sys.executable} {script}"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_run(self):
+        """
+        CHECK progress is published from the json blocks, the log is written and the exit status captured
+        """
+        reporter = Reporter()
+        result = handbrake.run(["0"], self.logfile, reporter)
+        self.assertEqual(result.returncode, 3)
+        self.assertEqual(result.args[-2:], ["0", "--json"])
+        self.assertIn("ERROR: encode failed", result.stderr)
+        self.assertEqual(reporter.updates, [
+            {"task": "Encoding", "percent": 25.0, "eta": 60, "fps": 123.5},
+            {"task": "Encoding", "percent": 50.0, "eta": 60, "fps": 123.5},
+            {"task": "Muxing", "percent": 0.0},
+        ])
+        with open(self.logfile) as log:
+            self.assertIn("HandBrake 1.6.1", log.read())
+
+    def test_run_interrupted(self):
+        """
+        CHECK HandBrake is stopped when the caller fails
+        """
+        start = time.monotonic()
+        with self.assertRaises(RuntimeError):
+            handbrake.run(["30"], self.logfile, Reporter(fail=True))
+        self.assertLess(time.monotonic() - start, 10)
+        self.assertEqual(handbrake._running, set())
+
+    def test_pool(self):
+        """
+        CHECK the files are transcoded in parallel and every result is collected
+        """
+        reporter = Reporter()
+        job = SimpleNamespace(job_id=1)
+        commands = [(f"title_t0{number}.mkv", [str(code), "1"]) for number, code in enumerate((0, 0, 3, 0))]
+        start = time.monotonic()
+        with patch.dict(cfg.arm_config, {"MAX_CONCURRENT_TRANSCODES": 0}):
+            results = handbrake.TranscodePool(job, self.logfile, reporter, 4).run(commands)
+        self.assertLess(time.monotonic() - start, 3)
+        self.assertEqual(sorted((files, result.returncode) for files, result in results),
+                         [("title_t00.mkv", 0), ("title_t01.mkv", 0), ("title_t02.mkv", 3), ("title_t03.mkv", 0)])
+        self.assertEqual(reporter.updates[-1]["percent"], 100.0)
+        # the workers share the job log, line by line
+        with open(self.logfile) as log:
+            lines = log.read().splitlines()
+        self.assertEqual(sorted(set(lines)), ["ERROR: encode failed", "HandBrake 1.6.1 (2023010900) - Linux x86_64"])
+        self.assertEqual(len(lines), 2 * len(commands))
+
+    def pipeline(self, hb_args):
+        """A TranscodePipeline of a Blu-ray job, with 3 ripped files and counted transcode slots"""
+        srcpath = os.path.join(os.path.dirname(self.logfile), "raw")
+        os.makedirs(srcpath)
+        tracks = TrackQuery(SimpleNamespace(filename=f"title_t0{number}.mkv", status=None) for number in range(3))
+        for track in tracks.rows:
+            with open(os.path.join(srcpath, track.filename), "wb") as mkv:
+                mkv.write(b"0")
+        job = SimpleNamespace(job_id=1, disctype="bluray", tracks=tracks, pretty_table=str,
+                              config=SimpleNamespace(HB_ARGS_BD=hb_args, HB_PRESET_BD="Fast",
+                                                     LOGPATH=os.path.dirname(self.logfile)))
+        self.slots = []
+        for name, side_effect in (("acquire", lambda *args, **kwargs: self.slots.append(object()) or self.slots[-1]),
+                                  ("release", lambda slot: self.slots.remove(slot))):
+            patcher = patch.object(handbrake.resource_slots, name, MagicMock(side_effect=side_effect))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch.object(handbrake.utils, "database_updater")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return srcpath, job, handbrake.TranscodePipeline(os.path.dirname(self.logfile), self.logfile, job)
+
+    def test_pipeline(self):
+        """
+        CHECK submitted files are transcoded during the rip, finish() adds the rest, no slot is held in between
+        """
+        srcpath, job, pipeline = self.pipeline("0 0.1")
+        pipeline.submit(srcpath, "title_t00.mkv")
+        pipeline.submit(srcpath, "title_t00.mkv")
+        pipeline.submit(srcpath, "title_t09.mkv")
+        deadline = time.monotonic() + 10
+        while not pipeline.results and time.monotonic() < deadline:
+            time.sleep(0.05)
+        # waiting for the next title, the slot of the first is free again
+        self.assertEqual(pipeline.worker.is_alive(), True)
+        self.assertEqual(self.slots, [])
+        self.assertEqual(handbrake.resource_slots.acquire.call_count, 1)
+
+        pipeline.finish(srcpath)
+        self.assertEqual(sorted(files for files, _ in pipeline.results),
+                         ["title_t00.mkv", "title_t01.mkv", "title_t02.mkv"])
+        self.assertEqual([track.status for track in job.tracks.rows], ["success"] * 3)
+        self.assertEqual([track.filename for track in job.tracks.rows],
+                         [f"title_t0{number}.{cfg.arm_config['DEST_EXT']}" for number in range(3)])
+        self.assertEqual(handbrake.resource_slots.acquire.call_count, 3)
+        self.assertEqual(self.slots, [])
+
+    def test_pipeline_close(self):
+        """
+        CHECK close() after a failed rip stops the running HandBrake and releases its slot
+        """
+        srcpath, _, pipeline = self.pipeline("0 30")
+        started = threading.Event()
+        pipeline._started = lambda proc, started_proc=pipeline._started: started_proc(proc) or started.set()
+        pipeline.submit(srcpath, "title_t00.mkv")
+        pipeline.submit(srcpath, "title_t01.mkv")
+        self.assertTrue(started.wait(10))
+        start = time.monotonic()
+        pipeline.close()
+        self.assertLess(time.monotonic() - start, 10)
+        self.assertFalse(pipeline.worker.is_alive())
+        self.assertEqual([files for files, _ in pipeline.results], ["title_t00.mkv"])
+        self.assertEqual(handbrake.resource_slots.acquire.call_count, 1)
+        self.assertEqual(self.slots, [])
+        self.assertEqual(handbrake._running, set())
+
+    def transcode_all(self, fail_queue=False):
+        """handbrake_all() of a DVD with 4 titles, the last with other audio, return the HandBrake calls"""
+        basepath = os.path.dirname(self.logfile)
+        script = os.path.join(basepath, "fake_handbrake_queue.py")
+        with open(script, "w") as fake:
+            fake.write(FAKE_HANDBRAKE_QUEUE)
+        calls = os.path.join(basepath, "calls")
+        tracks = [SimpleNamespace(track_number=str(number), length=600, aspect_ratio="1.78", fps=25.0,
+                                  audio_streams="eng,fra" if number < 4 else "eng", subtitle_streams="eng",
+                                  filename=None, status=None, ripped=False)
+                  for number in range(1, 5)]
+        job = SimpleNamespace(job_id=1, disctype="dvd", no_of_titles=4, tracks=tracks, pretty_table=str,
+                              config=SimpleNamespace(HB_ARGS_DVD="", HB_PRESET_DVD="Fast"))
+        with patch.dict(cfg.arm_config, {"HANDBRAKE_CLI": f"{sys.executable} {script}", "MINLENGTH": "1",
+                                         "MAXLENGTH": "9999", "DEST_EXT": "mkv"}), \
+                patch.dict(os.environ, {"HB_CALLS": calls, "HB_QUEUE_FAIL": "1" if fail_queue else ""}), \
+                patch.object(handbrake, "handbrake_sleep_check"), patch.object(handbrake.resource_slots, "release"), \
+                patch.object(handbrake, "get_track_info"), patch.object(handbrake.db, "session"), \
+                patch.object(handbrake.progress, "Reporter", lambda *args, **kwargs: Reporter()):
+            handbrake.handbrake_all("/dev/sr0", basepath, self.logfile, job)
+        self.assertEqual([(track.filename, track.status) for track in tracks],
+                         [(f"title_{number}.mkv", "success") for number in range(1, 5)])
+        with open(calls) as lines:
+            return [json.loads(line) for line in lines]
+
+    def test_all_titles_queued(self):
+        """
+        CHECK the titles like the first are encoded in one queued run with its job json, the others on their own
+        """
+        calls = self.transcode_all()
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(calls[0][calls[0].index("-t") + 1], "1")
+        self.assertEqual(calls[1][0], "--queue-import-file")
+        self.assertEqual(calls[2][calls[2].index("-t") + 1], "4")
+        # the job of the first title, without its chapters
+        title_3 = os.path.join(os.path.dirname(self.logfile), "title_3.mkv")
+        with open(title_3) as output:
+            self.assertEqual(json.load(output), {"Source": {"Title": 3}, "Destination": {"File": title_3}})
+
+    def test_all_titles_queue_failed(self):
+        """
+        CHECK the titles of a failed queue run are encoded again one by one
+        """
+        calls = self.transcode_all(fail_queue=True)
+        self.assertEqual([call[call.index("-t") + 1] for call in calls if "-t" in call], ["1", "2", "3", "4"])
+        self.assertEqual(sum("--queue-import-file" in call for call in calls), 1)
+
+    def test_longest_first(self):
+        """
+        CHECK files are ordered by track length, then size
+        """
+        with tempfile.TemporaryDirectory() as srcpath:
+            for files, size in (("a.mkv", 10), ("b.mkv", 20), ("c.mkv", 30), ("d.mkv", 5)):
+                with open(os.path.join(srcpath, files), "wb") as mkv:
+                    mkv.write(b"0" * size)
+            job = SimpleNamespace(tracks=[SimpleNamespace(filename="a.mkv", length=3600),
+                                          SimpleNamespace(filename="d.mkv", length=7200)])
+            self.assertEqual(handbrake.longest_first(srcpath, ["a.mkv", "b.mkv", "c.mkv", "d.mkv"], job),
+                             ["d.mkv", "a.mkv", "c.mkv", "b.mkv"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import sys
+import threading
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, '/opt/arm')
+from arm.ripper import identify    # noqa: E402
+
+
+def search(title, year=None, kind="movie"):
+    return {'Title': title, 'Year': year, 'Type': kind, 'imdbID': f"tt{abs(hash((title, year))) % 10 ** 7:07d}"}
+
+
+class TestIdentifyLoop(unittest.TestCase):
+    def test_candidate_queries(self):
+        """
+        CHECK the queries of the old one-by-one search are all generated, most specific first
+        """
+        self.assertEqual(identify.candidate_queries("Star+Wars-Special+Edition", "1997"), [
+            ("Star+Wars-Special+Edition", "1997"), ("Star+Wars-Special+Edition", "1996"),
+            ("Star+Wars-Special+Edition", None), ("Star+Wars", "1997"), ("Star", "1997"), ("Star", None)])
+        self.assertEqual(identify.candidate_queries("ALIEN", None), [("ALIEN", None)])
+
+    def test_score(self):
+        """
+        CHECK the title similarity counts most, the year breaks ties
+        """
+        exact = identify.score_result("THE_MATRIX", "1999", search("The Matrix", "1999"))
+        year_before = identify.score_result("THE_MATRIX", "2000", search("The Matrix", "1999"))
+        other = identify.score_result("THE_MATRIX", "1999", search("The Matrix Reloaded", "2003"))
+        self.assertEqual(exact[1:], (1.0, 0))
+        self.assertGreater(exact[0], year_before[0])
+        self.assertGreater(year_before[0], other[0])
+        self.assertEqual(identify.score_result("THE_MATRIX", None, search("The Matrix", "1999"))[2], None)
+
+    def test_identify_loop(self):
+        """
+        CHECK the queries of a tier run concurrently, a good match ends the search and updates the job
+        """
+        answers = {
+            ("Blade+Runner+Final+Cut", "2007"): [search("Blade Runner: The Final Cut", "2007")],
+            ("Blade+Runner", "2007"): [search("Blade Runner 2049", "2017"), search("Blade Runner", "1982")],
+            ("Blade", None): [search("Blade", "1998")],
+        }
+        running = set()
+        overlapped = threading.Event()
+        lock = threading.Lock()
+
+        def provider_search(title, year):
+            with lock:
+                running.add((title, year))
+                if len(running) > 1:
+                    overlapped.set()
+            overlapped.wait(1)
+            return {'Search': answers[(title, year)]} if (title, year) in answers else None
+
+        with patch.object(identify, "provider_search", side_effect=provider_search), \
+                patch.object(identify, "update_job") as update_job:
+            best = identify.identify_loop(None, "Blade+Runner+Final+Cut", "2007")
+        self.assertTrue(overlapped.is_set())
+        self.assertEqual(best['Title'], "Blade Runner: The Final Cut")
+        update_job.assert_called_once_with(None, {'Search': [best]})
+        # the wider queries are not needed
+        self.assertEqual(running, {("Blade+Runner+Final+Cut", "2007"), ("Blade+Runner+Final+Cut", "2006"),
+                                   ("Blade+Runner+Final+Cut", None)})
+
+    def test_identify_loop_widens(self):
+        """
+        CHECK a wider tier is searched only while there is no good match, without a year too
+        """
+        answers = {
+            ("THE_LORD_OF_THE_RINGS_FELLOWSHIP_WS", None): [search("Rings", "2017")],
+            ("THE_LORD_OF_THE_RINGS_FELLOWSHIP", None): [
+                search("The Lord of the Rings: The Fellowship of the Ring", "2001")],
+        }
+        queries = []
+
+        def provider_search(title, year):
+            queries.append((title, year))
+            return {'Search': answers[(title, year)]} if (title, year) in answers else None
+
+        with patch.object(identify, "provider_search", side_effect=provider_search), \
+                patch.object(identify, "update_job"):
+            best = identify.identify_loop(None, "THE_LORD_OF_THE_RINGS_FELLOWSHIP_WS", None)
+        self.assertEqual(best['Year'], "2001")
+        self.assertEqual(queries, list(answers))
+
+    def test_identify_loop_exact_match(self):
+        """
+        CHECK an exact match cancels the queued queries of its tier, they are not logged as failed
+        """
+        queries = []
+
+        def provider_search(title, year):
+            queries.append((title, year))
+            return {'Search': [search("The Matrix", "1999")]}
+
+        with patch.object(identify, "SEARCH_WORKERS", 1), \
+                patch.object(identify, "provider_search", side_effect=provider_search), \
+                patch.object(identify, "update_job"), \
+                self.assertLogs(level="INFO") as logs:
+            best = identify.identify_loop(None, "THE_MATRIX", "1999")
+        self.assertEqual(best['Year'], "1999")
+        self.assertEqual(queries, [("THE_MATRIX", "1999")])
+        self.assertFalse([line for line in logs.output if "failed" in line])
+
+    def test_identify_loop_no_results(self):
+        """
+        CHECK nothing is updated without results
+        """
+        with patch.object(identify, "provider_search", return_value=None), \
+                patch.object(identify, "update_job") as update_job:
+            self.assertIsNone(identify.identify_loop(None, "UNKNOWN_DISC", None))
+        update_job.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
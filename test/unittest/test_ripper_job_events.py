@@ -0,0 +1,57 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+sys.path.insert(0, '/opt/arm')
+from arm.ripper import job_events    # noqa: E402
+
+
+class TestJobEvents(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_notify_wakes(self):
+        """
+        CHECK notify wakes a waiter at once, a notify before wait() is not lost, nobody waiting is fine
+        """
+        self.assertFalse(job_events.notify(3, self.tmp.name))
+        with job_events.Waiter(3, self.tmp.name) as waiter:
+            self.assertTrue(job_events.notify(3, self.tmp.name))
+            self.assertTrue(job_events.notify(3, self.tmp.name))
+            self.assertTrue(waiter.wait(5))
+            self.assertFalse(waiter.wait(0.01))
+
+            threading.Timer(0.1, job_events.notify, (3, self.tmp.name)).start()
+            start = time.monotonic()
+            self.assertTrue(waiter.wait(10))
+            self.assertLess(time.monotonic() - start, 5)
+        self.assertFalse(os.path.exists(job_events.fifo_path(3, self.tmp.name)))
+
+    def test_wait_for(self):
+        """
+        CHECK wait_for returns once the job is set after a wakeup, and polls without one
+        """
+        job = SimpleNamespace(job_id=4, manual_start=False)
+        session = SimpleNamespace(refresh=lambda refreshed: setattr(refreshed, "manual_start", refreshed.started))
+        with patch.object(job_events.db, "session", session, create=True), \
+                job_events.Waiter(4, self.tmp.name) as waiter:
+            job.started = False
+            job_events.notify(4, self.tmp.name)
+            self.assertFalse(job_events.wait_for(job, lambda job: job.manual_start, 0.2, waiter))
+
+            job.started = True
+            job_events.notify(4, self.tmp.name)
+            self.assertTrue(job_events.wait_for(job, lambda job: job.manual_start, 10, waiter))
+
+            with patch.object(job_events, "POLL_INTERVAL", 0.05):
+                self.assertTrue(job_events.wait_for(job, lambda job: job.manual_start, 10, waiter))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+sys.path.insert(0, '/opt/arm')
+from arm.ripper import progress    # noqa: E402
+
+
+class TestProgress(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.job = SimpleNamespace(job_id=7, config=SimpleNamespace(LOGPATH=self.tmp.name))
+
+    def test_publish_read(self):
+        """
+        CHECK a published record is read back per stage, nothing is read before
+        """
+        self.assertIsNone(progress.read(7, progress.RIP, self.tmp.name))
+        reporter = progress.Reporter(self.job, progress.RIP, titles=4)
+        reporter.update(title=2, task="Saving to MKV file", percent=12.5)
+        state = progress.read(7, progress.RIP, self.tmp.name)
+        self.assertEqual((state["title"], state["titles"], state["task"]), (2, 4, "Saving to MKV file"))
+        self.assertEqual(state["percent"], 12.5)
+        self.assertIsNone(progress.read(7, progress.TRANSCODE, self.tmp.name))
+        self.assertEqual(os.listdir(os.path.join(self.tmp.name, "progress")), ["7.rip.json"])
+
+    def test_throttle(self):
+        """
+        CHECK percent updates are written at most every MIN_INTERVAL, title changes right away
+        """
+        reporter = progress.Reporter(self.job, progress.RIP)
+        with patch("time.monotonic", return_value=1000.0):
+            reporter.update(title=1, percent=1.0)
+            reporter.update(percent=50.0)
+            self.assertEqual(progress.read(7, progress.RIP, self.tmp.name)["percent"], 1.0)
+            reporter.update(title=2, percent=0.0)
+            self.assertEqual(progress.read(7, progress.RIP, self.tmp.name)["title"], 2)
+        with patch("time.monotonic", return_value=1010.0):
+            reporter.update(percent=50.0)
+        state = progress.read(7, progress.RIP, self.tmp.name)
+        self.assertEqual(state["percent"], 50.0)
+        # half done after 10s
+        self.assertEqual(state["eta"], 10)
+
+    def test_bytes(self):
+        """
+        CHECK bytes written are measured from the output folder, existing files excluded
+        """
+        output = os.path.join(self.tmp.name, "raw")
+        os.makedirs(os.path.join(output, "BDMV"))
+        with open(os.path.join(output, "title_t00.mkv"), "wb") as old_file:
+            old_file.write(b"x" * 100)
+        reporter = progress.Reporter(self.job, progress.RIP, output_path=output)
+        with open(os.path.join(output, "BDMV", "00001.m2ts"), "wb") as new_file:
+            new_file.write(b"x" * 50)
+        reporter.write()
+        self.assertEqual(progress.read(7, progress.RIP, self.tmp.name)["bytes"], 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
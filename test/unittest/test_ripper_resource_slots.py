@@ -0,0 +1,121 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import sqlalchemy
+import sqlalchemy.orm
+
+sys.path.insert(0, '/opt/arm')
+import arm.config.config as cfg    # noqa: E402
+from arm.database import db    # noqa: E402
+from arm.models.job import Job    # noqa: E402
+from arm.models.resource_slot import ResourceSlot    # noqa: E402
+from arm.ripper import resource_slots    # noqa: E402
+
+
+class TestResourceSlots(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        # a file, the waiter threads have their own connections
+        engine = sqlalchemy.create_engine("sqlite:///" + os.path.join(tmp.name, "arm.db"))
+        db.metadata.create_all(engine, tables=[Job.__table__, ResourceSlot.__table__])
+        # a session per thread like the ripper's, also when the UI replaced db.session
+        session = sqlalchemy.orm.scoped_session(sqlalchemy.orm.sessionmaker(bind=engine))
+        self.addCleanup(engine.dispose)
+        self.addCleanup(session.remove)
+        for target, name, value in ((db, "session", session), (db.Model, "query", session.query_property())):
+            patcher = patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch.dict(cfg.arm_config, {"LOGPATH": tmp.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def slot(self, priority=0):
+        slot = ResourceSlot(resource_slots.TRANSCODE, priority=priority)
+        db.session.add(slot)
+        db.session.commit()
+        return slot
+
+    def wait_for_waiter(self):
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            # new transaction, else the session keeps reading its old snapshot
+            db.session.rollback()
+            if ResourceSlot.status()[resource_slots.TRANSCODE]["waiting"]:
+                return
+            time.sleep(0.01)
+        self.fail("nobody is waiting for a slot")
+
+    def admit(self, slot, limit=1):
+        return resource_slots._try_admit(slot, limit)
+
+    def test_admit_order(self):
+        """
+        CHECK waiters are admitted by priority, then in order, never more than the limit
+        """
+        first, second, urgent = self.slot(), self.slot(), self.slot(priority=1)
+        self.assertFalse(self.admit(first))
+        self.assertTrue(self.admit(urgent))
+        self.assertFalse(self.admit(first))
+        self.assertFalse(self.admit(second, limit=2))
+        self.assertTrue(self.admit(first, limit=2))
+        self.assertFalse(self.admit(second, limit=2))
+
+        resource_slots.release(urgent)
+        self.assertTrue(self.admit(second, limit=2))
+        self.assertEqual(ResourceSlot.status()[resource_slots.TRANSCODE]["running"], 2)
+
+    def test_dead_holder(self):
+        """
+        CHECK slots of exited processes are removed, a reused pid does not keep its slot
+        """
+        holder = self.slot()
+        self.assertTrue(self.admit(holder))
+        waiter = self.slot()
+        self.assertFalse(self.admit(waiter))
+        # the holder exited and another process got its pid
+        holder.pid_started = 0
+        db.session.commit()
+        self.assertEqual(resource_slots.remove_dead_slots(resource_slots.TRANSCODE), 1)
+        self.assertEqual(resource_slots.remove_dead_slots(resource_slots.TRANSCODE), 0)
+        self.assertTrue(self.admit(waiter))
+
+    def test_acquire_woken(self):
+        """
+        CHECK a waiter takes a released slot at once, a cancelled waiter leaves the queue
+        """
+        holder = resource_slots.acquire(resource_slots.TRANSCODE, 1)
+        acquired = []
+
+        def wait(**kwargs):
+            acquired.append(resource_slots.acquire(resource_slots.TRANSCODE, 1, **kwargs) is not None)
+            db.session.remove()
+
+        waiter = threading.Thread(target=wait)
+        waiter.start()
+        self.wait_for_waiter()
+        start = time.monotonic()
+        resource_slots.release(holder)
+        waiter.join(resource_slots.POLL_INTERVAL)
+        self.assertEqual(acquired, [True])
+        self.assertLess(time.monotonic() - start, resource_slots.POLL_INTERVAL / 2)
+
+        cancel = threading.Event()
+        waiter = threading.Thread(target=wait, kwargs={"cancel": cancel})
+        waiter.start()
+        self.wait_for_waiter()
+        cancel.set()
+        waiter.join(resource_slots.POLL_INTERVAL)
+        self.assertEqual(acquired, [True, False])
+        db.session.rollback()
+        self.assertEqual(ResourceSlot.status()[resource_slots.TRANSCODE]["waiting"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
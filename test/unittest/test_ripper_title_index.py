@@ -0,0 +1,88 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, '/opt/arm')
+from arm.ripper import title_index    # noqa: E402
+
+
+class TestTitleIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        completed = os.path.join(self.tmp.name, "completed")
+        os.makedirs(os.path.join(completed, "movies", "Alien (1979)"))
+        os.makedirs(os.path.join(completed, "movies", "Aliens (1986)"))
+        os.makedirs(os.path.join(completed, "movies", "Heat (1986)"))
+        os.makedirs(os.path.join(completed, "movies", "Heat (1995)"))
+        os.makedirs(os.path.join(completed, "tv", "Firefly (2002)"))
+        patcher = patch.dict(title_index.cfg.arm_config, {
+            "TITLE_INDEX_PATH": os.path.join(self.tmp.name, "title_index.db"), "COMPLETED_PATH": completed})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        jobs = [("STAR_WARS_EP4", "1a2b3c", "Star Wars", "1977", "tt0076759", "movie", "http://poster")]
+        patcher = patch.object(title_index, "_successful_jobs", return_value=jobs)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_normalize(self):
+        """
+        CHECK labels and titles are compared without case, accents and punctuation
+        """
+        self.assertEqual(title_index.normalize("Amélie: Le Fabuleux_Destin!"), "amelie le fabuleux destin")
+        self.assertEqual(title_index.normalize("Fast & Furious"), "fast and furious")
+        self.assertEqual(title_index.trigrams("ab"), {"  a", " ab", "ab "})
+
+    def test_lookup(self):
+        """
+        CHECK a disc is found by crc64, exact label or a close label, and unknown discs are not guessed
+        """
+        match = title_index.lookup("1a2b3c", "SOMETHING_ELSE")
+        self.assertEqual((match.title, match.year, match.imdb_id, match.reason),
+                         ("Star Wars", "1977", "tt0076759", "crc64"))
+        self.assertEqual(title_index.lookup(None, "star wars ep4").reason, "label")
+        match = title_index.lookup(None, "FIREFLY")
+        self.assertEqual((match.title, match.video_type, match.reason), ("Firefly", "series", "label"))
+        match = title_index.lookup(None, "STAR_WARS_EP4_WS")
+        self.assertEqual((match.title, match.reason), ("Star Wars", "trigram"))
+        self.assertEqual(title_index.lookup(None, "ALIEN_S").title, "Alien")
+        self.assertIsNone(title_index.lookup(None, "BLADE_RUNNER"))
+        # two films of the same name are told apart by the year only
+        self.assertIsNone(title_index.lookup(None, "HEAT"))
+        self.assertEqual(title_index.lookup(None, "HEAT", "1995").year, "1995")
+
+    def test_lookup_numbers(self):
+        """
+        CHECK a close label with other numbers is not taken for a sequel or another disc of a season
+        """
+        for title, label in (("Harry Potter 1", "HARRY_POTTER_1"), ("Shrek", "SHREK"),
+                             ("Friends", "FRIENDS_S1_D1"), ("Rocky II", None)):
+            job = type("Job", (), {"hasnicetitle": True, "title": title, "year": None, "imdb_id": None,
+                                   "video_type": "movie", "poster_url": None, "label": label,
+                                   "fingerprint": None, "disctype": "dvd"})()
+            title_index.add_job(job)
+        for label in ("HARRY_POTTER_2", "SHREK_2", "FRIENDS_S1_D2", "ROCKY_III"):
+            self.assertIsNone(title_index.lookup(None, label), label)
+        self.assertEqual(title_index.lookup(None, "HARRY_POTTER_1_WS").title, "Harry Potter 1")
+        self.assertEqual(title_index.lookup(None, "ROCKY_II_WS").title, "Rocky II")
+        self.assertEqual(title_index.numbers("star wars episode iv ep4"), [4, 4])
+
+    def test_add_job(self):
+        """
+        CHECK a successful job is found by its fingerprint right away
+        """
+        job = type("Job", (), {"hasnicetitle": True, "title": "Heat", "year": "1995", "imdb_id": "tt0113277",
+                               "video_type": "movie", "poster_url": None, "label": "HEAT_D1",
+                               "fingerprint": "ffee", "disctype": "dvd"})()
+        title_index.add_job(job)
+        match = title_index.lookup("ffee")
+        self.assertEqual((match.title, match.year, match.imdb_id), ("Heat", "1995", "tt0113277"))
+        self.assertEqual(title_index.lookup(None, "HEAT_D1").year, "1995")
+        title_index.rebuild()
+        self.assertIsNone(title_index.lookup("ffee"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, '/opt/arm')
+import arm.config.config as cfg    # noqa: E402
+from arm.ripper import transcode_limit    # noqa: E402
+
+IDLE = {"cpu": 20.0, "load": 0.2, "memory": 40.0, "temp": 50.0}
+BUSY = {"cpu": 80.0, "load": 1.0, "memory": 60.0, "temp": 70.0}
+HOT = {"cpu": 80.0, "load": 1.0, "memory": 60.0, "temp": 90.0}
+
+
+class TestTranscodeLimit(unittest.TestCase):
+    def test_adjust(self):
+        """
+        CHECK the limit moves one step after samples in a row, within its bounds
+        """
+        state = {"limit": 1, "min": 1, "max": 2}
+        self.assertIsNone(transcode_limit.adjust(state, IDLE))
+        self.assertIsNone(transcode_limit.adjust(state, IDLE))
+        # a sample in between starts the count again
+        self.assertIsNone(transcode_limit.adjust(state, BUSY))
+        for _ in range(transcode_limit.RAISE_AFTER - 1):
+            self.assertIsNone(transcode_limit.adjust(state, IDLE))
+        decision = transcode_limit.adjust(state, IDLE)
+        self.assertEqual((decision["from"], decision["to"], state["limit"]), (1, 2, 2))
+        for _ in range(transcode_limit.RAISE_AFTER + 1):
+            self.assertIsNone(transcode_limit.adjust(state, IDLE))
+
+        self.assertIsNone(transcode_limit.adjust(state, HOT))
+        decision = transcode_limit.adjust(state, HOT)
+        self.assertEqual((decision["to"], decision["reason"]), (1, "temp 90.0 >= 85"))
+        self.assertEqual(len(state["decisions"]), 2)
+
+    def test_current(self):
+        """
+        CHECK the static limit is used without TRANSCODE_LIMIT_AUTO, the shared state is sampled when due
+        """
+        with tempfile.TemporaryDirectory() as logpath, \
+                patch.dict(cfg.arm_config, {"LOGPATH": logpath, "MAX_CONCURRENT_TRANSCODES": 3,
+                                            "TRANSCODE_LIMIT_AUTO": False, "TRANSCODE_LIMIT_MIN": 1}), \
+                patch.object(transcode_limit, "sample", return_value=IDLE) as sample, \
+                patch.object(transcode_limit, "ADJUST_INTERVAL", 0):
+            self.assertEqual(transcode_limit.current(), 3)
+            sample.assert_not_called()
+
+            cfg.arm_config["TRANSCODE_LIMIT_AUTO"] = True
+            limits = [transcode_limit.current() for _ in range(3 * transcode_limit.RAISE_AFTER)]
+            self.assertEqual(limits[0], 1)
+            self.assertEqual(limits[-1], 3)
+            self.assertEqual(transcode_limit.read(logpath)["sample"], IDLE)
+
+            cfg.arm_config["TRANSCODE_LIMIT_MIN"] = 5
+            self.assertEqual(transcode_limit.current(), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import sys
+import unittest
+from unittest.mock import patch
+
+import sqlalchemy
+import sqlalchemy.orm
+
+sys.path.insert(0, '/opt/arm')
+from arm.database import db    # noqa: E402
+from arm.models.config import Config    # noqa: E402
+from arm.models.job import Job, JobState    # noqa: E402
+from arm.ui import json_api    # noqa: E402
+
+
+class TestFinishedJobs(unittest.TestCase):
+    def setUp(self):
+        engine = sqlalchemy.create_engine("sqlite://")
+        db.metadata.create_all(engine, tables=[Job.__table__, Config.__table__])
+        self.session = sqlalchemy.orm.Session(engine)
+        self.addCleanup(self.session.close)
+        for name in ("parse_udev", "get_pid"):
+            patcher = patch.object(Job, name)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for status in [JobState.SUCCESS.value] * 5 + [JobState.FAILURE.value]:
+            job = Job("/dev/sr0")
+            job.status, job.title = status, f"Title {status}"
+            self.session.add(job)
+            self.session.flush()
+            self.session.add(Config({"RIPMETHOD": "mkv", "MAINFEATURE": False}, job.job_id))
+        self.session.commit()
+
+    def page(self, before=None, limit=2, with_config=False):
+        results, next_before = json_api.finished_jobs_page(self.session, JobState.SUCCESS.value, before, limit,
+                                                           with_config)
+        return [int(job["job_id"]) for job in results.values()], next_before, results
+
+    def test_pages(self):
+        """
+        CHECK pages are cut below 'before', newest first, and the last page has no next
+        """
+        self.assertEqual(self.page()[:2], ([5, 4], 4))
+        self.assertEqual(self.page(4)[:2], ([3, 2], 2))
+        self.assertEqual(self.page(2)[:2], ([1], None))
+        self.assertEqual(self.page(limit=5)[:2], ([5, 4, 3, 2, 1], None))
+
+    def test_config(self):
+        """
+        CHECK the config values are only read when asked for
+        """
+        self.assertNotIn("config", self.page()[2][0])
+        self.assertEqual(self.page(with_config=True)[2][0]["config"],
+                         {"RIPMETHOD": "mkv", "MAINFEATURE": "False", "MINLENGTH": "None", "MAXLENGTH": "None"})
+
+    def test_limit(self):
+        """
+        CHECK the page size is kept between 1 and JOBS_MAX_PAGE_SIZE
+        """
+        self.assertEqual(self.page(limit=-3)[:2], ([5], 5))
+        with patch.object(json_api, "JOBS_MAX_PAGE_SIZE", 3):
+            self.assertEqual(self.page(limit=100)[:2], ([5, 4, 3], 3))
+        self.assertEqual(len(self.page(limit=None)[0]), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()